@@ -0,0 +1,135 @@
+"""Actors: objects owning state that only a single thread touches.
+
+Other threads talk to an actor by sending it messages, which the actor handles
+one at a time, in order, on its own thread.  So the state needs no locks, and
+sending never waits for the actor to be done with something else.
+
+To let others read its state, an actor publishes an immutable snapshot after
+handling each message.  Reading the snapshot is a plain attribute read.
+
+Messages can be recorded as they're sent, e.g. into the event log (see
+event_log.py), to replay them later.
+
+Messages carry the sender's current trace ID (see `tracing`), which is the
+current one while the message is being handled.
+"""
+import logging
+import queue
+import threading
+import time
+
+from typing import Any, Callable, Dict, Generic, Optional, Type, TypeVar
+
+import metrics
+from tracing import TRACE, Stage
+
+
+logger = logging.getLogger(__name__)
+
+
+Snapshot = TypeVar('Snapshot')
+
+QUEUE_WAIT = metrics.Histogram(
+        'trackd_actor_queue_wait_seconds',
+        'Time messages spend in actor inboxes.', ['actor'])
+HANDLE_DURATION = metrics.Histogram(
+        'trackd_actor_handle_duration_seconds',
+        'Time actors spend handling a message.', ['actor', 'message'])
+RECORD_LOCK_WAIT = metrics.Histogram(
+        'trackd_actor_record_lock_wait_seconds',
+        'Time senders waited for another sender to record its message, '
+        'when they had to wait at all.', ['actor'])
+
+
+class Actor(Generic[Snapshot]):
+    """Base class for actors.
+
+    Subclasses register a handler per message type with `_handle()`, and
+    publish their state with `_publish()`.
+    """
+
+    _STOP = object()
+
+    def __init__(self):
+        self._inbox: queue.Queue = queue.Queue()
+        self._handlers: Dict[Type, Callable[[Any], None]] = {}
+        self._snapshot: Optional[Snapshot] = None
+        self._recorder: Optional[Callable[[str, Any], None]] = None
+        self._record_lock = threading.Lock()
+
+    def _handle(self, message_type: Type, handler: Callable[[Any], None]) -> None:
+        self._handlers[message_type] = handler
+
+    def _publish(self, snapshot: Snapshot) -> None:
+        self._snapshot = snapshot
+
+    @property
+    def snapshot(self) -> Optional[Snapshot]:
+        return self._snapshot
+
+    def record_to(self, recorder: Callable[[str, Any], None]) -> None:
+        """Makes `send()` pass the actor's class name and every message to `recorder`."""
+        self._recorder = recorder
+
+    def send(self, message) -> None:
+        if self._recorder is None or message is self._STOP:
+            self._inbox.put((time.perf_counter(), TRACE.current(), message))
+            return
+        # Keep the recorded order the same as the handling order.
+        if not self._record_lock.acquire(blocking=False):
+            with RECORD_LOCK_WAIT.time(self.__class__.__name__):
+                self._record_lock.acquire()
+        try:
+            self._recorder(self.__class__.__name__, message)
+            self._inbox.put((time.perf_counter(), TRACE.current(), message))
+        finally:
+            self._record_lock.release()
+
+    def run(self) -> None:
+        """Handles messages until `stop()` is called."""
+        while True:
+            sent, trace_id, message = self._inbox.get()
+            try:
+                if message is self._STOP:
+                    return
+                self._dispatch(sent, trace_id, message)
+            finally:
+                self._inbox.task_done()
+
+    def process_pending(self) -> None:
+        """Handles all sent messages on the calling thread.
+
+        Only to be used when no thread is running `run()`, e.g. in tests.
+        """
+        while True:
+            try:
+                sent, trace_id, message = self._inbox.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._dispatch(sent, trace_id, message)
+            finally:
+                self._inbox.task_done()
+
+    def flush(self) -> None:
+        """Waits until all the messages sent so far are handled."""
+        self._inbox.join()
+
+    def stop(self) -> None:
+        """Makes `run()` return after handling all the messages sent so far."""
+        self.send(self._STOP)
+
+    def inbox_size(self) -> int:
+        return self._inbox.qsize()
+
+    def _dispatch(self, sent: float, trace_id: int, message) -> None:
+        actor_name = self.__class__.__name__
+        start = time.perf_counter()
+        QUEUE_WAIT.observe(start - sent, actor_name)
+        TRACE.set_current(trace_id)
+        TRACE.record(trace_id, Stage.ADAPTER, TRACE.label(type(message).__name__))
+        try:
+            self._handlers[type(message)](message)
+        except Exception:
+            logger.exception('%s failed to handle %r', actor_name, message)
+        HANDLE_DURATION.observe(time.perf_counter() - start, actor_name, type(message).__name__)
@@ -0,0 +1,71 @@
+from dataclasses import dataclass
+import threading
+import unittest
+
+import actor
+
+
+@dataclass(frozen=True)
+class Add:
+    value: int
+
+
+class Adder(actor.Actor[int]):
+
+    def __init__(self):
+        super().__init__()
+        self._total = 0
+        self.threads = set()
+        self._handle(Add, self._on_add)
+        self._publish(0)
+
+    def _on_add(self, message: Add) -> None:
+        if message.value < 0:
+            raise ValueError(message.value)
+        self.threads.add(threading.current_thread())
+        self._total += message.value
+        self._publish(self._total)
+
+
+class ActorTest(unittest.TestCase):
+
+    def test_handles_messages_on_its_thread(self):
+        adder = Adder()
+        thread = threading.Thread(target=adder.run, daemon=True)
+        thread.start()
+
+        for i in range(100):
+            adder.send(Add(i))
+        adder.flush()
+
+        self.assertEqual(adder.snapshot, sum(range(100)))
+        self.assertEqual(adder.threads, {thread})
+        adder.stop()
+        thread.join(timeout=5)
+        self.assertFalse(thread.is_alive())
+
+    def test_process_pending(self):
+        adder = Adder()
+        adder.send(Add(1))
+        adder.send(Add(2))
+        self.assertEqual(adder.snapshot, 0)
+
+        adder.process_pending()
+
+        self.assertEqual(adder.snapshot, 3)
+        self.assertEqual(adder.inbox_size(), 0)
+
+    def test_keeps_going_after_failed_message(self):
+        adder = Adder()
+        adder.send(Add(1))
+        adder.send(Add(-1))
+        adder.send(Add(2))
+
+        with self.assertLogs(level='ERROR'):
+            adder.process_pending()
+
+        self.assertEqual(adder.snapshot, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
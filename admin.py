@@ -0,0 +1,59 @@
+"""A local HTTP server for looking into a running trackd.
+
+Endpoints are registered with `AdminServer.route()`; each one gets the query
+parameters and returns a content type and a body.  It listens on localhost
+only.
+"""
+import http.server
+import logging
+import urllib.parse
+
+from typing import Callable, Dict, List, Mapping, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PORT = 3143
+
+Handler = Callable[[Mapping[str, List[str]]], Tuple[str, bytes]]
+
+
+class AdminServer:
+
+    def __init__(self, port: int = DEFAULT_PORT, host: str = 'localhost'):
+        self._address = (host, port)
+        self._routes: Dict[str, Handler] = {}
+
+    def route(self, path: str, handler: Handler) -> None:
+        self._routes[path] = handler
+
+    def serve(self) -> None:
+        routes = self._routes
+
+        class RequestHandler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                try:
+                    handler = routes[url.path]
+                except KeyError:
+                    self.send_error(404)
+                    return
+                try:
+                    content_type, body = handler(urllib.parse.parse_qs(url.query))
+                except ValueError as e:
+                    self.send_error(400, str(e))
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                logger.debug('admin: ' + format, *args)
+
+        server = http.server.ThreadingHTTPServer(self._address, RequestHandler)
+        server.daemon_threads = True
+        server.serve_forever()
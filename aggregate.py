@@ -0,0 +1,162 @@
+"""Aggregates time spent in spans, grouped by dimensions.
+
+A dimension is either an attribute of a span: its work type, name, host or
+Chrome user, or a calendar unit: ISO week, day, hour, weekday, or a bucket
+of a given length within a day.  Spans are cut at the boundaries of the
+calendar dimensions they're grouped by (e.g. at midnight when grouping by
+day), so every part is counted in its own group, to the microsecond.
+Boundaries are in the spans' time zone.
+
+Reports are presets over it, e.g. per week is grouped by week, type and name:
+
+>>> from datetime import datetime
+>>> from types import SimpleNamespace as Span
+>>> spans = [Span(name='trackd', start=datetime(2021, 3, 21, 23, 0),
+...               end=datetime(2021, 3, 22, 1, 30))]
+>>> for key, seconds in aggregate(spans, group_by(['week', 'name'])).items():
+...     print(key, seconds)
+((2021, 11), 'trackd') 3600.0
+((2021, 12), 'trackd') 5400.0
+
+Only stdlib imports, as reports use it.  Spans are anything with `start` and
+`end`, and the attributes of the dimensions they're grouped by: `type_`,
+`name`, `hostname` or `user`, e.g. `reports.ReportSpan`.
+"""
+from dataclasses import dataclass
+import calendar
+import datetime
+
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+Key = Tuple[Hashable, ...]
+
+
+@dataclass(frozen=True)
+class Dimension:
+    name: str
+    # Returns the group of a span's part starting at the given moment.
+    key: Callable[[Any, datetime.datetime], Hashable]
+    format: Callable[[Hashable], str] = str
+    # For calendar dimensions: returns the next boundary after a moment.
+    next_boundary: Optional[Callable[[datetime.datetime], datetime.datetime]] = None
+
+
+def _midnight(t: datetime.datetime) -> datetime.datetime:
+    return datetime.datetime.combine(t.date(), datetime.time(), tzinfo=t.tzinfo)
+
+
+def _next_midnight(t: datetime.datetime) -> datetime.datetime:
+    return _midnight(t) + datetime.timedelta(days=1)
+
+
+def _next_monday(t: datetime.datetime) -> datetime.datetime:
+    return _midnight(t) + datetime.timedelta(days=7 - t.weekday())
+
+
+def _next_hour(t: datetime.datetime) -> datetime.datetime:
+    return t.replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+
+
+def _format_week(year_week: Tuple[int, int]) -> str:
+    week_start = datetime.date.fromisocalendar(*year_week, 1)
+    week_end = datetime.date.fromisocalendar(*year_week, 7)
+    return f'{week_start:%b %d} — {week_end:%b %d %Y}'
+
+
+DIMENSIONS: Dict[str, Dimension] = {dimension.name: dimension for dimension in [
+    Dimension('type', lambda span, t: span.type_,
+              lambda type_: '[w] ' if type_.name == 'WORK' else '[nw]'),
+    Dimension('name', lambda span, t: span.name),
+    Dimension('host', lambda span, t: span.hostname or ''),
+    Dimension('user', lambda span, t: span.user or ''),
+    Dimension('week', lambda span, t: tuple(t.isocalendar())[:2], _format_week, _next_monday),
+    Dimension('day', lambda span, t: t.date(), lambda day: f'{day:%a, %b %d}', _next_midnight),
+    Dimension('hour', lambda span, t: t.hour, lambda hour: f'{hour:02}:00', _next_hour),
+    Dimension('weekday', lambda span, t: t.weekday(), lambda weekday: calendar.day_abbr[weekday],
+              _next_midnight),
+]}
+
+
+def bucket(seconds: int) -> Dimension:
+    """Returns a dimension of `seconds` long intervals, from midnight.
+
+    The last interval of a day is shorter, if `seconds` doesn't divide a day.
+    """
+    step = datetime.timedelta(seconds=seconds)
+
+    def start(t: datetime.datetime) -> datetime.datetime:
+        midnight = _midnight(t)
+        return midnight + (t - midnight) // step * step
+
+    return Dimension('bucket', lambda span, t: start(t).time(),
+                     lambda time: f'{time:%H:%M}',
+                     lambda t: min(start(t) + step, _next_midnight(t)))
+
+
+def group_by(names: Sequence[str], bucket_seconds: Optional[int] = None) -> List[Dimension]:
+    """Returns dimensions by name; "bucket" needs `bucket_seconds`."""
+    dimensions = []
+    for name in names:
+        if name == 'bucket':
+            if not bucket_seconds:
+                raise ValueError('Grouping by bucket needs a bucket size')
+            dimensions.append(bucket(bucket_seconds))
+        elif name in DIMENSIONS:
+            dimensions.append(DIMENSIONS[name])
+        else:
+            raise ValueError(f'Unknown dimension {name!r}, should be one of '
+                             f'{", ".join([*DIMENSIONS, "bucket"])}')
+    return dimensions
+
+
+def split(spans: Iterable, dimensions: Sequence[Dimension]
+          ) -> Iterator[Tuple[Key, datetime.datetime, datetime.datetime]]:
+    """Yields the groups, starts and ends of spans' parts.
+
+    A span is cut at the nearest of the dimensions' boundaries, again and
+    again, so it's as many parts as boundaries it crosses, plus one.
+    """
+    calendar_dimensions = [dimension for dimension in dimensions
+                           if dimension.next_boundary is not None]
+    # Keys of attribute dimensions, `None` for calendar ones.
+    attribute_keys = [dimension.key if dimension.next_boundary is None else None
+                      for dimension in dimensions]
+    # Calendar groups don't change until the nearest boundary, the horizon,
+    # and spans are mostly shorter than the distance between boundaries, so
+    # the groups are only worked out again once a part starts past it.
+    window_start = horizon = None
+    calendar_groups: List[Hashable] = [None] * len(dimensions)
+    for span in spans:
+        start = span.start
+        while start < span.end:
+            if calendar_dimensions and not (horizon is not None and
+                                            window_start <= start < horizon):
+                window_start = start
+                horizon = min(dimension.next_boundary(start) for dimension in calendar_dimensions)
+                calendar_groups = [None if dimension.next_boundary is None
+                                   else dimension.key(span, start) for dimension in dimensions]
+            end = span.end if horizon is None or span.end < horizon else horizon
+            yield tuple([group if key is None else key(span, start)
+                         for group, key in zip(calendar_groups, attribute_keys)]), start, end
+            start = end
+
+
+def aggregate(spans: Iterable, dimensions: Sequence[Dimension]) -> Dict[Key, float]:
+    """Returns seconds spent in spans per group, in the order groups first appear."""
+    totals: Dict[Key, float] = {}
+    for key, start, end in split(spans, dimensions):
+        totals[key] = totals.get(key, 0) + seconds(start, end)
+    return totals
+
+
+def seconds(start: datetime.datetime, end: datetime.datetime) -> float:
+    length = end - start
+    if start.tzinfo is not None:
+        # Subtracting times in the same zone ignores a DST change between them.
+        length -= end.utcoffset() - start.utcoffset()
+    return length.total_seconds()
+
+
+def format_key(key: Key, dimensions: Sequence[Dimension]) -> List[str]:
+    return [dimension.format(value) for dimension, value in zip(dimensions, key)]
@@ -0,0 +1,135 @@
+import datetime
+import doctest
+import unittest
+import zoneinfo
+
+import aggregate
+import reports
+from time_utils import duration
+
+
+def make_span(start: str, end: str, name='Span', type_=reports.SpanType.WORK) -> reports.ReportSpan:
+    """A helper to create test ReportSpans.
+
+    All but `start` and `end` have sensible default values (for a test).
+    `start` and `end` should be text strings in form "[YYYY-MM-DD ]HH:MM".
+    """
+
+    return reports.ReportSpan(
+            name=name,
+            type_=type_,
+            start=t(start),
+            end=t(end),
+            hostname='desktop')
+
+
+def t(s):
+    if ' ' not in s:
+        s = f'2000-01-01 {s}'
+    return datetime.datetime.fromisoformat(s)
+
+
+def split(spans, *names, bucket=None):
+    return [(key, start, end) for key, start, end in
+            aggregate.split(spans, aggregate.group_by(names, bucket))]
+
+
+class SplitTest(unittest.TestCase):
+
+    def test_doesnt_split_between_split_points(self):
+        self.assertEqual(
+                split([make_span(start='10:10', end='10:20')], 'bucket', bucket=duration('30m')),
+                [((t('10:00').time(),), t('10:10'), t('10:20'))])
+
+    def test_splits_in_two_at_split_point(self):
+        self.assertEqual(
+                split([make_span(start='10:40', end='11:10')], 'bucket', bucket=duration('30m')),
+                [((t('10:30').time(),), t('10:40'), t('11:00')),
+                 ((t('11:00').time(),), t('11:00'), t('11:10'))])
+
+    def test_splits_in_three(self):
+        self.assertEqual(
+                split([make_span(start='10:20', end='11:10')], 'bucket', bucket=duration('30m')),
+                [((t('10:00').time(),), t('10:20'), t('10:30')),
+                 ((t('10:30').time(),), t('10:30'), t('11:00')),
+                 ((t('11:00').time(),), t('11:00'), t('11:10'))])
+
+    def test_splits_multiple_spans(self):
+        self.assertEqual(
+                split([make_span(start='10:10', end='10:15'),
+                       make_span(start='10:20', end='10:40')], 'bucket', bucket=duration('30m')),
+                [((t('10:00').time(),), t('10:10'), t('10:15')),
+                 ((t('10:00').time(),), t('10:20'), t('10:30')),
+                 ((t('10:30').time(),), t('10:30'), t('10:40'))])
+
+    def test_splits_at_the_nearest_boundary(self):
+        # A bucket not dividing an hour: boundaries of both apply.
+        self.assertEqual(
+                split([make_span(start='10:30', end='11:30', name='trackd')],
+                      'hour', 'bucket', 'name', bucket=duration('40m')),
+                [((10, t('10:00').time(), 'trackd'), t('10:30'), t('10:40')),
+                 ((10, t('10:40').time(), 'trackd'), t('10:40'), t('11:00')),
+                 ((11, t('10:40').time(), 'trackd'), t('11:00'), t('11:20')),
+                 ((11, t('11:20').time(), 'trackd'), t('11:20'), t('11:30'))])
+
+    def test_splits_spans_crossing_weeks(self):
+        # Sunday to Monday, into the next year's first week.
+        self.assertEqual(
+                split([make_span(start='2021-01-03 23:00', end='2021-01-04 01:00')],
+                      'week', 'weekday'),
+                [(((2020, 53), 6), t('2021-01-03 23:00'), t('2021-01-04 00:00')),
+                 (((2021, 1), 0), t('2021-01-04 00:00'), t('2021-01-04 01:00'))])
+
+    def test_no_calendar_dimensions(self):
+        self.assertEqual(
+                split([make_span(start='2021-01-03 23:00', end='2021-01-04 01:00')],
+                      'type', 'host'),
+                [((reports.SpanType.WORK, 'desktop'), t('2021-01-03 23:00'),
+                  t('2021-01-04 01:00'))])
+
+
+class AggregateTest(unittest.TestCase):
+
+    def test_sums_per_group(self):
+        spans = [make_span('10:00', '10:20', name='trackd'),
+                 make_span('10:20', '10:30', name='mail', type_=reports.SpanType.NON_WORK),
+                 make_span('10:30', '11:10', name='trackd')]
+
+        self.assertEqual(
+                aggregate.aggregate(spans, aggregate.group_by(['hour', 'type'])),
+                {(10, reports.SpanType.WORK): duration('50m'),
+                 (10, reports.SpanType.NON_WORK): duration('10m'),
+                 (11, reports.SpanType.WORK): duration('10m')})
+
+    def test_counts_dst_changes(self):
+        zone = zoneinfo.ZoneInfo('Europe/London')
+        # Clocks went forward an hour at 01:00 on Mar 28.
+        span = reports.ReportSpan(
+                name='trackd', type_=reports.SpanType.WORK,
+                start=datetime.datetime(2021, 3, 27, 23, 0, tzinfo=zone),
+                end=datetime.datetime(2021, 3, 28, 3, 0, tzinfo=zone))
+
+        self.assertEqual(
+                aggregate.aggregate([span], aggregate.group_by(['day'])),
+                {(datetime.date(2021, 3, 27),): duration('1h'),
+                 (datetime.date(2021, 3, 28),): duration('2h')})
+
+    def test_unknown_dimension(self):
+        with self.assertRaises(ValueError):
+            aggregate.group_by(['project'])
+        with self.assertRaises(ValueError):
+            aggregate.group_by(['bucket'])
+
+    def test_formats_weeks_with_their_year(self):
+        (week,) = aggregate.group_by(['week'])
+
+        self.assertEqual(week.format((2020, 53)), 'Dec 28 — Jan 03 2021')
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(aggregate))
+    return tests
+
+
+if __name__ == '__main__':
+    unittest.main()
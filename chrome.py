@@ -1,55 +1,136 @@
 from dataclasses import dataclass
 import logging
 import sys
-import threading
 
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import cherrypy
 
-import x11
+import actor
+import events
+import metrics
+import sources
+from storage import ChromeSession
+from tracing import TRACE, Stage
 
 
+logger = logging.getLogger(__name__)
+
+
+REQUEST_DURATION = metrics.Histogram(
+        'trackd_chrome_request_duration_seconds',
+        'Latency of requests from the Chrome extension.', ['method'])
+
+ChromeWindowId = int
+# Chrome's `chrome.windows.WINDOW_ID_NONE`: focus went out of the profile's windows.
+WINDOW_ID_NONE: ChromeWindowId = -1
+
+
+##
+# Messages handled by ChromeAdapter.
+
 @dataclass(frozen=True)
-class ChromeSession:
-    """Chrome sessions are represented by the chrome user + session name."""
-    session_name: str
+class SessionSetForWindowId:
     user: str
+    window_id: ChromeWindowId
+    session_name: Optional[str]
+
 
+@dataclass(frozen=True)
+class ActiveWindowSet:
+    user: str
+    window_id: ChromeWindowId
 
-class ChromeAdapter:
+
+@dataclass(frozen=True)
+class ChromeAdapterState:
+    active_window: Optional[Tuple[str, ChromeWindowId]]
+    chrome_is_focused: bool
+    active_session: Optional[ChromeSession]
+
+
+class ChromeAdapter(actor.Actor[ChromeAdapterState]):
+    """Keeps track of Chrome windows, and which one of them is active.
+
+    Chrome window IDs are only unique within a Chrome profile, so windows are
+    keyed by the (user, window ID) pair.  That also allows tracking several
+    Chrome profiles at the same time.
+
+    An actor: the public methods only send a message, which is handled on the
+    thread running `run()`.
+    """
 
     def __init__(self, span_tracker):
-        self._lock = threading.Lock()
+        super().__init__()
         self._span_tracker = span_tracker
-        self._current_session: Optional[ChromeSession] = None
+        self._window_sessions: Dict[Tuple[str, ChromeWindowId], ChromeSession] = {}
+        self._active_window: Optional[Tuple[str, ChromeWindowId]] = None
         self._chrome_is_focused = False
+        self._handle(events.FocusChanged, self._on_focus_changed)
+        self._handle(SessionSetForWindowId, self._on_session_set_for_window_id)
+        self._handle(ActiveWindowSet, self._on_active_window_set)
+        self._publish(ChromeAdapterState(
+            active_window=None, chrome_is_focused=False, active_session=None))
 
     def _check_span(self):
-        if self._current_session is None:
-            self._span_tracker.update_active_session(None)
-            return
+        session = self._active_session()
+        self._span_tracker.update_active_session(session)
+        self._publish(ChromeAdapterState(
+            active_window=self._active_window,
+            chrome_is_focused=self._chrome_is_focused,
+            active_session=session))
+
+    def _active_session(self) -> Optional[ChromeSession]:
+        if self._active_window is None:
+            return None
         if not self._chrome_is_focused:
-            self._span_tracker.update_active_session(None)
-            return
-
-        self._span_tracker.update_active_session(self._current_session)
-
-    def session_changed(self, session: ChromeSession) -> None:
-        logging.debug(f'ChromeAdapter.session_changed({session!r})')
-        with self._lock:
-            if (session.session_name is None and
-                    self._current_session is not None and
-                    session.user == self._current_session.user):
-                self._current_session = None
-                return
-            self._current_session = session
-            self._check_span()
-
-    def set_focused_x_window_id(self, x_window_id: x11.XWindowId, window_name: str) -> None:
-        with self._lock:
-            self._chrome_is_focused = 'Google Chrome' in window_name
-            self._check_span()
+            return None
+
+        return self._window_sessions.get(self._active_window)
+
+    def set_session_for_window_id(self, user: str, window_id: ChromeWindowId,
+                                  session_name: Optional[str]) -> None:
+        """Sets the session for a Chrome window.  `None` forgets the window."""
+        self.send(SessionSetForWindowId(user, window_id, session_name))
+
+    def _on_session_set_for_window_id(self, message: SessionSetForWindowId) -> None:
+        logger.debug('%r', message)
+        key = (message.user, message.window_id)
+        if message.session_name is None:
+            self._window_sessions.pop(key, None)
+        else:
+            self._window_sessions[key] = ChromeSession(
+                    session_name=message.session_name, user=message.user)
+        self._check_span()
+
+    def set_active_window(self, user: str, window_id: ChromeWindowId) -> None:
+        self.send(ActiveWindowSet(user, window_id))
+
+    def _on_active_window_set(self, message: ActiveWindowSet) -> None:
+        logger.debug('%r', message)
+        if message.window_id == WINDOW_ID_NONE:
+            # When focus moves between profiles, the profile losing focus
+            # may report after the one gaining it.  Don't let it reset
+            # someone else's active window.
+            if self._active_window is not None and self._active_window[0] == message.user:
+                self._active_window = None
+        else:
+            self._active_window = (message.user, message.window_id)
+        self._check_span()
+
+    def set_focused_x_window_id(self, x_window_id: events.XWindowId, window: events.XWindowInfo) -> None:
+        self.send(events.FocusChanged(x_window_id, window))
+
+    def _on_focus_changed(self, message: events.FocusChanged) -> None:
+        self._chrome_is_focused = is_chrome_window(message.window)
+        self._check_span()
+
+
+def is_chrome_window(window: events.XWindowInfo) -> bool:
+    if window.wm_class:
+        return window.wm_class[-1].lower().startswith('google-chrome')
+    # Fall back to the title for windows without WM_CLASS.
+    return 'Google Chrome' in window.name
 
 
 class Chrome():
@@ -61,12 +142,33 @@ class Chrome():
     @cherrypy.expose
     @cherrypy.tools.json_out()
     @cherrypy.tools.json_in()
-    def session_changed(self):
+    def set_session_for_window_id(self):
+        if cherrypy.request.method != 'POST':
+            return
+
+        TRACE.new_trace(Stage.CHROME_REQUEST, TRACE.label('set_session_for_window_id'))
+        with REQUEST_DURATION.time('set_session_for_window_id'):
+            request = cherrypy.request.json
+            self._chrome_adapter.set_session_for_window_id(
+                    user=request['user'],
+                    window_id=request['window_id'],
+                    session_name=request['session_name'])
+
+        return {}
+
+    @cherrypy.expose
+    @cherrypy.tools.json_out()
+    @cherrypy.tools.json_in()
+    def set_active_window(self):
         if cherrypy.request.method != 'POST':
             return
 
-        session = ChromeSession(**cherrypy.request.json)
-        self._chrome_adapter.session_changed(session)
+        TRACE.new_trace(Stage.CHROME_REQUEST, TRACE.label('set_active_window'))
+        with REQUEST_DURATION.time('set_active_window'):
+            request = cherrypy.request.json
+            self._chrome_adapter.set_active_window(
+                    user=request['user'],
+                    window_id=request['window_id'])
 
         return {}
 
@@ -86,3 +188,19 @@ def serve(chrome_http: Chrome, port: int):
         'log.screen': False,
     })
     cherrypy.quickstart(chrome_http)
+
+
+class ChromeSource(sources.Source):
+    """Gets Chrome windows' sessions from the extension, and focus from the event bus."""
+
+    def __init__(self, port: str = '3142'):
+        self._port = int(port)
+
+    def start(self, context: sources.SourceContext) -> None:
+        chrome_adapter = ChromeAdapter(context.span_tracker())
+        context.add_actor(chrome_adapter)
+        context.start_thread(chrome_adapter.run, name='chrome-adapter')
+        context.bus.subscribe(events.FocusChanged, lambda event: (
+            chrome_adapter.set_focused_x_window_id(event.x_window_id, event.window)))
+        context.start_thread(serve, name='chrome-http',
+                             chrome_http=Chrome(chrome_adapter), port=self._port)
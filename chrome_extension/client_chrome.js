@@ -1,51 +1,95 @@
 'use strict';
 
+// trackd keeps a window ID → session map, so a focus change is reported
+// with a single small message.  Sessions are reported when tab groups
+// change, which happens much less often than focus changes.
 
-function reportSesssionForWindow(windowId) {
+const SERVER = 'http://localhost:3142';
+
+// The profile's user doesn't change while the extension is running.
+const userPromise = new Promise(resolve => {
+    chrome.identity.getProfileUserInfo(userInfo => resolve(userInfo.email));
+});
+
+
+function post(method, data) {
+    return userPromise.then(user => {
+        data.user = user;
+        return fetch(`${SERVER}/${method}`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify(data)
+        });
+    }).then(response => response.json())
+        .then(json => {})
+        .catch(res => console.error(res));
+}
+
+
+function setActiveWindow(windowId) {
     console.log(`${(new Date()).toISOString()}: onFocusChanged(${windowId})`);
-    if (windowId == -1) {
-        sessionChanged(null);
+    post('set_active_window', {window_id: windowId});
+}
+
+
+function setSessionForWindowId(windowId, session) {
+    console.log(`${(new Date()).toISOString()}: setSessionForWindowId(${windowId}, ${session})`);
+    post('set_session_for_window_id', {window_id: windowId, session_name: session});
+}
+
+
+function reportSessionForWindow(windowId) {
+    if (windowId == chrome.windows.WINDOW_ID_NONE) {
         return;
     }
 
     chrome.windows.get(windowId, {populate: true}, window_ => {
+        if (chrome.runtime.lastError) {
+            // The window is gone already.
+            return;
+        }
         for (let tab of window_.tabs) {
-            if (tab.groupId != -1) {
+            if (tab.groupId != chrome.tabGroups.TAB_GROUP_ID_NONE) {
                 chrome.tabGroups.get(tab.groupId, group => {
-                    sessionChanged(group.title);
+                    setSessionForWindowId(windowId, group.title);
                 });
                 return;
             }
         }
-        sessionChanged('unnamed');
+        setSessionForWindowId(windowId, 'unnamed');
     });
-
 }
 
 
-function sessionChanged(session) {
-    chrome.identity.getProfileUserInfo(userInfo => {
-        let data = {
-            session_name: session,
-            user: userInfo.email,
-        };
-
-        console.log(`${(new Date()).toISOString()}: sessionChanged(${session})`);
+chrome.windows.onFocusChanged.addListener(setActiveWindow);
 
-        fetch('http://localhost:3142/session_changed', {
-            method: 'POST',
-            headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify(data)
-        }).then(response => response.json())
-            .then(json => {})
-            .catch(res => console.error(res));
-    });
-}
+chrome.windows.onCreated.addListener(window_ => reportSessionForWindow(window_.id));
+chrome.windows.onRemoved.addListener(windowId => setSessionForWindowId(windowId, null));
+chrome.tabGroups.onCreated.addListener(group => reportSessionForWindow(group.windowId));
+chrome.tabGroups.onUpdated.addListener(group => reportSessionForWindow(group.windowId));
+chrome.tabGroups.onRemoved.addListener(group => reportSessionForWindow(group.windowId));
+chrome.tabs.onUpdated.addListener((tabId, changeInfo, tab) => {
+    if (changeInfo.groupId !== undefined) {
+        reportSessionForWindow(tab.windowId);
+    }
+});
+chrome.tabs.onAttached.addListener((tabId, attachInfo) => reportSessionForWindow(attachInfo.newWindowId));
+chrome.tabs.onDetached.addListener((tabId, detachInfo) => reportSessionForWindow(detachInfo.oldWindowId));
+chrome.tabs.onRemoved.addListener((tabId, removeInfo) => {
+    if (!removeInfo.isWindowClosing) {
+        reportSessionForWindow(removeInfo.windowId);
+    }
+});
 
-chrome.windows.onFocusChanged.addListener(reportSesssionForWindow);
+// Report all the windows once, as trackd may have been restarted since.
+chrome.windows.getAll({}, windows => {
+    for (let window_ of windows) {
+        reportSessionForWindow(window_.id);
+    }
+});
 // The assumption is that as we just started, the Chrome should still be focused.
 // It may be good to check in trackd though that Chrome's XWindow is indeed focused
 // when this plugin reports so.
 chrome.windows.getLastFocused({}, window_ => {
-    reportSesssionForWindow(window_.id);
+    setActiveWindow(window_.id);
 });
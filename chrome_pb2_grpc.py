@@ -1,12 +1,32 @@
 # Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
 """Client and server classes corresponding to protobuf-defined services."""
 import grpc
+import warnings
 
 import chrome_pb2 as chrome__pb2
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
 
-class ChromeStub(object):
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in chrome_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class ChromeStub:
     """Missing associated documentation comment in .proto file."""
 
     def __init__(self, channel):
@@ -15,32 +35,21 @@ class ChromeStub(object):
         Args:
             channel: A grpc.Channel.
         """
-        self.session_changed = channel.unary_unary(
-                '/trackd.Chrome/session_changed',
-                request_serializer=chrome__pb2.SessionChangedRequest.SerializeToString,
-                response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
         self.set_session_for_window_id = channel.unary_unary(
                 '/trackd.Chrome/set_session_for_window_id',
                 request_serializer=chrome__pb2.SetSessionForWindowIdRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
         self.set_active_window = channel.unary_unary(
                 '/trackd.Chrome/set_active_window',
                 request_serializer=chrome__pb2.SetActiveWindowRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
 
 
-class ChromeServicer(object):
+class ChromeServicer:
     """Missing associated documentation comment in .proto file."""
 
-    def session_changed(self, request, context):
-        """Missing associated documentation comment in .proto file."""
-        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
-        context.set_details('Method not implemented!')
-        raise NotImplementedError('Method not implemented!')
-
     def set_session_for_window_id(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
@@ -56,11 +65,6 @@ class ChromeServicer(object):
 
 def add_ChromeServicer_to_server(servicer, server):
     rpc_method_handlers = {
-            'session_changed': grpc.unary_unary_rpc_method_handler(
-                    servicer.session_changed,
-                    request_deserializer=chrome__pb2.SessionChangedRequest.FromString,
-                    response_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
-            ),
             'set_session_for_window_id': grpc.unary_unary_rpc_method_handler(
                     servicer.set_session_for_window_id,
                     request_deserializer=chrome__pb2.SetSessionForWindowIdRequest.FromString,
@@ -75,29 +79,13 @@ def add_ChromeServicer_to_server(servicer, server):
     generic_handler = grpc.method_handlers_generic_handler(
             'trackd.Chrome', rpc_method_handlers)
     server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('trackd.Chrome', rpc_method_handlers)
 
 
  # This class is part of an EXPERIMENTAL API.
-class Chrome(object):
+class Chrome:
     """Missing associated documentation comment in .proto file."""
 
-    @staticmethod
-    def session_changed(request,
-            target,
-            options=(),
-            channel_credentials=None,
-            call_credentials=None,
-            insecure=False,
-            compression=None,
-            wait_for_ready=None,
-            timeout=None,
-            metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Chrome/session_changed',
-            chrome__pb2.SessionChangedRequest.SerializeToString,
-            google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
-
     @staticmethod
     def set_session_for_window_id(request,
             target,
@@ -109,11 +97,21 @@ class Chrome(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Chrome/set_session_for_window_id',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Chrome/set_session_for_window_id',
             chrome__pb2.SetSessionForWindowIdRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def set_active_window(request,
@@ -126,8 +124,18 @@ class Chrome(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Chrome/set_active_window',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Chrome/set_active_window',
             chrome__pb2.SetActiveWindowRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,122 @@
+import unittest
+
+import clock
+from trackd import SpanTracker
+from chrome import ChromeAdapter, ChromeSession, WINDOW_ID_NONE, is_chrome_window
+from x11 import XWindowInfo
+
+
+CHROME = XWindowInfo(name='New Tab - Google Chrome', wm_class=('google-chrome', 'Google-chrome'))
+TERMINAL = XWindowInfo(name='Terminal', wm_class=('gnome-terminal-server', 'Gnome-terminal'))
+
+
+class FakeSpanStorage:
+
+    def __init__(self):
+        self.spans = []
+
+    def add(self, span):
+        self.spans.append(span)
+
+
+class ChromeAdapterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.span_storage = FakeSpanStorage()
+        self.clock = clock.FakeClock()
+        self.span_tracker = SpanTracker(self.span_storage, clock=self.clock)
+        self.adapter = ChromeAdapter(self.span_tracker)
+        self.set_now(0)
+
+    def set_now(self, timestamp: int):
+        # Messages sent so far are handled at the previous time.
+        self.adapter.process_pending()
+        self.clock.set_timestamp(timestamp)
+
+    def test_active_window_change(self):
+        self.set_now(0)
+        self.adapter.set_focused_x_window_id(42, CHROME)
+        self.adapter.set_session_for_window_id('user', 1, 'first')
+        self.adapter.set_session_for_window_id('user', 2, 'second')
+        self.adapter.set_active_window('user', 1)
+
+        # Switching to another window should create a Span.
+        duration = 120
+        self.set_now(duration)
+        self.adapter.set_active_window('user', 2)
+        self.adapter.process_pending()
+
+        (span,) = self.span_storage.spans
+        self.assertEqual(span.session, ChromeSession(session_name='first', user='user'))
+        self.assertEqual((span.end - span.start).total_seconds(), duration)
+
+    def test_session_changed_for_active_window(self):
+        self.set_now(0)
+        self.adapter.set_focused_x_window_id(42, CHROME)
+        self.adapter.set_active_window('user', 1)
+        self.adapter.set_session_for_window_id('user', 1, 'first')
+
+        # Moving the window to another tab group should create a Span.
+        duration = 120
+        self.set_now(duration)
+        self.adapter.set_session_for_window_id('user', 1, 'second')
+        self.adapter.process_pending()
+
+        (span,) = self.span_storage.spans
+        self.assertEqual(span.session, ChromeSession(session_name='first', user='user'))
+        self.assertEqual((span.end - span.start).total_seconds(), duration)
+
+    def test_other_profile_losing_focus_doesnt_reset_active_window(self):
+        self.set_now(0)
+        self.adapter.set_focused_x_window_id(42, CHROME)
+        self.adapter.set_session_for_window_id('work', 1, 'project')
+        self.adapter.set_session_for_window_id('personal', 1, 'hobby')
+        self.adapter.set_active_window('personal', 1)
+        # The "work" profile gets focus, and then the "personal" profile
+        # reports losing it.
+        self.set_now(60)
+        self.adapter.set_active_window('work', 1)
+        self.adapter.set_active_window('personal', WINDOW_ID_NONE)
+
+        # X focus going away from Chrome should close the "work" span.
+        self.set_now(180)
+        self.adapter.set_focused_x_window_id(43, TERMINAL)
+        self.adapter.process_pending()
+
+        self.assertEqual(
+                [(span.session, (span.end - span.start).total_seconds())
+                 for span in self.span_storage.spans],
+                [(ChromeSession(session_name='hobby', user='personal'), 60),
+                 (ChromeSession(session_name='project', user='work'), 120)])
+
+    def test_closed_window_is_forgotten(self):
+        self.set_now(0)
+        self.adapter.set_focused_x_window_id(42, CHROME)
+        self.adapter.set_session_for_window_id('user', 1, 'first')
+        self.adapter.set_active_window('user', 1)
+
+        # Closing the active window should create a Span.
+        duration = 120
+        self.set_now(duration)
+        self.adapter.set_session_for_window_id('user', 1, None)
+        self.adapter.process_pending()
+
+        (span,) = self.span_storage.spans
+        self.assertEqual(span.session, ChromeSession(session_name='first', user='user'))
+        self.assertEqual((span.end - span.start).total_seconds(), duration)
+
+
+class IsChromeWindowTest(unittest.TestCase):
+
+    def test_classifies_by_wm_class(self):
+        self.assertTrue(is_chrome_window(CHROME))
+        self.assertFalse(is_chrome_window(
+            XWindowInfo(name='Google Chrome - Wikipedia', wm_class=('gnome-terminal-server', 'Gnome-terminal'))))
+
+    def test_falls_back_to_window_name(self):
+        self.assertTrue(is_chrome_window(XWindowInfo(name='New Tab - Google Chrome')))
+        self.assertFalse(is_chrome_window(XWindowInfo(name='Terminal')))
+
+
+if __name__ == '__main__':
+    unittest.main()
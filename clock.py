@@ -0,0 +1,181 @@
+"""Clocks: where trackd gets the time from.
+
+`SystemClock` caches the local time zone, and looks for time zone changes
+(in $TZ and /etc/localtime) at most once a `refresh_interval`.  Durations
+come from the monotonic clock: `Instant` pairs a wall clock time with a
+monotonic one, so a span's end is its start plus the monotonic time since,
+and NTP adjustments or a suspend don't stretch or shrink it.
+
+`FakeClock` is set by hand, for tests, replays and benchmarks.
+
+Only imports stdlib modules.
+"""
+import datetime
+import os
+import threading
+import time
+import zoneinfo
+
+from typing import NamedTuple, Optional, Tuple
+
+
+LOCALTIME = '/etc/localtime'
+
+
+class Instant(NamedTuple):
+    wall: datetime.datetime
+    monotonic: float
+
+
+class Clock:
+
+    def now(self) -> datetime.datetime:
+        """Returns the current time in the local zone."""
+        raise NotImplementedError
+
+    def monotonic(self) -> float:
+        raise NotImplementedError
+
+    def zone(self) -> datetime.tzinfo:
+        raise NotImplementedError
+
+    def instant(self) -> Instant:
+        return Instant(self.now(), self.monotonic())
+
+    def since(self, start: Instant) -> datetime.datetime:
+        """Returns the current time, as `start` plus the monotonic time since."""
+        return start.wall + datetime.timedelta(seconds=self.monotonic() - start.monotonic)
+
+
+class SystemClock(Clock):
+
+    def __init__(self, refresh_interval: float = 60):
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._zone_source: Optional[Tuple] = None
+        self._zone: datetime.tzinfo = datetime.timezone.utc
+        self._checked = -float('inf')
+
+    def now(self) -> datetime.datetime:
+        return datetime.datetime.now(self.zone())
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def zone(self) -> datetime.tzinfo:
+        if time.monotonic() - self._checked >= self._refresh_interval:
+            self._refresh_zone()
+        return self._zone
+
+    def _refresh_zone(self) -> None:
+        with self._lock:
+            self._checked = time.monotonic()
+            zone_source = _zone_source()
+            if zone_source == self._zone_source:
+                return
+            self._zone_source = zone_source
+            self._zone = _local_zone()
+
+
+def _zone_source() -> Tuple:
+    """Returns what the local zone is determined by, to notice changes."""
+    try:
+        stat = os.stat(LOCALTIME)
+        localtime: Tuple = (os.path.realpath(LOCALTIME), stat.st_ino, stat.st_mtime_ns)
+    except OSError:
+        localtime = ()
+    return os.environ.get('TZ'), localtime
+
+
+def _local_zone() -> datetime.tzinfo:
+    # Makes libc, and so `_LibcZone`, follow $TZ too.
+    time.tzset()
+    tz = os.environ.get('TZ', '').lstrip(':')
+    if tz:
+        # A zoneinfo key, a path to a zone file, or a POSIX rule, which only
+        # libc understands, e.g. "CET-1CEST,M3.5.0,M10.5.0/3".
+        zone = _zone_file(tz) if os.path.isabs(tz) else _zone_key(tz)
+        return zone or _LibcZone()
+    # /etc/localtime is usually a symlink into the zoneinfo database.
+    _, sep, key = os.path.realpath(LOCALTIME).partition('/zoneinfo/')
+    return (sep and _zone_key(key)) or _zone_file(LOCALTIME) or _LibcZone()
+
+
+def _zone_key(key: str) -> Optional[zoneinfo.ZoneInfo]:
+    try:
+        return zoneinfo.ZoneInfo(key)
+    except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _zone_file(path: str) -> Optional[zoneinfo.ZoneInfo]:
+    try:
+        with open(path, 'rb') as f:
+            return zoneinfo.ZoneInfo.from_file(f)
+    except (OSError, ValueError):
+        return None
+
+
+class _LibcZone(datetime.tzinfo):
+    """The zone of libc's local time, for zones zoneinfo can't load.
+
+    Offsets are looked up on every call, so they follow DST changes.
+    """
+
+    def utcoffset(self, dt: Optional[datetime.datetime]) -> datetime.timedelta:
+        return datetime.timedelta(seconds=self._localtime(dt).tm_gmtoff)
+
+    def dst(self, dt: Optional[datetime.datetime]) -> datetime.timedelta:
+        if self._localtime(dt).tm_isdst > 0:
+            return datetime.timedelta(seconds=time.timezone - time.altzone)
+        return datetime.timedelta(0)
+
+    def tzname(self, dt: Optional[datetime.datetime]) -> str:
+        return self._localtime(dt).tm_zone
+
+    def fromutc(self, dt: datetime.datetime) -> datetime.datetime:
+        timestamp = dt.replace(tzinfo=datetime.timezone.utc).timestamp()
+        return dt + datetime.timedelta(seconds=time.localtime(timestamp).tm_gmtoff)
+
+    def _localtime(self, dt: Optional[datetime.datetime]) -> time.struct_time:
+        if dt is None:
+            return time.localtime()
+        # Not `dt.timetuple()`, which calls `dst()`.  -1: whether DST is in
+        # effect is up to libc.
+        return time.localtime(time.mktime((dt.year, dt.month, dt.day, dt.hour, dt.minute,
+                                           dt.second, dt.weekday(), 0, -1)))
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}()'
+
+
+class FakeClock(Clock):
+
+    def __init__(self, now: Optional[datetime.datetime] = None,
+                 zone: datetime.tzinfo = datetime.timezone.utc):
+        self._zone = zone
+        self._now = now if now is not None else datetime.datetime.fromtimestamp(0, zone)
+        self._monotonic = 0.0
+
+    def set(self, now: datetime.datetime) -> None:
+        """Sets the time, moving the monotonic clock by as much."""
+        self._monotonic += (now - self._now).total_seconds()
+        self._now = now
+
+    def set_timestamp(self, timestamp: float) -> None:
+        self.set(datetime.datetime.fromtimestamp(timestamp, self._zone))
+
+    def advance(self, seconds: float) -> None:
+        self.set(self._now + datetime.timedelta(seconds=seconds))
+
+    def now(self) -> datetime.datetime:
+        return self._now
+
+    def monotonic(self) -> float:
+        return self._monotonic
+
+    def zone(self) -> datetime.tzinfo:
+        return self._zone
+
+
+SYSTEM = SystemClock()
@@ -0,0 +1,108 @@
+import datetime
+import os
+import pathlib
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+import zoneinfo
+
+import clock
+
+
+class JumpyClock(clock.FakeClock):
+    """A clock whose wall time can jump, e.g. on an NTP adjustment."""
+
+    def jump(self, seconds: float) -> None:
+        self._now += datetime.timedelta(seconds=seconds)
+
+
+class ClockTest(unittest.TestCase):
+
+    def test_since_uses_monotonic_time(self):
+        fake_clock = JumpyClock()
+        start = fake_clock.instant()
+
+        fake_clock.advance(60)
+        fake_clock.jump(-3600)
+
+        self.assertEqual(fake_clock.since(start) - start.wall, datetime.timedelta(seconds=60))
+
+    def test_fake_clock(self):
+        fake_clock = clock.FakeClock()
+        fake_clock.set_timestamp(100)
+        fake_clock.advance(20)
+
+        self.assertEqual(fake_clock.now().timestamp(), 120)
+        self.assertEqual(fake_clock.monotonic(), 120)
+        self.assertEqual(fake_clock.now().tzinfo, datetime.timezone.utc)
+
+
+class SystemClockTest(unittest.TestCase):
+
+    def test_refreshes_zone_on_tz_change(self):
+        system_clock = clock.SystemClock(refresh_interval=0)
+        with mock.patch.dict(os.environ, {'TZ': 'Europe/London'}):
+            self.assertEqual(str(system_clock.zone()), 'Europe/London')
+            self.assertEqual(system_clock.now().tzinfo, system_clock.zone())
+        with mock.patch.dict(os.environ, {'TZ': 'Asia/Tokyo'}):
+            self.assertEqual(str(system_clock.zone()), 'Asia/Tokyo')
+
+    def test_caches_zone(self):
+        system_clock = clock.SystemClock(refresh_interval=3600)
+        with mock.patch.dict(os.environ, {'TZ': 'Europe/London'}):
+            system_clock.zone()
+        with mock.patch.dict(os.environ, {'TZ': 'Asia/Tokyo'}):
+            self.assertEqual(str(system_clock.zone()), 'Europe/London')
+
+
+def zone_file(key: str) -> pathlib.Path:
+    for directory in zoneinfo.TZPATH:
+        path = pathlib.Path(directory) / key
+        if path.is_file():
+            return path
+    raise unittest.SkipTest(f'No zoneinfo file for {key}')
+
+
+class LocalZoneTest(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        # A copy, not a symlink into the zoneinfo database.
+        self.berlin = pathlib.Path(temp_dir.name) / 'localtime'
+        shutil.copy(zone_file('Europe/Berlin'), self.berlin)
+        # `_local_zone()` points libc at the patched $TZ.
+        self.addCleanup(time.tzset)
+
+    def assertFollowsBerlinDst(self, zone):
+        self.assertEqual(datetime.datetime(2021, 1, 15, 12, tzinfo=zone).utcoffset(),
+                         datetime.timedelta(hours=1))
+        self.assertEqual(datetime.datetime(2021, 7, 15, 12, tzinfo=zone).utcoffset(),
+                         datetime.timedelta(hours=2))
+        self.assertEqual(
+                datetime.datetime(2021, 7, 15, 10, tzinfo=datetime.timezone.utc).astimezone(zone),
+                datetime.datetime(2021, 7, 15, 12, tzinfo=zone))
+
+    def test_localtime_file(self):
+        with mock.patch.dict(os.environ), mock.patch.object(clock, 'LOCALTIME', str(self.berlin)):
+            os.environ.pop('TZ', None)
+            self.assertFollowsBerlinDst(clock._local_zone())
+
+    def test_tz_path(self):
+        with mock.patch.dict(os.environ, {'TZ': str(self.berlin)}):
+            self.assertFollowsBerlinDst(clock._local_zone())
+
+    def test_tz_posix_rule(self):
+        with mock.patch.dict(os.environ, {'TZ': 'CET-1CEST,M3.5.0,M10.5.0/3'}):
+            self.assertFollowsBerlinDst(clock._local_zone())
+
+    def test_tz_overrides_localtime(self):
+        with mock.patch.dict(os.environ, {'TZ': 'Asia/Tokyo'}), \
+                mock.patch.object(clock, 'LOCALTIME', str(self.berlin)):
+            self.assertEqual(str(clock._local_zone()), 'Asia/Tokyo')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+"""An append-only log of the raw events behind spans.
+
+Every message sent to an adapter (focus and lock changes, tmux client and
+session changes, Chrome window sessions) is appended to the `events` table,
+next to `spans` in spans.db.  Spans are a view of the events: replaying the
+log through fresh adapters (see reducer.py) derives them again, e.g. after
+fixing a bug in an adapter.
+
+Messages are frozen dataclasses, stored as JSON tagged with their types.
+Only imports stdlib modules.
+"""
+import dataclasses
+import importlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from typing import Any, Iterator, List, NamedTuple, Optional, Tuple
+
+import metrics
+import writer
+
+
+logger = logging.getLogger(__name__)
+
+
+EVENTS_LOGGED = metrics.Counter('trackd_events_logged_total', 'Events saved to the event log.')
+EVENTS_DROPPED = metrics.Counter(
+        'trackd_events_dropped_total', 'Events dropped because the event log queue was full.')
+EVENT_LOG_BATCH_SIZE = metrics.Histogram(
+        'trackd_event_log_batch_size', 'Events saved per transaction.',
+        buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+# Modules messages can come from.  Decoding only imports these.
+MESSAGE_MODULES = ('chrome', 'events', 'storage', 'tmux')
+
+
+class Event(NamedTuple):
+    id: int
+    timestamp: float
+    source: str
+    message: Any
+
+
+def encode(message) -> str:
+    """Encodes a message as JSON.
+
+    >>> import events
+    >>> encode(events.FocusChanged(1, events.XWindowInfo('Terminal', ('xterm', 'XTerm'))))
+    '{"@": "events.FocusChanged", "x_window_id": 1, "window": {"@": "events.XWindowInfo", "name": "Terminal", "wm_class": {"@": "tuple", "items": ["xterm", "XTerm"]}}, "trace_id": 0}'
+    """
+    return json.dumps(to_plain(message), separators=(', ', ': '))
+
+
+def decode(text: str):
+    """Decodes a message encoded with `encode()`.
+
+    >>> import events
+    >>> message = events.FocusChanged(1, events.XWindowInfo('Terminal', ('xterm', 'XTerm')))
+    >>> decode(encode(message)) == message
+    True
+    """
+    return from_plain(json.loads(text))
+
+
+def to_plain(value):
+    """Converts a message to dicts, lists, strings and numbers."""
+    if dataclasses.is_dataclass(value):
+        result = {'@': f'{type(value).__module__}.{type(value).__qualname__}'}
+        for field in dataclasses.fields(value):
+            result[field.name] = to_plain(getattr(value, field.name))
+        return result
+    if isinstance(value, tuple):
+        return {'@': 'tuple', 'items': [to_plain(item) for item in value]}
+    if isinstance(value, dict):
+        # Keys are often dataclasses.
+        return {'@': 'dict', 'items': [[to_plain(k), to_plain(v)] for k, v in value.items()]}
+    if isinstance(value, (list, frozenset, set)):
+        raise TypeError(f"Can't encode {value!r}")
+    return value
+
+
+def from_plain(value):
+    """Converts the result of `to_plain()` back to a message."""
+    if not isinstance(value, dict):
+        return value
+    type_name = value['@']
+    if type_name == 'tuple':
+        return tuple(from_plain(item) for item in value['items'])
+    if type_name == 'dict':
+        return {from_plain(k): from_plain(v) for k, v in value['items']}
+    module_name, _, class_name = type_name.rpartition('.')
+    if module_name not in MESSAGE_MODULES:
+        raise ValueError(f'Unexpected message type: {type_name!r}')
+    cls = getattr(importlib.import_module(module_name), class_name)
+    return cls(**{name: from_plain(field_value) for name, field_value in value.items()
+                  if name != '@'})
+
+
+class EventLog:
+
+    def __init__(self, db_path: str):
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS events (
+                id integer PRIMARY KEY,
+                timestamp real,
+                source text,
+                type text,
+                payload text
+            )
+        """)
+        self._conn.commit()
+        self._lock = threading.Lock()
+
+    def append(self, events: List[Tuple[float, str, Any]]) -> None:
+        """Appends (timestamp, source, message) tuples in one transaction."""
+        rows = [(timestamp, source, type(message).__name__, encode(message))
+                for timestamp, source, message in events]
+        with self._lock:
+            self._conn.executemany(
+                    'INSERT INTO events (timestamp, source, type, payload) VALUES (?, ?, ?, ?)', rows)
+            self._conn.commit()
+
+    def read(self, after_id: int = 0, batch_size: int = 1000) -> Iterator[Event]:
+        """Yields events with IDs greater than `after_id`, in order."""
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                        'SELECT id, timestamp, source, payload FROM events '
+                        'WHERE id > ? ORDER BY id LIMIT ?', (after_id, batch_size)).fetchall()
+            for id_, timestamp, source, payload in rows:
+                yield Event(id_, timestamp, source, decode(payload))
+            if len(rows) < batch_size:
+                return
+            after_id = rows[-1][0]
+
+
+class EventLogWriter:
+    """Appends events to an `EventLog` in batches, on a dedicated thread.
+
+    Like `trackd.SpanWriter`, `record()` never blocks, and drops events if
+    the log is stuck.
+    """
+
+    def __init__(self, event_log: EventLog, max_queue_size: int = 100000, max_batch: int = 1000):
+        self._event_log = event_log
+        self._writer = writer.QueueWriter(self._append, max_queue_size, max_batch)
+
+    def record(self, source: str, message) -> None:
+        """Takes (source, message) pairs, as an `actor.Actor` recorder."""
+        if not self._writer.put((time.time(), source, message)):
+            EVENTS_DROPPED.inc()
+            logger.error('Event log queue is full, dropping %r', message)
+
+    def run(self) -> None:
+        self._writer.run()
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Saves all the queued events and stops `run()`, waiting up to `timeout`."""
+        if not self._writer.close(timeout):
+            logger.error('Timed out saving events, %d left unsaved', self._writer.qsize())
+
+    def _append(self, batch: List[Tuple[float, str, Any]]) -> None:
+        try:
+            self._event_log.append(batch)
+        except Exception:
+            logger.exception('Failed to save %d events', len(batch))
+            return
+        EVENTS_LOGGED.inc(amount=len(batch))
+        EVENT_LOG_BATCH_SIZE.observe(len(batch))
@@ -0,0 +1,168 @@
+import doctest
+import threading
+import time
+import unittest
+
+import chrome
+import event_log
+import events
+import reducer
+import tmux
+from tmux import TmuxClient, TmuxSession
+
+
+TERMINAL = events.XWindowInfo(name='Terminal', wm_class=('gnome-terminal-server', 'Gnome-terminal'))
+CHROME = events.XWindowInfo(name='New Tab - Google Chrome', wm_class=('google-chrome', 'Google-chrome'))
+CLIENT = TmuxClient(hostname='host', client_name='/dev/pts/1')
+SESSION = TmuxSession(session_name='session', hostname='host', server_pid=42)
+
+
+class FakeSpanStorage:
+
+    def __init__(self):
+        self.spans = []
+
+    def add(self, span):
+        self.spans.append(span)
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_round_trips_adapter_messages(self):
+        messages = [
+            events.FocusChanged(events.LOCKED_WINDOW_ID, events.LOCKED_WINDOW),
+            tmux.ClientSetForXWindowId(42, CLIENT),
+            tmux.ClientClearedForXWindowId(42),
+            tmux.ClientSessionChanged(CLIENT, SESSION),
+            tmux.ClientDetached(CLIENT),
+            tmux.SessionRenamed(CLIENT, SESSION),
+            tmux.SessionClosed(SESSION),
+            tmux.StateSynced('host', {42: CLIENT}, {CLIENT: SESSION}),
+            chrome.SessionSetForWindowId('user', 1, 'project'),
+            chrome.SessionSetForWindowId('user', 1, None),
+            chrome.ActiveWindowSet('user', 1),
+        ]
+        for message in messages:
+            self.assertEqual(event_log.decode(event_log.encode(message)), message)
+
+    def test_only_decodes_message_modules(self):
+        with self.assertRaises(ValueError):
+            event_log.decode('{"@": "os.system"}')
+
+
+class EventLogTest(unittest.TestCase):
+
+    def test_read_after(self):
+        log = event_log.EventLog(':memory:')
+        log.append([(1.0, 'TmuxAdapter', tmux.ClientDetached(CLIENT)),
+                    (2.0, 'TmuxAdapter', tmux.SessionClosed(SESSION))])
+        log.append([(3.0, 'ChromeAdapter', chrome.ActiveWindowSet('user', 1))])
+
+        self.assertEqual([(e.id, e.timestamp, e.message) for e in log.read(after_id=1, batch_size=1)], [
+            (2, 2.0, tmux.SessionClosed(SESSION)),
+            (3, 3.0, chrome.ActiveWindowSet('user', 1)),
+        ])
+
+    def test_writer_records_actor_messages(self):
+        log = event_log.EventLog(':memory:')
+        writer = event_log.EventLogWriter(log, max_batch=2)
+        writer_thread = threading.Thread(target=writer.run, daemon=True)
+        writer_thread.start()
+        adapter = tmux.TmuxAdapter(None)
+        adapter.record_to(writer.record)
+
+        adapter.client_detached(CLIENT)
+        adapter.session_closed(SESSION)
+        adapter.set_focused_x_window_id(1, TERMINAL)
+        writer.close(timeout=10)
+
+        self.assertEqual([(e.source, e.message) for e in log.read()], [
+            ('TmuxAdapter', tmux.ClientDetached(CLIENT)),
+            ('TmuxAdapter', tmux.SessionClosed(SESSION)),
+            ('TmuxAdapter', events.FocusChanged(1, TERMINAL)),
+        ])
+
+    def test_close_times_out_when_log_is_stuck(self):
+        log = StuckEventLog()
+        writer = event_log.EventLogWriter(log, max_queue_size=1)
+        threading.Thread(target=writer.run, daemon=True).start()
+        writer.record('TmuxAdapter', tmux.ClientDetached(CLIENT))
+        log.appending.wait(timeout=5)
+        # The queue is full.
+        writer.record('TmuxAdapter', tmux.SessionClosed(SESSION))
+
+        start = time.monotonic()
+        with self.assertLogs(level='ERROR'):
+            writer.close(timeout=.1)
+
+        self.assertLess(time.monotonic() - start, 5)
+        log.unstuck.set()
+
+
+class StuckEventLog:
+
+    def __init__(self):
+        self.appending = threading.Event()
+        self.unstuck = threading.Event()
+
+    def append(self, events):
+        self.appending.set()
+        self.unstuck.wait()
+
+
+class ReducerTest(unittest.TestCase):
+
+    def test_derives_spans_incrementally(self):
+        log = event_log.EventLog(':memory:')
+        log.append([
+            (100.0, 'TmuxAdapter', events.FocusChanged(42, TERMINAL)),
+            (100.0, 'ChromeAdapter', events.FocusChanged(42, TERMINAL)),
+            (100.0, 'TmuxAdapter', tmux.ClientSetForXWindowId(42, CLIENT)),
+            (100.0, 'TmuxAdapter', tmux.ClientSessionChanged(CLIENT, SESSION)),
+            (130.0, 'ChromeAdapter', chrome.SessionSetForWindowId('user', 7, 'project')),
+            (130.0, 'ChromeAdapter', chrome.ActiveWindowSet('user', 7)),
+        ])
+        span_storage = FakeSpanStorage()
+        reducer_ = reducer.Reducer(span_storage)
+
+        self.assertEqual(reducer_.catch_up(log), 6)
+        self.assertEqual(span_storage.spans, [])
+
+        log.append([
+            (160.0, 'TmuxAdapter', events.FocusChanged(43, CHROME)),
+            (160.0, 'ChromeAdapter', events.FocusChanged(43, CHROME)),
+            (220.0, 'TmuxAdapter', events.FocusChanged(42, TERMINAL)),
+            (220.0, 'ChromeAdapter', events.FocusChanged(42, TERMINAL)),
+        ])
+        self.assertEqual(reducer_.catch_up(log), 4)
+
+        self.assertEqual([(span.session, span.start.timestamp(), span.end.timestamp())
+                          for span in span_storage.spans], [
+            (SESSION, 100.0, 160.0),
+            (chrome.ChromeSession(session_name='project', user='user'), 160.0, 220.0),
+        ])
+        self.assertEqual(reducer_.last_event_id, 10)
+
+    def test_replay_is_deterministic(self):
+        log = event_log.EventLog(':memory:')
+        log.append([
+            (100.0, 'TmuxAdapter', events.FocusChanged(42, TERMINAL)),
+            (100.0, 'TmuxAdapter', tmux.StateSynced('host', {42: CLIENT}, {CLIENT: SESSION})),
+            (150.0, 'TmuxAdapter', tmux.ClientDetached(CLIENT)),
+        ])
+        first, second = FakeSpanStorage(), FakeSpanStorage()
+
+        self.assertEqual(reducer.derive_spans(log, first), 3)
+        reducer.derive_spans(log, second)
+
+        self.assertEqual(len(first.spans), 1)
+        self.assertEqual(first.spans, second.spans)
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(event_log))
+    return tests
+
+
+if __name__ == '__main__':
+    unittest.main()
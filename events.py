@@ -0,0 +1,35 @@
+"""Events passed between sources on the event bus (see sources.py).
+
+Only imports stdlib modules, so sources consuming events don't pull in the
+dependencies of the sources producing them.
+"""
+from dataclasses import dataclass, field
+
+from typing import Tuple
+
+
+XWindowId = int
+
+
+@dataclass(frozen=True)
+class XWindowInfo:
+    """Cached properties of an X window.
+
+    `wm_class` is the WM_CLASS property, i.e. an (instance, class) pair, e.g.
+    ('google-chrome', 'Google-chrome').  It's empty if the window doesn't have one.
+    """
+    name: str
+    wm_class: Tuple[str, ...] = ()
+
+
+LOCKED_WINDOW_ID: XWindowId = -1
+LOCKED_WINDOW = XWindowInfo(name='locked')
+UNKNOWN_WINDOW = XWindowInfo(name='')
+
+
+@dataclass(frozen=True)
+class FocusChanged:
+    """The focused X window has changed (after debouncing)."""
+    x_window_id: XWindowId
+    window: XWindowInfo
+    trace_id: int = field(default=0, compare=False)
@@ -0,0 +1,77 @@
+"""Import-time benchmark for the command line tools.
+
+Imports each module in fresh interpreters, `--runs` times, and prints the
+median import time, plus the modules contributing most to it.  With `--rev`,
+does the same for a git revision (exported into a temporary directory), for
+before/after comparisons.
+
+Usage: python import_bench.py [--rev HEAD~1] [reports trackctl ...]
+"""
+import pathlib
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from typing import Dict, List, Optional, Tuple
+
+import click
+
+
+def import_times(module: str, cwd: pathlib.Path) -> Dict[str, int]:
+    """Returns cumulative import times, in µs, of everything imported by `module`."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                          cwd=cwd, capture_output=True, text=True, check=True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Keep the indentation, which shows the nesting.
+        times[name[1:]] = int(cumulative)
+    return times
+
+
+def bench(module: str, cwd: pathlib.Path, runs: int) -> Tuple[float, List[Tuple[str, float]]]:
+    """Returns the median import time of `module`, and of its heaviest direct imports."""
+    # The first run compiles bytecode.
+    import_times(module, cwd)
+    samples = [import_times(module, cwd) for _ in range(runs)]
+    total = statistics.median(sample[module] for sample in samples)
+    children = {}
+    for name in samples[0]:
+        # Direct imports are indented by two spaces.
+        if name.startswith('  ') and not name.startswith('   '):
+            children[name.strip()] = statistics.median(sample.get(name, 0) for sample in samples)
+    heaviest = sorted(children.items(), key=lambda item: item[1], reverse=True)
+    return total, heaviest
+
+
+def report(label: str, cwd: pathlib.Path, modules: List[str], runs: int, top: int) -> None:
+    print(f'== {label}')
+    for module in modules:
+        total, heaviest = bench(module, cwd, runs)
+        print(f'{module:<12} {total / 1000:>8.1f}ms')
+        for name, cumulative in heaviest[:top]:
+            print(f'    {name:<20} {cumulative / 1000:>8.1f}ms')
+
+
+@click.command()
+@click.option('--runs', default=10, help='Fresh interpreters per module.')
+@click.option('--top', default=5, help='Heaviest direct imports to show.')
+@click.option('--rev', help='Git revision to compare with.')
+@click.argument('modules', nargs=-1)
+def main(runs, top, rev: Optional[str], modules):
+    modules = list(modules) or ['reports', 'trackctl']
+    here = pathlib.Path(__file__).resolve().parent
+    if rev:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            archive = subprocess.run(['git', 'archive', rev], cwd=here,
+                                     capture_output=True, check=True).stdout
+            subprocess.run(['tar', '-x', '-C', tmpdir], input=archive, check=True)
+            report(rev, pathlib.Path(tmpdir), modules, runs, top)
+    report('working tree', here, modules, runs, top)
+
+
+if __name__ == '__main__':
+    main()
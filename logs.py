@@ -0,0 +1,128 @@
+"""Logging setup for trackd.
+
+Records go through a queue to a listener thread, which formats and writes
+them, so threads handling events never wait for the terminal.  Formatting is
+deferred to the listener too: log with %-style arguments, not f-strings, and
+don't mutate the arguments after logging them.
+
+Levels are set per subsystem (i.e. per module logger); third-party libraries
+only log warnings.  Debug logs of the hot paths are rate-limited.
+"""
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+from typing import Iterable, Mapping, Optional
+
+import metrics
+
+
+RECORDS_DROPPED = metrics.Counter(
+        'trackd_log_records_dropped_total', 'Log records dropped because the log queue was full.')
+RECORDS_SUPPRESSED = metrics.Counter(
+        'trackd_log_records_suppressed_total', 'Debug log records dropped by rate limits.',
+        ['logger'])
+
+# trackd's module loggers; a module logging with `logging.getLogger(__name__)`
+# needs to be here, or its info records are dropped (logs_test.py checks).
+SUBSYSTEMS = ('trackd', 'actor', 'admin', 'chrome', 'event_log', 'recording', 'reducer', 'relay',
+              'replication', 'sources', 'storage', 'timeline', 'tmux', 'tmux_snapshot', 'writer',
+              'x11')
+# Subsystems logging debug records on every focus change or tmux hook.
+HOT_SUBSYSTEMS = ('chrome', 'tmux', 'x11')
+
+DEFAULT_LEVEL = logging.INFO
+# E.g. "tmux=DEBUG,x11=DEBUG".
+LEVELS_ENV = 'TRACKD_LOG_LEVELS'
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A `QueueHandler` that drops records when the queue is full, and doesn't format them."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # `QueueListener` passes records to handlers that format them there.
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most `rate` debug records per second, with bursts of `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        super().__init__()
+        self._rate = rate
+        self._burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+        RECORDS_SUPPRESSED.inc(record.name)
+        return False
+
+
+def parse_levels(spec: str) -> Mapping[str, int]:
+    """Parses "subsystem=LEVEL,..." into a mapping.
+
+    >>> parse_levels('tmux=DEBUG, x11=warning')
+    {'tmux': 10, 'x11': 30}
+    """
+    levels = {}
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        name, sep, level = item.partition('=')
+        level = level.strip().upper()
+        if not sep or not isinstance(logging.getLevelName(level), int):
+            raise ValueError(f'Bad log level: {item!r}')
+        levels[name.strip()] = logging.getLevelName(level)
+    return levels
+
+
+def setup(handler: logging.Handler,
+          levels: Optional[Mapping[str, int]] = None,
+          subsystems: Iterable[str] = SUBSYSTEMS,
+          hot_subsystems: Iterable[str] = HOT_SUBSYSTEMS,
+          max_queue_size: int = 10000,
+          debug_rate: float = 20,
+          debug_burst: int = 100) -> logging.handlers.QueueListener:
+    """Routes all logging through a queue to `handler`.
+
+    `levels` default to the ones in $TRACKD_LOG_LEVELS.  Returns the started
+    listener; stop it to flush the queue.
+    """
+    if levels is None:
+        levels = parse_levels(os.environ.get(LEVELS_ENV, ''))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+    root_logger = logging.getLogger()
+    root_logger.addHandler(DroppingQueueHandler(log_queue))
+    root_logger.setLevel(logging.WARNING)
+
+    for subsystem in subsystems:
+        logging.getLogger(subsystem).setLevel(DEFAULT_LEVEL)
+    for subsystem in hot_subsystems:
+        logging.getLogger(subsystem).addFilter(RateLimitFilter(debug_rate, debug_burst))
+    for name, level in levels.items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,115 @@
+import doctest
+import logging
+import pathlib
+import queue
+import re
+import threading
+import unittest
+from unittest import mock
+
+import logs
+
+
+def make_record(level: int = logging.DEBUG, msg: str = '%r', args=('x',)) -> logging.LogRecord:
+    return logging.LogRecord('tmux', level, __file__, 1, msg, args, None)
+
+
+class DroppingQueueHandlerTest(unittest.TestCase):
+
+    def test_drops_when_full(self):
+        handler = logs.DroppingQueueHandler(queue.Queue(maxsize=1))
+        dropped = logs.RECORDS_DROPPED.value()
+
+        handler.handle(make_record())
+        handler.handle(make_record())
+
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(logs.RECORDS_DROPPED.value(), dropped + 1)
+
+    def test_doesnt_format(self):
+        handler = logs.DroppingQueueHandler(queue.Queue())
+        formatted = []
+
+        class Arg:
+
+            def __repr__(self):
+                formatted.append(self)
+                return 'Arg()'
+
+        handler.handle(make_record(args=(Arg(),)))
+
+        record = handler.queue.get_nowait()
+        self.assertEqual(formatted, [])
+        self.assertEqual(record.getMessage(), 'Arg()')
+
+
+class RateLimitFilterTest(unittest.TestCase):
+
+    def test_limits_debug_records(self):
+        with mock.patch('time.monotonic', return_value=100.0) as monotonic:
+            rate_limit = logs.RateLimitFilter(rate=2, burst=3)
+            self.assertEqual([rate_limit.filter(make_record()) for _ in range(5)],
+                             [True, True, True, False, False])
+            monotonic.return_value = 101.0
+            self.assertEqual([rate_limit.filter(make_record()) for _ in range(3)],
+                             [True, True, False])
+
+    def test_passes_other_levels(self):
+        rate_limit = logs.RateLimitFilter(rate=1, burst=1)
+        rate_limit.filter(make_record())
+        self.assertTrue(rate_limit.filter(make_record(level=logging.INFO)))
+
+
+class SubsystemsTest(unittest.TestCase):
+
+    def test_module_loggers_are_subsystems(self):
+        here = pathlib.Path(__file__).resolve().parent
+        modules = [path.stem for path in here.glob('*.py')
+                   if re.search(r'^logger = logging.getLogger\(__name__\)$', path.read_text(),
+                                flags=re.MULTILINE)]
+
+        self.assertTrue(modules)
+        self.assertEqual([module for module in modules if module not in logs.SUBSYSTEMS], [])
+
+
+class SetupTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root_handlers = logging.getLogger().handlers[:]
+        self.root_level = logging.getLogger().level
+
+    def tearDown(self):
+        logging.getLogger().handlers[:] = self.root_handlers
+        logging.getLogger().setLevel(self.root_level)
+        for name in ('subsystem', 'library'):
+            logging.getLogger(name).setLevel(logging.NOTSET)
+
+    def test_levels_and_delivery(self):
+        records = []
+        delivered = threading.Event()
+
+        class Handler(logging.Handler):
+
+            def emit(self, record):
+                records.append(self.format(record))
+                delivered.set()
+
+        listener = logs.setup(Handler(), levels={'subsystem': logging.DEBUG},
+                              subsystems=('subsystem',), hot_subsystems=())
+        try:
+            logging.getLogger('library').info('Not shown')
+            logging.getLogger('subsystem').debug('Shown %d', 1)
+            self.assertTrue(delivered.wait(timeout=5))
+        finally:
+            listener.stop()
+
+        self.assertEqual(records, ['Shown 1'])
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(logs))
+    return tests
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+"""In-process metrics, exposed in the Prometheus text format.
+
+Metrics are cheap enough to be always on: updating one takes a lock that is
+hardly ever contended, and no allocations besides the first use of a label
+combination.
+
+Usage:
+
+    LATENCY = metrics.Histogram('trackd_foo_seconds', 'Time spent doing foo.', ['kind'])
+
+    with LATENCY.time('bar'):
+        foo()
+"""
+import bisect
+import contextlib
+import math
+import re
+import threading
+import time
+
+from typing import Callable, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+# From 100µs to 10s.
+DEFAULT_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+class Registry:
+
+    def __init__(self):
+        self._metrics: Dict[str, '_Metric'] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: '_Metric') -> None:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name!r} is already registered')
+            self._metrics[metric.name] = metric
+
+    def exposition(self) -> str:
+        """Returns all the metrics in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type_}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type_ = ''
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self._labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _format_labels(self, labelvalues: LabelValues, extra: str = '') -> str:
+        labels = [f'{name}="{_escape(value)}"'
+                  for name, value in zip(self._labelnames, labelvalues)]
+        if extra:
+            labels.append(extra)
+        if not labels:
+            return ''
+        return '{' + ','.join(labels) + '}'
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type_ = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues: str) -> float:
+        with self._lock:
+            return self._values.get(labelvalues, 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f'{self.name}{self._format_labels(labelvalues)} {_format_value(value)}'
+                for labelvalues, value in values]
+
+
+class Gauge(_Metric):
+    """A gauge, with values either set, or read by a callback at scrape time."""
+    type_ = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, *labelvalues: str) -> None:
+        with self._lock:
+            self._values[labelvalues] = value
+
+    def set_function(self, function: Callable[[], float], *labelvalues: str) -> None:
+        with self._lock:
+            self._callbacks[labelvalues] = function
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for labelvalues, callback in callbacks.items():
+            values[labelvalues] = callback()
+        return [f'{self.name}{self._format_labels(labelvalues)} {_format_value(value)}'
+                for labelvalues, value in sorted(values.items())]
+
+
+class Histogram(_Metric):
+    type_ = 'histogram'
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._buckets = tuple(buckets)
+        # Per label values: non-cumulative bucket counts (the last one is
+        # +Inf), and the sum.
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, *labelvalues: str) -> None:
+        i = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            try:
+                self._counts[labelvalues][i] += 1
+                self._sums[labelvalues] += value
+            except KeyError:
+                self._counts[labelvalues] = [0] * (len(self._buckets) + 1)
+                self._counts[labelvalues][i] += 1
+                self._sums[labelvalues] = value
+
+    @contextlib.contextmanager
+    def time(self, *labelvalues: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labelvalues)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            counts = {labelvalues: list(c) for labelvalues, c in self._counts.items()}
+            sums = dict(self._sums)
+        lines = []
+        for labelvalues in sorted(counts):
+            cumulative = 0
+            for bound, count in zip(self._buckets + (math.inf,), counts[labelvalues]):
+                cumulative += count
+                le = 'le="+Inf"' if bound == math.inf else f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{self._format_labels(labelvalues, le)} {cumulative}')
+            labels = self._format_labels(labelvalues)
+            lines.append(f'{self.name}_sum{labels} {_format_value(sums[labelvalues])}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+##
+# Reading the exposition format back, for `trackctl stats`.
+
+Sample = Tuple[str, Mapping[str, str], float]
+
+_SAMPLE_RE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(\{(?P<labels>.*)\})? (?P<value>\S+)$')
+_LABEL_RE = re.compile(r'(?P<name>[a-zA-Z_][a-zA-Z0-9_]*)="(?P<value>(?:[^"\\]|\\.)*)"')
+
+
+def parse(text: str) -> List[Sample]:
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        m = _SAMPLE_RE.match(line)
+        if m is None:
+            raise ValueError(f'Malformed line: {line!r}')
+        labels = {label['name']: _unescape(label['value'])
+                  for label in _LABEL_RE.finditer(m['labels'] or '')}
+        samples.append((m['name'], labels, float(m['value'])))
+    return samples
+
+
+def _unescape(value: str) -> str:
+    return re.sub(r'\\(.)', lambda m: '\n' if m[1] == 'n' else m[1], value)
+
+
+def quantile(q: float, buckets: Sequence[Tuple[float, float]]) -> float:
+    """Estimates a quantile from cumulative (upper bound, count) histogram buckets.
+
+    Interpolates linearly within a bucket, like Prometheus's histogram_quantile().
+
+    >>> quantile(.5, [(1, 0), (2, 10), (math.inf, 10)])
+    1.5
+    >>> quantile(.99, [(1, 5), (2, 5), (math.inf, 10)])
+    2
+    """
+    buckets = sorted(buckets)
+    total = buckets[-1][1]
+    if not total:
+        return math.nan
+    rank = q * total
+    lower_bound, lower_count = 0.0, 0.0
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == math.inf:
+                return lower_bound
+            return lower_bound + (bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = bound, count
+    return lower_bound
@@ -0,0 +1,74 @@
+import doctest
+import math
+import unittest
+
+import metrics
+
+
+class MetricsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        counter = metrics.Counter('spans_total', 'Spans.', ['type'], registry=self.registry)
+        counter.inc('tmux')
+        counter.inc('tmux')
+        counter.inc('chrome', amount=3)
+
+        self.assertEqual(self.registry.exposition(), '''\
+# HELP spans_total Spans.
+# TYPE spans_total counter
+spans_total{type="chrome"} 3
+spans_total{type="tmux"} 2
+''')
+
+    def test_gauge_function(self):
+        gauge = metrics.Gauge('queue_size', 'Queue size.', registry=self.registry)
+        size = 1
+        gauge.set_function(lambda: size)
+        size = 5
+
+        self.assertIn('\nqueue_size 5\n', self.registry.exposition())
+
+    def test_histogram(self):
+        histogram = metrics.Histogram('latency_seconds', 'Latency.', ['method'],
+                                      buckets=(.1, 1), registry=self.registry)
+        histogram.observe(.05, 'get')
+        histogram.observe(.5, 'get')
+        histogram.observe(5, 'get')
+
+        self.assertEqual(self.registry.exposition(), '''\
+# HELP latency_seconds Latency.
+# TYPE latency_seconds histogram
+latency_seconds_bucket{method="get",le="0.1"} 1
+latency_seconds_bucket{method="get",le="1"} 2
+latency_seconds_bucket{method="get",le="+Inf"} 3
+latency_seconds_sum{method="get"} 5.55
+latency_seconds_count{method="get"} 3
+''')
+
+    def test_parse(self):
+        histogram = metrics.Histogram('latency_seconds', 'Latency.', ['method'],
+                                      buckets=(.1, 1), registry=self.registry)
+        histogram.observe(.05, 'say "hi"')
+
+        samples = metrics.parse(self.registry.exposition())
+
+        self.assertEqual(samples[0], ('latency_seconds_bucket', {'method': 'say "hi"', 'le': '0.1'}, 1))
+        self.assertEqual(samples[2], ('latency_seconds_bucket', {'method': 'say "hi"', 'le': '+Inf'}, 1))
+        self.assertEqual(float(samples[2][1]['le']), math.inf)
+
+    def test_registering_twice_fails(self):
+        metrics.Counter('spans_total', 'Spans.', registry=self.registry)
+        with self.assertRaises(ValueError):
+            metrics.Counter('spans_total', 'Spans.', registry=self.registry)
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(metrics))
+    return tests
+
+
+if __name__ == '__main__':
+    unittest.main()
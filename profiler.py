@@ -0,0 +1,154 @@
+"""A sampling profiler for a running trackd.
+
+Nothing runs until a profile is requested: `profile()` samples the stacks of
+all the threads with `sys._current_frames()` from the calling thread, for a
+given number of seconds, and returns them aggregated.
+
+Every sample counts towards the wall-clock profile.  It counts towards the
+CPU profile only if the thread is running, according to
+/proc/self/task/<tid>/stat (so there's no CPU profile outside Linux).
+"""
+import collections
+import marshal
+import os
+import sys
+import threading
+import time
+
+from typing import Counter, Dict, List, Mapping, Tuple
+
+
+# (filename, first line number, function name), the way pstats keys functions.
+Function = Tuple[str, int, str]
+# Frames from the outermost one, with the thread name as the "root" frame.
+Stack = Tuple[Function, ...]
+
+DEFAULT_INTERVAL = 0.01
+MAX_SECONDS = 600
+
+_lock = threading.Lock()
+
+
+class Profile:
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.wall: Counter[Stack] = collections.Counter()
+        self.cpu: Counter[Stack] = collections.Counter()
+
+    def collapsed(self, mode: str = 'wall') -> str:
+        """Returns stacks in the collapsed format of flamegraph.pl and speedscope."""
+        lines = []
+        for stack, count in sorted(self._samples(mode).items()):
+            frames = ';'.join(_format_function(function) for function in stack)
+            lines.append(f'{frames} {count}\n')
+        return ''.join(lines)
+
+    def pstats(self, mode: str = 'wall') -> bytes:
+        """Returns the profile in the format `pstats.Stats` loads.
+
+        Times are estimated as the number of samples times the interval.
+        """
+        # function -> [primitive calls, calls, own time, cumulative time, callers]
+        stats: Dict[Function, list] = {}
+        for stack, count in self._samples(mode).items():
+            seconds = count * self.interval
+            seen = set()
+            for i, function in enumerate(stack):
+                entry = stats.setdefault(function, [0, 0, 0.0, 0.0, {}])
+                if function not in seen:
+                    # Recursive functions only count once per sample.
+                    seen.add(function)
+                    entry[0] += count
+                    entry[1] += count
+                    entry[3] += seconds
+                if i == len(stack) - 1:
+                    entry[2] += seconds
+                if i > 0:
+                    caller = entry[4].get(stack[i - 1], (0, 0, 0.0, 0.0))
+                    entry[4][stack[i - 1]] = (caller[0] + count, caller[1] + count,
+                                              caller[2] + (seconds if i == len(stack) - 1 else 0),
+                                              caller[3] + seconds)
+        return marshal.dumps({function: tuple(entry) for function, entry in stats.items()})
+
+    def _samples(self, mode: str) -> Counter[Stack]:
+        if mode == 'wall':
+            return self.wall
+        if mode == 'cpu':
+            return self.cpu
+        raise ValueError(f'Unknown profile mode: {mode!r}')
+
+
+def profile(seconds: float, interval: float = DEFAULT_INTERVAL) -> Profile:
+    """Samples all the other threads for `seconds`."""
+    if not 0 < seconds <= MAX_SECONDS:
+        raise ValueError(f'Profile duration must be within (0, {MAX_SECONDS}] seconds')
+    if not _lock.acquire(blocking=False):
+        raise ValueError('A profile is already being collected')
+    try:
+        return _profile(seconds, interval)
+    finally:
+        _lock.release()
+
+
+def _profile(seconds: float, interval: float) -> Profile:
+    result = Profile(interval)
+    own_ident = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    next_sample = time.monotonic()
+    while next_sample < deadline:
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            thread = threads.get(ident)
+            name = thread.name if thread is not None else str(ident)
+            stack: List[Function] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            stack.append(('~', 0, f'<thread {name}>'))
+            stack.reverse()
+            result.wall[tuple(stack)] += 1
+            if thread is not None and _is_running(thread.native_id):
+                result.cpu[tuple(stack)] += 1
+        del frame
+        next_sample += interval
+        time.sleep(max(0, next_sample - time.monotonic()))
+    return result
+
+
+def _is_running(native_id) -> bool:
+    try:
+        with open(f'/proc/self/task/{native_id}/stat', 'rb') as f:
+            stat = f.read()
+    except OSError:
+        return False
+    # The process name is in parentheses, and can contain anything.
+    return stat[stat.rindex(b')') + 2:].startswith(b'R')
+
+
+def _format_function(function: Function) -> str:
+    filename, line, name = function
+    if filename == '~':
+        return name
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def handle_debug_profile(query: Mapping[str, List[str]]) -> Tuple[str, bytes]:
+    """Admin server handler.
+
+    Takes `seconds`, `mode` (wall or cpu) and `format` (collapsed or pstats).
+    """
+    seconds = float(query.get('seconds', ['30'])[0])
+    mode = query.get('mode', ['wall'])[0]
+    output_format = query.get('format', ['collapsed'])[0]
+    if output_format not in ('collapsed', 'pstats'):
+        raise ValueError(f'Unknown profile format: {output_format!r}')
+    if mode not in ('wall', 'cpu'):
+        raise ValueError(f'Unknown profile mode: {mode!r}')
+    result = profile(seconds)
+    if output_format == 'pstats':
+        return 'application/octet-stream', result.pstats(mode)
+    return 'text/plain; charset=utf-8', result.collapsed(mode).encode('utf-8')
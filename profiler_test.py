@@ -0,0 +1,73 @@
+import io
+import pstats
+import tempfile
+import threading
+import time
+import unittest
+
+import profiler
+
+
+def spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        pass
+
+
+def wait(stop: threading.Event) -> None:
+    stop.wait()
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stop = threading.Event()
+        self.threads = [
+            threading.Thread(target=spin, args=(self.stop,), name='spinner'),
+            threading.Thread(target=wait, args=(self.stop,), name='waiter'),
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def tearDown(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def test_collapsed(self):
+        result = profiler.profile(0.2)
+
+        wall = result.collapsed('wall')
+        self.assertRegex(wall, r'<thread spinner>;.*;spin \(profiler_test.py:\d+\) \d+\n')
+        self.assertRegex(wall, r'<thread waiter>;.*;wait \(profiler_test.py:\d+\);')
+        cpu = result.collapsed('cpu')
+        self.assertIn('<thread spinner>', cpu)
+        self.assertNotIn('<thread waiter>', cpu)
+
+    def test_pstats(self):
+        result = profiler.profile(0.2)
+
+        with tempfile.NamedTemporaryFile() as f:
+            f.write(result.pstats('wall'))
+            f.flush()
+            stats = pstats.Stats(f.name, stream=io.StringIO())
+        functions = {name for _, _, name in stats.stats}
+        self.assertIn('spin', functions)
+        self.assertIn('wait', functions)
+
+    def test_one_profile_at_a_time(self):
+        thread = threading.Thread(target=profiler.profile, args=(0.5,))
+        thread.start()
+        time.sleep(0.1)
+        with self.assertRaises(ValueError):
+            profiler.profile(0.1)
+        thread.join()
+
+    def test_rejects_bad_durations(self):
+        with self.assertRaises(ValueError):
+            profiler.profile(0)
+        with self.assertRaises(ValueError):
+            profiler.profile(profiler.MAX_SECONDS + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
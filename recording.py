@@ -0,0 +1,126 @@
+"""Recordings of adapter events, for replaying them.
+
+With $TRACKD_RECORD set to a path, trackd appends every message sent to an
+adapter (tmux RPCs, Chrome requests, X focus and screen lock changes, as seen
+by the adapters) to a file there, and `trackctl replay` feeds the file back
+into fresh adapters (see reducer.py), writing spans into an in-memory
+`SpanStorage`.  Replaying as fast as possible benchmarks the ingestion core;
+replaying a recording from a misbehaving trackd reproduces its state.
+
+The file is a header followed by records: a little-endian float64 timestamp
+and uint32 length, then the marshalled (source, message) pair, with the
+message converted by `event_log.to_plain()`.
+"""
+from dataclasses import dataclass, field
+import marshal
+import os
+import struct
+import threading
+import time
+
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, NamedTuple
+
+import event_log
+
+
+MAGIC = b'TRACKDREC1\n'
+RECORD_HEADER = struct.Struct('<dI')
+RECORD_ENV = 'TRACKD_RECORD'
+
+
+class Record(NamedTuple):
+    timestamp: float
+    source: str
+    message: object
+
+
+class Recorder:
+    """Appends records to a file.
+
+    Writes are buffered; `close()` flushes them.  Records after `close()`
+    are dropped, as sources may still be sending messages.
+    """
+
+    def __init__(self, path: str):
+        self._file: BinaryIO = open(path, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def record(self, source: str, message) -> None:
+        """Takes (source, message) pairs, as an `actor.Actor` recorder."""
+        payload = marshal.dumps((source, event_log.to_plain(message)))
+        with self._lock:
+            if self._closed:
+                return
+            self._file.write(RECORD_HEADER.pack(time.time(), len(payload)))
+            self._file.write(payload)
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._file.close()
+
+
+def read(path: str) -> Iterator[Record]:
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a trackd recording')
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                # The end, or a record cut short by a crash.
+                return
+            timestamp, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            source, message = marshal.loads(payload)
+            yield Record(timestamp, source, event_log.from_plain(message))
+
+
+def recorder_from_env():
+    """Returns a `Recorder` writing to $TRACKD_RECORD, if it's set."""
+    path = os.environ.get(RECORD_ENV)
+    return Recorder(path) if path else None
+
+
+@dataclass
+class ReplayStats:
+    events: int = 0
+    # Events from sources `handle` didn't know.
+    skipped: int = 0
+    # Time spent handling events, i.e. not counting waits at recorded speed.
+    busy: float = 0.0
+    # Seconds to handle each event, by message type.
+    latencies: Dict[str, List[float]] = field(default_factory=dict)
+
+
+def replay(records: Iterable[Record], handle: Callable[[float, str, object], bool],
+           speed: float = 0) -> ReplayStats:
+    """Passes records to `handle`, e.g. `reducer.Reducer.handle`.
+
+    `speed` is relative to the recorded one, 0 means as fast as possible.
+    `handle` returns whether it knows the record's source.
+    """
+    stats = ReplayStats()
+    start = time.monotonic()
+    first_timestamp = None
+    for record in records:
+        if speed:
+            if first_timestamp is None:
+                first_timestamp = record.timestamp
+            delay = start + (record.timestamp - first_timestamp) / speed - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        handle_start = time.perf_counter()
+        known = handle(record.timestamp, record.source, record.message)
+        latency = time.perf_counter() - handle_start
+        stats.events += 1
+        stats.busy += latency
+        if not known:
+            stats.skipped += 1
+            continue
+        stats.latencies.setdefault(type(record.message).__name__, []).append(latency)
+    return stats
@@ -0,0 +1,113 @@
+import os
+import tempfile
+import time
+import unittest
+
+import events
+import recording
+import reducer
+import storage
+import tmux
+from tmux import TmuxClient, TmuxSession
+
+
+TERMINAL = events.XWindowInfo(name='Terminal', wm_class=('gnome-terminal-server', 'Gnome-terminal'))
+CLIENT = TmuxClient(hostname='host', client_name='/dev/pts/1')
+SESSION = TmuxSession(session_name='session', hostname='host', server_pid=42)
+
+
+class RecordingTest(unittest.TestCase):
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.path = os.path.join(tmpdir.name, 'trackd.rec')
+
+    def record(self):
+        recorder = recording.Recorder(self.path)
+        adapter = tmux.TmuxAdapter(None)
+        adapter.record_to(recorder.record)
+        adapter.set_focused_x_window_id(42, TERMINAL)
+        adapter.sync_state('host', {42: CLIENT}, {CLIENT: SESSION})
+        adapter.session_closed(SESSION)
+        recorder.close()
+
+    def test_round_trip(self):
+        self.record()
+
+        records = list(recording.read(self.path))
+
+        self.assertEqual([(record.source, record.message) for record in records], [
+            ('TmuxAdapter', events.FocusChanged(42, TERMINAL)),
+            ('TmuxAdapter', tmux.StateSynced('host', {42: CLIENT}, {CLIENT: SESSION})),
+            ('TmuxAdapter', tmux.SessionClosed(SESSION)),
+        ])
+        self.assertLessEqual(records[0].timestamp, records[-1].timestamp)
+
+    def test_appends(self):
+        self.record()
+        self.record()
+        self.assertEqual(len(list(recording.read(self.path))), 6)
+
+    def test_ignores_truncated_record(self):
+        self.record()
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        self.assertEqual(len(list(recording.read(self.path))), 2)
+
+    def test_drops_records_after_close(self):
+        recorder = recording.Recorder(self.path)
+        recorder.close()
+
+        recorder.record('TmuxAdapter', tmux.SessionClosed(SESSION))
+
+        self.assertEqual(list(recording.read(self.path)), [])
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'SQLite format 3\0')
+        with self.assertRaises(ValueError):
+            list(recording.read(self.path))
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_replays_into_adapters(self):
+        records = [
+            recording.Record(100.0, 'TmuxAdapter', events.FocusChanged(42, TERMINAL)),
+            recording.Record(100.0, 'TmuxAdapter', tmux.ClientSetForXWindowId(42, CLIENT)),
+            recording.Record(100.0, 'TmuxAdapter', tmux.ClientSessionChanged(CLIENT, SESSION)),
+            recording.Record(100.0, 'EditorAdapter', 'something'),
+            recording.Record(160.0, 'TmuxAdapter', tmux.SessionClosed(SESSION)),
+        ]
+        span_storage = storage.SpanStorage(':memory:')
+        reducer_ = reducer.Reducer(span_storage)
+
+        stats = recording.replay(records, reducer_.handle)
+
+        self.assertEqual((stats.events, stats.skipped), (5, 1))
+        self.assertEqual(sorted((k, len(v)) for k, v in stats.latencies.items()), [
+            ('ClientSessionChanged', 1),
+            ('ClientSetForXWindowId', 1),
+            ('FocusChanged', 1),
+            ('SessionClosed', 1),
+        ])
+        (span,) = span_storage.query()
+        self.assertEqual((span.session, span.start.timestamp(), span.end.timestamp()),
+                         (SESSION, 100.0, 160.0))
+        self.assertEqual(reducer_.adapters['TmuxAdapter'].snapshot.active_session, None)
+
+    def test_recorded_speed(self):
+        records = [recording.Record(100.0 + i * 0.05, 'Fake', i) for i in range(3)]
+        handled = []
+
+        start = time.monotonic()
+        stats = recording.replay(records, lambda *args: handled.append(args) or True, speed=1)
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+        self.assertEqual(len(handled), 3)
+        self.assertLess(stats.busy, 0.05)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Derives spans from logged events.
+
+Replays events through fresh adapters, with the adapters' clock following
+the events' timestamps, so replaying the same events always gives the same
+spans.  Events come from the event log (see event_log.py), where replaying is
+incremental: `Reducer.catch_up()` only handles events logged since the last
+call, or from a recording (see recording.py).
+"""
+import logging
+
+from typing import Dict
+
+import actor
+import chrome
+import clock
+import tmux
+import trackd
+from event_log import EventLog
+
+
+logger = logging.getLogger(__name__)
+
+
+class Reducer:
+
+    def __init__(self, span_storage):
+        self._clock = clock.FakeClock(zone=clock.SYSTEM.zone())
+        # Keyed by the sources events are logged with.
+        self.adapters: Dict[str, actor.Actor] = {
+            'ChromeAdapter': chrome.ChromeAdapter(
+                trackd.SpanTracker(span_storage, clock=self._clock)),
+            'TmuxAdapter': tmux.TmuxAdapter(
+                trackd.SpanTracker(span_storage, clock=self._clock)),
+        }
+        self.last_event_id = 0
+
+    def handle(self, timestamp: float, source: str, message) -> bool:
+        """Handles an event, returns whether its source is known."""
+        try:
+            adapter = self.adapters[source]
+        except KeyError:
+            return False
+        self._clock.set_timestamp(timestamp)
+        adapter.send(message)
+        adapter.process_pending()
+        return True
+
+    def catch_up(self, event_log: EventLog) -> int:
+        """Handles the events logged since the last call, returns how many there were."""
+        n_events = 0
+        for event in event_log.read(after_id=self.last_event_id):
+            self.last_event_id = event.id
+            n_events += 1
+            if not self.handle(event.timestamp, event.source, event.message):
+                logger.warning('Skipping event %d from an unknown source %r', event.id, event.source)
+        return n_events
+
+
+def derive_spans(event_log: EventLog, span_storage) -> int:
+    """Derives spans from all the logged events, returns the number of events."""
+    return Reducer(span_storage).catch_up(event_log)
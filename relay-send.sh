@@ -0,0 +1,12 @@
+#!/bin/sh
+# Sends an event to `trackctl relay`, see relay.py for the format.
+# Usage: relay-send.sh METHOD NAME=VALUE...
+
+SOCKET="${TRACKD_RELAY_SOCKET:-${XDG_RUNTIME_DIR:-/tmp}/trackd-relay.sock}"
+
+method="$1"
+shift
+for field in "$@"; do
+    method="$method	$field"
+done
+printf '%s\n' "$method" | socat - "UNIX-SENDTO:$SOCKET"
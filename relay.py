@@ -0,0 +1,170 @@
+"""A relay for tmux hooks on remote hosts.
+
+Running a tmux hook through trackctl.py costs a Python start and a gRPC
+channel setup, which, for remote hosts, goes over an SSH tunnel.  Instead,
+`trackctl relay` runs on the remote host, gets events from hooks over a Unix
+datagram socket (see relay-send.sh and tmux-hooks-relay.conf), and forwards
+them in batches over one persistent gRPC stream.
+
+Events are kept until trackd acknowledges them, and are resent after
+reconnecting.  Every (re)connection also sends a full snapshot of tmux
+clients (see tmux_snapshot.py), as hooks could have been missed while
+disconnected; only the latest unacknowledged snapshot is kept.
+
+The datagram format is: a method name, and then "name=value" fields, all
+separated by tabs.  Method and field names are the ones of the Tmux service
+in tmux.proto, e.g.:
+
+    client_detached<TAB>hostname=host<TAB>client_name=/dev/pts/1
+"""
+import collections
+import logging
+import os
+import pathlib
+import socket
+import threading
+import time
+
+from typing import Deque, Iterator, Tuple
+
+from google.protobuf import json_format
+from google.protobuf.message import Message
+import grpc
+
+import tmux_pb2
+import tmux_pb2_grpc
+import tmux_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_SOCKET = pathlib.Path(os.environ.get('XDG_RUNTIME_DIR', '/tmp')) / 'trackd-relay.sock'
+
+# Maps method names to their request types, e.g. 'session_closed' to
+# SessionClosedRequest.
+METHODS = {
+    field.name: getattr(tmux_pb2, field.message_type.name)
+    for field in tmux_pb2.RelayEvent.DESCRIPTOR.oneofs_by_name['event'].fields
+}
+
+
+def parse_event(datagram: bytes) -> Tuple[str, Message]:
+    method, *fields = datagram.decode('utf-8').rstrip('\t\n').split('\t')
+    try:
+        request_type = METHODS[method]
+    except KeyError:
+        raise ValueError(f'Unknown method: {method!r}') from None
+    values = dict(field.split('=', 1) for field in fields)
+    return method, json_format.ParseDict(values, request_type())
+
+
+class Relay:
+    """Forwards events to trackd, keeping unacknowledged ones for a resend."""
+
+    def __init__(self, server: str, max_buffered: int = 10000, max_batch: int = 100):
+        self._server = server
+        self._max_buffered = max_buffered
+        self._max_batch = max_batch
+        self._cond = threading.Condition()
+        self._buffer: Deque[tmux_pb2.RelayEvent] = collections.deque()
+        self._seq = 0
+        # Sequence number of the last event sent over the current stream.
+        self._sent_seq = 0
+        # Changes on every reconnection, to stop batches of the old stream.
+        self._generation = 0
+        self._closed = False
+        self._call = None
+
+    def add(self, method: str, request: Message) -> None:
+        with self._cond:
+            self._seq += 1
+            event = tmux_pb2.RelayEvent(seq=self._seq)
+            getattr(event, method).CopyFrom(request)
+            if len(self._buffer) >= self._max_buffered:
+                dropped = self._buffer.popleft()
+                logger.warning('Relay buffer is full, dropping %r', dropped)
+            self._buffer.append(event)
+            self._cond.notify_all()
+
+    def serve(self, socket_path: pathlib.Path) -> None:
+        """Reads events from a Unix datagram socket."""
+        if socket_path.is_socket():
+            socket_path.unlink()
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.bind(str(socket_path))
+            while True:
+                datagram = sock.recv(65536)
+                try:
+                    method, request = parse_event(datagram)
+                except (ValueError, json_format.ParseError) as e:
+                    logger.error('Bad event %r: %s', datagram, e)
+                    continue
+                self.add(method, request)
+
+    def forward(self, reconnect_delay: float = 1, max_reconnect_delay: float = 60) -> None:
+        """Forwards events to trackd, reconnecting until `close()` is called."""
+        delay = reconnect_delay
+        while not self._closed:
+            try:
+                with grpc.insecure_channel(self._server, options=[
+                        ('grpc.keepalive_time_ms', 30000),
+                ]) as channel:
+                    stub = tmux_pb2_grpc.TmuxStub(channel)
+                    self._add_snapshot()
+                    self._call = stub.relay(self._batches())
+                    for ack in self._call:
+                        self._acknowledge(ack.seq)
+                        delay = reconnect_delay
+            except grpc.RpcError as e:
+                if self._closed:
+                    return
+                logger.warning('Relay stream broke (%s), reconnecting in %ss', e.code(), delay)
+            time.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+    def close(self) -> None:
+        """Stops `forward()`.  Unacknowledged events are lost."""
+        with self._cond:
+            self._closed = True
+            self._generation += 1
+            self._cond.notify_all()
+        if self._call is not None:
+            self._call.cancel()
+
+    def _add_snapshot(self) -> None:
+        request = tmux_snapshot.sync_state_request()
+        with self._cond:
+            # Resend everything unacknowledged on the new stream.
+            self._generation += 1
+            self._sent_seq = 0
+            # But not snapshots of earlier attempts: the new one supersedes
+            # them, and they'd pile up while trackd is unreachable.
+            self._buffer = collections.deque(
+                    event for event in self._buffer if event.WhichOneof('event') != 'sync_state')
+            self._cond.notify_all()
+        self.add('sync_state', request)
+
+    def _acknowledge(self, seq: int) -> None:
+        with self._cond:
+            while self._buffer and self._buffer[0].seq <= seq:
+                self._buffer.popleft()
+
+    def _batches(self) -> Iterator[tmux_pb2.RelayBatch]:
+        with self._cond:
+            generation = self._generation
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                        lambda: (self._generation != generation or
+                                 (self._buffer and self._buffer[-1].seq > self._sent_seq)))
+                if self._generation != generation:
+                    return
+                batch = [event for event in self._buffer
+                         if event.seq > self._sent_seq][:self._max_batch]
+                self._sent_seq = batch[-1].seq
+            yield tmux_pb2.RelayBatch(events=batch)
+
+    def buffered(self) -> int:
+        with self._cond:
+            return len(self._buffer)
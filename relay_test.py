@@ -0,0 +1,134 @@
+from concurrent import futures
+import pathlib
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import grpc
+
+import relay
+import tmux
+import tmux_pb2
+import tmux_pb2_grpc
+
+
+class FakeTmuxAdapter:
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, *args))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(.01)
+
+
+class RelayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.adapter = FakeTmuxAdapter()
+        self.snapshot_patcher = mock.patch.object(
+                relay.tmux_snapshot, 'sync_state_request',
+                return_value=tmux_pb2.SyncStateRequest(hostname='host'))
+        self.snapshot_patcher.start()
+        self.server = None
+        self.relay = None
+
+    def tearDown(self):
+        self.snapshot_patcher.stop()
+        if self.relay is not None:
+            self.relay.close()
+        if self.server is not None:
+            self.server.stop(grace=None)
+
+    def start_server(self, port=0) -> int:
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        tmux_pb2_grpc.add_TmuxServicer_to_server(tmux.Tmux(self.adapter), self.server)
+        port = self.server.add_insecure_port(f'localhost:{port}')
+        self.server.start()
+        return port
+
+    def start_relay(self, port) -> relay.Relay:
+        self.relay = relay.Relay(server=f'localhost:{port}')
+        threading.Thread(target=self.relay.forward, kwargs={'reconnect_delay': .05},
+                         daemon=True).start()
+        return self.relay
+
+    def test_parse_event(self):
+        method, request = relay.parse_event(
+                b'session_renamed\thostname=host\tclient_name=/dev/pts/1\t'
+                b'server_pid=42\tnew_session_name=new name\n')
+
+        self.assertEqual(method, 'session_renamed')
+        self.assertEqual(request, tmux_pb2.SessionRenamedRequest(
+            hostname='host', client_name='/dev/pts/1', server_pid=42,
+            new_session_name='new name'))
+
+    def test_forwards_events_from_socket(self):
+        relay_ = self.start_relay(self.start_server())
+        # Connecting sends a snapshot.
+        wait_for(lambda: len(self.adapter.calls) == 1)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            socket_path = pathlib.Path(temp_dir) / 'relay.sock'
+            threading.Thread(target=relay_.serve, args=(socket_path,), daemon=True).start()
+            wait_for(socket_path.exists)
+
+            with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+                sock.sendto(b'client_detached\thostname=host\tclient_name=/dev/pts/1\n',
+                            str(socket_path))
+                sock.sendto(b'session_closed\thostname=host\tserver_pid=42\tsession_name=foo\n',
+                            str(socket_path))
+            wait_for(lambda: len(self.adapter.calls) == 3)
+
+        self.assertEqual(self.adapter.calls, [
+            ('sync_state', 'host', {}, {}),
+            ('client_detached', tmux.TmuxClient(hostname='host', client_name='/dev/pts/1')),
+            ('session_closed', tmux.TmuxSession(session_name='foo', hostname='host', server_pid=42)),
+        ])
+        wait_for(lambda: relay_.buffered() == 0)
+
+    def test_replays_events_after_reconnect(self):
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            port = sock.getsockname()[1]
+        relay_ = self.start_relay(port)
+        # trackd isn't up yet.
+        relay_.add('client_detached', tmux_pb2.ClientDetachedRequest(
+            hostname='host', client_name='/dev/pts/1'))
+        time.sleep(.1)
+
+        self.start_server(port)
+        wait_for(lambda: relay_.buffered() == 0)
+
+        self.assertEqual(self.adapter.calls, [
+            ('client_detached', tmux.TmuxClient(hostname='host', client_name='/dev/pts/1')),
+            # One snapshot, last, so it overrides replayed events.
+            ('sync_state', 'host', {}, {}),
+        ])
+
+    def test_keeps_one_snapshot_while_disconnected(self):
+        with socket.socket() as sock:
+            sock.bind(('localhost', 0))
+            port = sock.getsockname()[1]
+        relay_ = self.start_relay(port)
+        relay_.add('client_detached', tmux_pb2.ClientDetachedRequest(
+            hostname='host', client_name='/dev/pts/1'))
+
+        # Every failed attempt takes a snapshot, and replaces the last one.
+        wait_for(lambda: relay.tmux_snapshot.sync_state_request.call_count >= 3)
+
+        self.assertLessEqual(relay_.buffered(), 2)
+        # The event, and the snapshot, unless it's being replaced right now.
+        wait_for(lambda: relay_.buffered() == 2)
+
+if __name__ == '__main__':
+    unittest.main()
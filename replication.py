@@ -0,0 +1,203 @@
+"""Replication of spans to a central trackd.
+
+Every trackd (e.g. on a desktop and a laptop) can run a `Replicator`, which
+sends newly saved spans to a central trackd, run with `--accept_replication`,
+over one persistent, gzip compressed gRPC stream (see replication.proto).
+The central trackd saves them into its own spans table, so reports on its
+database cover all the machines.
+
+Spans are sent in batches, in the order of their rowids, as the origin's
+rowids only grow.  The central trackd keeps the last rowid it has of every
+origin (its high-water mark), saved in the same transaction as the spans,
+and skips spans up to it, so batches resent after a broken stream aren't
+saved twice.  On (re)connecting, the central trackd replies with the
+high-water mark, and the replicator resumes from it, instead of rescanning
+its spans.
+
+An origin is identified by its name, the hostname by default, so the name
+must stay the same, and its database mustn't be replaced by one with fewer
+spans.
+"""
+import datetime
+import logging
+import threading
+import time
+
+from typing import Iterator, Optional
+
+import grpc
+
+import metrics
+import replication_pb2
+import replication_pb2_grpc
+from storage import ChromeSession, Span, SpanStorage, TmuxSession
+
+
+logger = logging.getLogger(__name__)
+
+
+REPLICATED_SPANS = metrics.Counter(
+        'trackd_replicated_spans_total',
+        'Spans replicated to the central trackd, or, there, received from others.',
+        ['direction'])
+
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_proto(rowid: int, span: Span) -> replication_pb2.ReplicatedSpan:
+    session = span.session
+    return replication_pb2.ReplicatedSpan(
+            id=rowid,
+            session_type=session.__class__.__name__,
+            session_name=session.session_name,
+            hostname=getattr(session, 'hostname', ''),
+            server_pid=getattr(session, 'server_pid', 0),
+            user=getattr(session, 'user', ''),
+            start_us=(span.start - _EPOCH) // _MICROSECOND,
+            end_us=(span.end - _EPOCH) // _MICROSECOND)
+
+
+def from_proto(replicated: replication_pb2.ReplicatedSpan) -> Span:
+    if replicated.session_type == 'ChromeSession':
+        session = ChromeSession(session_name=replicated.session_name, user=replicated.user)
+    elif replicated.session_type == 'TmuxSession':
+        session = TmuxSession(session_name=replicated.session_name,
+                              hostname=replicated.hostname, server_pid=replicated.server_pid)
+    else:
+        raise ValueError(f'Invalid session_type: {replicated.session_type!r}')
+    return Span(session=session,
+                start=_EPOCH + replicated.start_us * _MICROSECOND,
+                end=_EPOCH + replicated.end_us * _MICROSECOND)
+
+
+class ReplicationServicer(replication_pb2_grpc.ReplicationServicer):
+    """Saves spans of other trackds into the central trackd's storage."""
+
+    def __init__(self, span_storage: SpanStorage):
+        self._span_storage = span_storage
+
+    def replicate(self, request_iterator, context):
+        for batch in request_iterator:
+            if not batch.origin:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, 'A batch without an origin')
+            try:
+                spans = [(replicated.id, from_proto(replicated)) for replicated in batch.spans]
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+            if spans:
+                last_id = self._span_storage.add_replicated(batch.origin, spans)
+                REPLICATED_SPANS.inc('received', amount=len(spans))
+            else:
+                last_id = self._span_storage.replicated_id(batch.origin)
+            yield replication_pb2.ReplicationAck(id=last_id)
+
+
+class Replicator:
+    """Sends spans saved in `span_storage` to the central trackd at `server`.
+
+    Keeps up to `max_in_flight` unacknowledged batches of up to `max_batch`
+    spans, and checks for new spans every `poll_interval` seconds.
+    """
+
+    def __init__(self, span_storage: SpanStorage, server: str, origin: str,
+                 max_batch: int = 500, max_in_flight: int = 4, poll_interval: float = 1):
+        self._span_storage = span_storage
+        self._server = server
+        self._origin = origin
+        self._max_batch = max_batch
+        self._max_in_flight = max_in_flight
+        self._poll_interval = poll_interval
+        self._cond = threading.Condition()
+        # The last rowid the central trackd has, `None` until it says so.
+        self._acked: Optional[int] = None
+        # The last rowid sent over the current stream, and batches in flight.
+        self._sent = 0
+        self._in_flight = 0
+        # Changes on every reconnection, to stop batches of the old stream.
+        self._generation = 0
+        self._closed = False
+        self._call = None
+
+    def run(self, reconnect_delay: float = 1, max_reconnect_delay: float = 60) -> None:
+        """Replicates, reconnecting until `close()` is called."""
+        delay = reconnect_delay
+        while not self._closed:
+            try:
+                with grpc.insecure_channel(self._server, compression=grpc.Compression.Gzip,
+                                           options=[('grpc.keepalive_time_ms', 30000)]) as channel:
+                    stub = replication_pb2_grpc.ReplicationStub(channel)
+                    self._reset()
+                    self._call = stub.replicate(self._batches())
+                    for ack in self._call:
+                        self._acknowledge(ack.id)
+                        delay = reconnect_delay
+            except grpc.RpcError as e:
+                if self._closed:
+                    return
+                logger.warning('Replication stream broke (%s), reconnecting in %ss',
+                               e.code(), delay)
+            time.sleep(delay)
+            delay = min(delay * 2, max_reconnect_delay)
+
+    def close(self) -> None:
+        """Stops `run()`.  Unacknowledged spans are sent after a restart."""
+        with self._cond:
+            self._closed = True
+            self._generation += 1
+            self._cond.notify_all()
+        if self._call is not None:
+            self._call.cancel()
+
+    def acked(self) -> Optional[int]:
+        """Returns the last rowid the central trackd has."""
+        with self._cond:
+            return self._acked
+
+    def _reset(self) -> None:
+        with self._cond:
+            self._generation += 1
+            self._acked = None
+            self._in_flight = 0
+            self._cond.notify_all()
+
+    def _acknowledge(self, rowid: int) -> None:
+        with self._cond:
+            if self._acked is None:
+                # The reply to the first batch: where to resume from.
+                self._sent = rowid
+            else:
+                self._in_flight -= 1
+            self._acked = rowid
+            self._cond.notify_all()
+
+    def _batches(self) -> Iterator[replication_pb2.SpanBatch]:
+        with self._cond:
+            generation = self._generation
+        yield replication_pb2.SpanBatch(origin=self._origin)
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._generation != generation or (
+                    self._acked is not None and self._in_flight < self._max_in_flight))
+                if self._generation != generation:
+                    return
+                sent = self._sent
+            spans = self._span_storage.after(sent, self._max_batch)
+            if not spans:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._generation != generation,
+                                        timeout=self._poll_interval)
+                continue
+            with self._cond:
+                if self._generation != generation:
+                    return
+                self._sent = spans[-1][0]
+                self._in_flight += 1
+            REPLICATED_SPANS.inc('sent', amount=len(spans))
+            yield replication_pb2.SpanBatch(
+                    origin=self._origin, spans=[to_proto(rowid, span) for rowid, span in spans])
+
+
+def add_servicer(server: grpc.Server, span_storage: SpanStorage) -> None:
+    replication_pb2_grpc.add_ReplicationServicer_to_server(
+            ReplicationServicer(span_storage), server)
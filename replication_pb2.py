@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
+# source: replication.proto
+# Protobuf Python Version: 7.35.1
+"""Generated protocol buffer code."""
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
+from google.protobuf import symbol_database as _symbol_database
+from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'replication.proto'
+)
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x11replication.proto\x12\x06trackd\"\x9e\x01\n\x0eReplicatedSpan\x12\n\n\x02id\x18\x01 \x01(\x03\x12\x14\n\x0csession_type\x18\x02 \x01(\t\x12\x14\n\x0csession_name\x18\x03 \x01(\t\x12\x10\n\x08hostname\x18\x04 \x01(\t\x12\x12\n\nserver_pid\x18\x05 \x01(\x03\x12\x0c\n\x04user\x18\x06 \x01(\t\x12\x10\n\x08start_us\x18\x07 \x01(\x03\x12\x0e\n\x06\x65nd_us\x18\x08 \x01(\x03\"B\n\tSpanBatch\x12\x0e\n\x06origin\x18\x01 \x01(\t\x12%\n\x05spans\x18\x02 \x03(\x0b\x32\x16.trackd.ReplicatedSpan\"\x1c\n\x0eReplicationAck\x12\n\n\x02id\x18\x01 \x01(\x03\x32I\n\x0bReplication\x12:\n\treplicate\x12\x11.trackd.SpanBatch\x1a\x16.trackd.ReplicationAck(\x01\x30\x01\x62\x06proto3')
+
+_globals = globals()
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'replication_pb2', _globals)
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
+  _globals['_REPLICATEDSPAN']._serialized_start=30
+  _globals['_REPLICATEDSPAN']._serialized_end=188
+  _globals['_SPANBATCH']._serialized_start=190
+  _globals['_SPANBATCH']._serialized_end=256
+  _globals['_REPLICATIONACK']._serialized_start=258
+  _globals['_REPLICATIONACK']._serialized_end=286
+  _globals['_REPLICATION']._serialized_start=288
+  _globals['_REPLICATION']._serialized_end=361
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,172 @@
+from concurrent import futures
+import datetime
+import pathlib
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+from click.testing import CliRunner
+import grpc
+
+import clock
+import replication
+import sources
+import storage
+import trackctl
+import trackd
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(.01)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def make_span(session_name: str, minute: int) -> storage.Span:
+    start = datetime.datetime(2021, 3, 16, 10, minute, tzinfo=clock.SYSTEM.zone())
+    return storage.Span(
+            session=storage.TmuxSession(session_name=session_name, hostname='laptop',
+                                        server_pid=42),
+            start=start,
+            end=start + datetime.timedelta(minutes=1))
+
+
+class ReplicatorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.central = storage.SpanStorage(':memory:')
+        self.origin = storage.SpanStorage(':memory:')
+        self.server = None
+        self.replicator = None
+
+    def tearDown(self):
+        if self.replicator is not None:
+            self.replicator.close()
+        if self.server is not None:
+            self.server.stop(grace=None)
+
+    def start_server(self, port=0) -> int:
+        self.server = grpc.server(futures.ThreadPoolExecutor(max_workers=2))
+        replication.add_servicer(self.server, self.central)
+        port = self.server.add_insecure_port(f'localhost:{port}')
+        self.server.start()
+        return port
+
+    def start_replicator(self, port) -> replication.Replicator:
+        self.replicator = replication.Replicator(
+                self.origin, f'localhost:{port}', origin='laptop', max_batch=2,
+                poll_interval=.01)
+        threading.Thread(target=self.replicator.run, kwargs={'reconnect_delay': .05},
+                         daemon=True).start()
+        return self.replicator
+
+    def test_replicates_spans_in_batches(self):
+        spans = [make_span(f'session{i}', i) for i in range(5)]
+        self.origin.add_many(spans[:3])
+
+        self.start_replicator(self.start_server())
+        wait_for(lambda: self.replicator.acked() == 3)
+        self.origin.add_many(spans[3:])
+        wait_for(lambda: self.replicator.acked() == 5)
+
+        self.assertEqual(list(self.central.query()), spans)
+        self.assertEqual(self.central.replicated_id('laptop'), 5)
+
+    def test_resumes_after_reconnecting(self):
+        spans = [make_span(f'session{i}', i) for i in range(4)]
+        self.origin.add_many(spans[:2])
+        port = self.start_server()
+        self.start_replicator(port)
+        wait_for(lambda: self.replicator.acked() == 2)
+
+        self.server.stop(grace=None)
+        self.origin.add_many(spans[2:])
+        self.start_server(port)
+        wait_for(lambda: self.replicator.acked() == 4)
+
+        self.assertEqual(list(self.central.query()), spans)
+
+
+class AddReplicatedTest(unittest.TestCase):
+
+    def test_skips_spans_it_has(self):
+        central = storage.SpanStorage(':memory:')
+        first, second = make_span('foo', 0), make_span('bar', 1)
+
+        self.assertEqual(central.add_replicated('laptop', [(1, first)]), 1)
+        self.assertEqual(central.add_replicated('laptop', [(1, first), (2, second)]), 2)
+        self.assertEqual(central.add_replicated('laptop', [(2, second)]), 2)
+        # Rowids are per origin.
+        self.assertEqual(central.add_replicated('desktop', [(1, first)]), 1)
+
+        self.assertEqual(list(central.query()), [first, first, second])
+
+
+class RederiveTest(unittest.TestCase):
+
+    def test_forgets_replicated_spans_of_other_origins(self):
+        span = make_span('foo', 0)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            central_db = str(pathlib.Path(temp_dir) / 'central.db')
+            output = str(pathlib.Path(temp_dir) / 'rederived.db')
+            storage.SpanStorage(central_db).add_replicated('laptop', [(1, span)])
+
+            result = CliRunner().invoke(trackctl.cli, ['rederive', '--db', central_db,
+                                                       '--output', output])
+            self.assertEqual(result.exit_code, 0, result.output)
+
+            rederived = storage.SpanStorage(output)
+            self.assertEqual(list(rederived.query()), [])
+            self.assertEqual(rederived.replicated_id('laptop'), 0)
+            # So the laptop sends it again.
+            self.assertEqual(rederived.add_replicated('laptop', [(1, span)]), 1)
+            self.assertEqual(list(rederived.query()), [span])
+
+
+class FakeSource(sources.Source):
+
+    def start(self, context: sources.SourceContext) -> None:
+        span_tracker = context.span_tracker()
+        for session_name in ('foo', 'bar'):
+            span_tracker.update_active_session(
+                    storage.TmuxSession(session_name=session_name, hostname='laptop',
+                                        server_pid=42))
+
+
+class TrackdReplicationTest(unittest.TestCase):
+
+    def test_replicates_to_central_trackd(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            central_db = str(pathlib.Path(temp_dir) / 'central.db')
+            port = free_port()
+            central = trackd.Trackd(db_path=central_db, port=port, admin_port=0,
+                                    config=sources.Config(enabled=[]), accept_replication=True)
+            central.start()
+            origin = trackd.Trackd(
+                    db_path=str(pathlib.Path(temp_dir) / 'laptop.db'), port=free_port(),
+                    admin_port=0, replicate_to=f'localhost:{port}', origin='laptop',
+                    config=sources.Config(enabled=['fake'],
+                                          factories={'fake': 'replication_test:FakeSource'}))
+            origin.start()
+            try:
+                wait_for(lambda: origin.replicator.acked() == 1)
+            finally:
+                origin.stop()
+                central.stop()
+
+            (span,) = storage.SpanStorage(central_db).query()
+        self.assertEqual(span.session.session_name, 'foo')
+
+
+if __name__ == '__main__':
+    unittest.main()
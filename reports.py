@@ -8,20 +8,21 @@
 
 from dataclasses import dataclass
 from collections import defaultdict
+import dataclasses
 from enum import Enum
 from pprint import pprint
 import datetime
 import os.path
 
-from typing import Iterable, Optional, Tuple, Union
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
 import click
 import click_config_file
 
 from time_utils import duration, hours, humanize
-import trackd
-import chrome
-import tmux
+import aggregate
+import storage
+import timeline
 
 
 @dataclass(frozen=True)
@@ -33,6 +34,10 @@ class Options:
     chrome_user_non_work: str
     # Don't report spans sum of which is shorter than this.
     min_length: int
+    # trackd databases to report on, or directories of them.
+    db_paths: Tuple[str, ...] = ('spans.db',)
+    # How to resolve overlapping spans, one of `timeline.POLICIES`.
+    overlap_policy: str = 'latest'
 
 class SpanType(Enum):
     WORK = 1
@@ -49,6 +54,9 @@ class ReportSpan:
     type_: SpanType
     start: datetime.datetime
     end: datetime.datetime
+    # Where the span comes from: a tmux session's host, or a Chrome user.
+    hostname: Optional[str] = None
+    user: Optional[str] = None
 
     def __repr__(self):
         return f"{self.__class__.__name__}({self.name!r}, {self.type_}, start='{self.start:%H:%M:%S}', end='{self.end:%H:%M:%S}')"
@@ -82,10 +90,10 @@ def make_key(span: ReportSpan) -> ReportKey:
 
 
 def split_work_non_work(opts: Options,
-                        raw_spans: Iterable[trackd.Span]) -> Iterable[ReportSpan]:
+                        raw_spans: Iterable[storage.Span]) -> Iterable[ReportSpan]:
     """Transforms into work/non-work spans."""
     for span in raw_spans:
-        if isinstance(span.session, tmux.TmuxSession):
+        if isinstance(span.session, storage.TmuxSession):
             if span.session.hostname not in (opts.hostnames_work + opts.hostnames_non_work):
                 raise RuntimeError(f"The span's hostname, {span.session.hostname!r}, isn't in "
                                    f"{opts.hostnames_work!r} or {opts.hostnames_non_work!r}")
@@ -95,7 +103,7 @@ def split_work_non_work(opts: Options,
                 type_ = SpanType.NON_WORK
             else:
                 raise RuntimeError(f'Unexpected hostname in TmuxSession: {span.session.hostname!r}')
-        elif isinstance(span.session, chrome.ChromeSession):
+        elif isinstance(span.session, storage.ChromeSession):
             if span.session.user == opts.chrome_user_work:
                 type_ = SpanType.WORK
             elif span.session.user == opts.chrome_user_non_work:
@@ -108,6 +116,8 @@ def split_work_non_work(opts: Options,
                 type_ = type_,
                 start = span.start,
                 end = span.end,
+                hostname = getattr(span.session, 'hostname', None),
+                user = getattr(span.session, 'user', None),
         )
 
 
@@ -121,13 +131,13 @@ def merge(spans: Iterable[ReportSpan], n: int = 5) -> Iterable[ReportSpan]:
     try:
         while True:
             nxt = next(spans)
-            if nxt.name != current.name or nxt.type_ != current.type_:
+            if (nxt.name, nxt.type_, nxt.hostname, nxt.user) != (
+                    current.name, current.type_, current.hostname, current.user):
                 yield current
                 current = nxt
                 continue
             if (nxt.start - current.end).total_seconds() <= n:
-                current = ReportSpan(name=current.name, type_=current.type_,
-                                     start=current.start, end=nxt.end)
+                current = dataclasses.replace(current, end=nxt.end)
             else:
                 yield current
                 current = nxt
@@ -142,9 +152,23 @@ def cull(spans: Iterable[ReportSpan], min_length: int = 5) -> Iterable[ReportSpa
             yield span
 
 
+def find_databases(paths: Sequence[str]) -> List[str]:
+    """Replaces directories in `paths` with the *.db files in them."""
+    db_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            db_paths.extend(sorted(entry.path for entry in os.scandir(path)
+                                   if entry.name.endswith('.db') and entry.is_file()))
+        else:
+            db_paths.append(path)
+    return db_paths
+
+
 def get_spans(opts: Options):
-    span_storage = trackd.SpanStorage('spans.db')
-    raw_spans = span_storage.query()
+    span_storages = [storage.SpanStorage(db_path, read_only=True)
+                     for db_path in find_databases(opts.db_paths)]
+    raw_spans = timeline.resolve(storage.merge_queries(span_storages),
+                                 timeline.POLICIES[opts.overlap_policy])
     spans = split_work_non_work(opts, raw_spans)
     spans = merge(spans)
     spans = cull(spans)
@@ -161,97 +185,55 @@ def spans_report(opts: Options):
 
 
 def per_day_report(opts: Options) -> None:
-
-    def split_day(spans: Iterable[ReportSpan]) -> Iterable[ReportSpan]:
-        """Splits a span going over midnight into two."""
-        for span in spans:
-            assert span.length() < duration('1d')
-
-            if span.start.date() != span.end.date():
-                second_start = span.end.replace(hour=0, second=0, minute=0, microsecond=0)
-                assert second_start != span.end
-                first_end = second_start - datetime.timedelta(microseconds=1)
-
-                yield ReportSpan(name=span.name, type_=span.type_,
-                                 start=span.start, end=first_end)
-                yield ReportSpan(name=span.name, type_=span.type_,
-                                 start=second_start, end=span.end)
-            else:
-                yield span
-
-    spans = list(get_spans(opts))
-    spans = split_day(spans)
+    dimensions = aggregate.group_by(['day', 'type', 'name'])
+    per_day: Dict[datetime.date, Dict[ReportKey, float]] = defaultdict(dict)
     per_day_per_w_nw = defaultdict(lambda: defaultdict(int))
-    per_day_per_project = defaultdict(lambda: defaultdict(int))
     workday_start = {}
     workday_end = {}
-    for span in spans:
-        per_day_per_w_nw[span.start.date()][span.type_] += span.length()
-        per_day_per_project[span.start.date()][make_key(span)] += span.length()
-        if span.type_ == SpanType.WORK and span.length() >= opts.min_length:
-            day = span.start.date()
-            if day not in workday_start:
-               workday_start[day] = span.start.time()
-            if day not in workday_end or span.end.time() > workday_end[day]:
-                workday_end[day] = span.end.time()
-
-    for day, day_report in per_day_per_project.items():
+    for (day, type_, name), start, end in aggregate.split(get_spans(opts), dimensions):
+        length = aggregate.seconds(start, end)
+        key = ReportKey(name=name, type_=type_)
+        per_day[day][key] = per_day[day].get(key, 0) + length
+        per_day_per_w_nw[day][type_] += length
+        if type_ == SpanType.WORK and length >= opts.min_length:
+            workday_start.setdefault(day, start)
+            workday_end[day] = max(workday_end.get(day, end), end)
+
+    for day, day_report in per_day.items():
         print(f'\n== {day:%a, %b %d}')
         work_hours = hours(per_day_per_w_nw[day][SpanType.WORK])
         non_work_hours = hours(per_day_per_w_nw[day][SpanType.NON_WORK])
         print(f'Σ: w={work_hours}, nw={non_work_hours}')
         if day in workday_start:
-            assert day in workday_end
             day_start = workday_start[day].strftime('%H:%M')
-            day_end = workday_end[day].strftime('%H:%M')
+            day_end = workday_end[day].strftime('%H:%M') if workday_end[day].date() == day else '24:00'
             print(f'work day: {day_start}—{day_end}')
         print()
-        itms = sorted(day_report.items(), key=lambda itm: itm[1], reverse=True)
-        for k, length in itms:
-            if length < opts.min_length:
-                continue
-            print(k, hours(length))
+        _print_by_length(day_report, opts.min_length)
 
 
 def per_week_report(opts: Options) -> None:
-
-    def get_week(dt: Union[datetime.datetime, datetime.date]) -> int:
-        _, week, _ = dt.isocalendar()
-        return week
-
-    def format_week(week: int) -> str:
-        # XXX TODO: Take the year out of actual spans.
-        # I won't need it before 2022 though.
-        year = datetime.datetime.now().year
-        week_start = datetime.date.fromisocalendar(year, week, day=1)
-        week_end = datetime.date.fromisocalendar(year, week, day=7)
-        return f'{week_start:%b %d} — {week_end:%b %d}'
-
-    def split_week(spans: Iterable[ReportSpan]) -> Iterable[ReportSpan]:
-        """Splits a span going over Sunday → Monday midnight into two."""
-        for span in spans:
-            assert span.length() < duration('7d')
-            if get_week(span.start) != get_week(span.end):
-                raise NotImplementedError
-            yield span
-
+    dimensions = aggregate.group_by(['week', 'type', 'name'])
+    per_week: Dict[Tuple[int, int], Dict[ReportKey, float]] = defaultdict(dict)
     per_week_per_w_nw = defaultdict(lambda: defaultdict(int))
-    per_week_per_project = defaultdict(lambda: defaultdict(int))
-    for span in split_week(get_spans(opts)):
-        per_week_per_w_nw[get_week(span.start)][span.type_] += span.length()
-        per_week_per_project[get_week(span.start)][make_key(span)] += span.length()
+    for (week, type_, name), length in aggregate.aggregate(get_spans(opts), dimensions).items():
+        per_week[week][ReportKey(name=name, type_=type_)] = length
+        per_week_per_w_nw[week][type_] += length
 
-    for week, week_report in per_week_per_project.items():
-        print(f'\n== {format_week(week)}')
+    for week, week_report in per_week.items():
+        print(f'\n== {dimensions[0].format(week)}')
         work_hours = hours(per_week_per_w_nw[week][SpanType.WORK])
         non_work_hours = hours(per_week_per_w_nw[week][SpanType.NON_WORK])
         print(f'Σ: w={work_hours}, nw={non_work_hours}')
         print()
-        itms = sorted(week_report.items(), key=lambda itm: itm[1], reverse=True)
-        for k, length in itms:
-            if length < opts.min_length:
-                continue
-            print(k, hours(length))
+        _print_by_length(week_report, opts.min_length)
+
+
+def _print_by_length(lengths: Dict[ReportKey, float], min_length: int) -> None:
+    for key, length in sorted(lengths.items(), key=lambda item: item[1], reverse=True):
+        if length < min_length:
+            continue
+        print(key, hours(length))
 
 
 def calendar_report(opts: Options) -> None:
@@ -260,12 +242,12 @@ def calendar_report(opts: Options) -> None:
         type_ = '[w] ' if key.type_ is SpanType.WORK else '[nw]'
         return f'{type_} {key.name} ({humanize(length)})'
 
-    split_point = duration('30m')  # split into 30m chunks.
-    spans = get_spans(opts)
-    per_day_per_interval_per_project = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-    for interval_start, span in _split_into_chunks(spans, split_point=split_point):
-        per_day_per_interval_per_project[
-            interval_start.date()][interval_start.time()][make_key(span)] += span.length()
+    dimensions = aggregate.group_by(['day', 'bucket', 'type', 'name'],
+                                    bucket_seconds=duration('30m'))
+    per_day_per_interval_per_project = defaultdict(lambda: defaultdict(dict))
+    for (day, interval, type_, name), length in aggregate.aggregate(
+            get_spans(opts), dimensions).items():
+        per_day_per_interval_per_project[day][interval][ReportKey(name=name, type_=type_)] = length
 
     for day, day_report in per_day_per_interval_per_project.items():
         print(f'== {day:%a, %b %d}')
@@ -278,50 +260,12 @@ def calendar_report(opts: Options) -> None:
             print(f'{period:%H:%M}  {formatted}')
 
 
-def _split_into_chunks(spans: Iterable[ReportSpan],
-                       split_point: int) -> Iterable[Tuple[datetime.datetime, ReportSpan]]:
-    """Splits spans into chunks falling into `split_point`-sized intervals.
-    """
-    spans = list(spans)
-    # May be worth asserting here that spans are sorted and non-overlaping.
-    start = spans[0].start.timestamp()
-    start = start - (start % split_point)
-    end = spans[-1].end.timestamp()
-    end = end + (split_point - end % split_point)
-
-    n_intervals = (end - start) // split_point
-    spans_itr = iter(spans)
-    span = next(spans_itr)
-
-    i = 0
-    while True:
-        if i >= n_intervals:
-            assert not list(spans_itr)
-            return
-        interval_start = datetime.datetime.fromtimestamp(start + split_point * i)
-        interval_start = interval_start.replace(tzinfo=span.start.tzinfo)
-        interval_end = datetime.datetime.fromtimestamp(start + split_point * (i + 1))
-        interval_end = interval_end.replace(tzinfo=span.start.tzinfo)
-        assert interval_start <= span.start
-        if span.start >= interval_end:
-            i += 1
+def query_report(opts: Options, dimensions: Sequence[aggregate.Dimension]) -> None:
+    """Prints time per group of `dimensions`, see aggregate.py."""
+    for key, length in aggregate.aggregate(get_spans(opts), dimensions).items():
+        if length < opts.min_length:
             continue
-        if span.end <= interval_end:
-            yield interval_start, span
-            try:
-                span = next(spans_itr)
-            except StopIteration:
-                return
-            continue
-
-        assert interval_start <= span.start <= interval_end <= span.end
-        assert interval_end <= span.end
-
-        yield interval_start, ReportSpan(name=span.name, type_=span.type_,
-                                         start=span.start, end=interval_end)
-        span = ReportSpan(name=span.name, type_=span.type_,
-                          start=interval_end, end=span.end)
-        i += 1
+        print('  '.join(aggregate.format_key(key, dimensions)), humanize(length))
 
 
 CONFIG_FILE = os.path.expanduser('~/trackctl.conf')
@@ -334,16 +278,24 @@ CONFIG_FILE = os.path.expanduser('~/trackctl.conf')
 @click.option('--min_length', required=True,
               help="Don't report spans sum of which is shorter than this.",
               default='7m')
+@click.option('--db', 'db_paths', default=['spans.db'], multiple=True,
+              help='trackd database to report on, or a directory of them.  Can be repeated, '
+                   'e.g. for databases of different machines.')
+@click.option('--overlap_policy', type=click.Choice(list(timeline.POLICIES)), default='latest',
+              help='Which of overlapping spans to keep, see timeline.py.')
 @click_config_file.configuration_option(config_file_name=CONFIG_FILE)
 @click.pass_context
-def cli(ctx, hostnames_work, hostnames_non_work, chrome_user_work, chrome_user_non_work, min_length):
+def cli(ctx, hostnames_work, hostnames_non_work, chrome_user_work, chrome_user_non_work, min_length,
+        db_paths, overlap_policy):
     ctx.ensure_object(dict)
     ctx.obj['options'] = Options(
             hostnames_work=hostnames_work,
             hostnames_non_work=hostnames_non_work,
             chrome_user_work=chrome_user_work,
             chrome_user_non_work=chrome_user_non_work,
-            min_length=duration(min_length))
+            min_length=duration(min_length),
+            db_paths=tuple(db_paths),
+            overlap_policy=overlap_policy)
 
 
 @cli.command()
@@ -374,5 +326,19 @@ def calendar(ctx):
     calendar_report(opts)
 
 
+@cli.command()
+@click.option('--group-by', 'group_by', default='day,type,name',
+              help='Comma-separated dimensions: ' + ', '.join([*aggregate.DIMENSIONS, 'bucket']) + '.')
+@click.option('--bucket', help='Length of buckets, e.g. "30m", for grouping by bucket.')
+@click.pass_context
+def query(ctx, group_by, bucket):
+    opts = ctx.obj['options']
+    try:
+        dimensions = aggregate.group_by(group_by.split(','), duration(bucket) if bucket else None)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--group-by')
+    query_report(opts, dimensions)
+
+
 if __name__ == '__main__':
     cli()
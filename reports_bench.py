@@ -0,0 +1,302 @@
+"""Benchmark for reports.py at scale.
+
+Fills databases with N synthetic spans (see `generate`), times `get_spans`,
+the reports and `aggregate.aggregate` on each of them, and measures their peak
+memory with tracemalloc (in a separate run, as tracing slows everything down).
+Results go to a JSON file; with a baseline, a results file of an earlier run,
+they're compared against it and the exit status is 1 if anything got slower
+than `--max_slowdown`.
+
+Span generation is deterministic for a seed, and times are in UTC, so runs on
+different machines report on the same spans.  Databases are cached in
+`--workdir`, keyed by the generator's parameters: generating 10^7 spans takes
+a few minutes.
+
+Usage:
+  python reports_bench.py --sizes 10000,100000 --output reports_bench_baseline.json
+  ...change reports.py...
+  python reports_bench.py --sizes 10000,100000 --baseline reports_bench_baseline.json
+"""
+from dataclasses import asdict, dataclass
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import pathlib
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from typing import Callable, Dict, Iterator, List
+
+import click
+
+# Reports are in local time.  Pin it, so days and weeks start at the same
+# instants everywhere.
+os.environ['TZ'] = 'UTC'
+time.tzset()
+
+import aggregate
+import reports
+import storage
+from time_utils import duration
+
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2021, 1, 4, tzinfo=UTC)  # A Monday.
+# Bump when `generate()` changes, so databases cached in --workdir aren't reused.
+GENERATOR_VERSION = 2
+
+DAY_START = duration('8h')
+DAY_END = duration('23h')
+
+
+@dataclass(frozen=True)
+class GeneratorParams:
+    projects: int = 20
+    # Work hosts are named work0, work1, ..., non-work hosts home0, ...
+    work_hosts: int = 3
+    non_work_hosts: int = 2
+    chrome_users: int = 2
+    # Fraction of Chrome spans.
+    chrome: float = 0.4
+    spans_per_day: int = 500
+    # Fraction of spans which are a part of a flapping burst: focus
+    # alternating between two sessions every few seconds.
+    flapping: float = 0.1
+    # Fraction of days with the last span going over midnight.
+    midnight_crossings: float = 0.2
+    seed: int = 0
+
+    def key(self) -> str:
+        key = {**asdict(self), 'generator_version': GENERATOR_VERSION}
+        return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:8]
+
+
+def report_options(params: GeneratorParams, db_path: str) -> reports.Options:
+    return reports.Options(
+            hostnames_work=tuple(f'work{i}' for i in range(params.work_hosts)),
+            hostnames_non_work=tuple(f'home{i}' for i in range(params.non_work_hosts)),
+            chrome_user_work='user0',
+            chrome_user_non_work='user1',
+            min_length=duration('7m'),
+            db_paths=(db_path,))
+
+
+def generate(params: GeneratorParams, n_spans: int) -> Iterator[storage.Span]:
+    """Yields `n_spans` sorted, non-overlapping spans.
+
+    Every day has spans from 08:00 to about 23:00, of random sessions, with
+    random gaps between them.
+    """
+    rng = random.Random(params.seed)
+    # Chrome users past the first two are neither work nor non-work, reports
+    # skip them.
+    chrome_users = [f'user{i}' for i in range(params.chrome_users)]
+    hosts = ([f'work{i}' for i in range(params.work_hosts)] +
+             [f'home{i}' for i in range(params.non_work_hosts)])
+
+    def random_session():
+        project = f'project{rng.randrange(params.projects)}'
+        if rng.random() < params.chrome:
+            return storage.ChromeSession(session_name=project, user=rng.choice(chrome_users))
+        host = rng.choice(hosts)
+        return storage.TmuxSession(session_name=project, hostname=host,
+                                   server_pid=hosts.index(host) + 1000)
+
+    # Spans and the gaps between them fill the day.
+    mean_slot = (DAY_END - DAY_START) / params.spans_per_day
+    day = START
+    t = day + datetime.timedelta(seconds=DAY_START)
+    n = 0
+    while n < n_spans:
+        day_end = day + datetime.timedelta(seconds=DAY_END)
+        if rng.random() < params.flapping / 10:
+            # Bursts average 10 spans.
+            burst = [random_session(), random_session()]
+            lengths = [rng.uniform(1, 20) for _ in range(min(rng.randint(5, 15), n_spans - n))]
+        else:
+            burst = [random_session()]
+            lengths = [rng.expovariate(1 / (mean_slot * .8))]
+        for i, length in enumerate(lengths):
+            end = min(t + datetime.timedelta(seconds=length), day_end)
+            yield storage.Span(session=burst[i % len(burst)], start=t, end=end)
+            n += 1
+            t = end
+        t += datetime.timedelta(seconds=rng.expovariate(1 / (mean_slot * .2)))
+        if t < day_end:
+            continue
+
+        next_day = day + datetime.timedelta(days=1)
+        if n < n_spans and rng.random() < params.midnight_crossings:
+            yield storage.Span(
+                    session=random_session(),
+                    start=min(t, next_day - datetime.timedelta(minutes=1)),
+                    end=next_day + datetime.timedelta(seconds=rng.uniform(60, duration('1h'))))
+            n += 1
+        day = next_day
+        t = day + datetime.timedelta(seconds=DAY_START)
+
+
+def make_db(params: GeneratorParams, n_spans: int, workdir: pathlib.Path) -> pathlib.Path:
+    path = workdir / f'spans-{n_spans}-{params.key()}.db'
+    if path.exists():
+        return path
+    partial = path.with_suffix('.partial')
+    partial.unlink(missing_ok=True)
+    span_storage = storage.SpanStorage(str(partial))
+    batch: List[storage.Span] = []
+    for span in generate(params, n_spans):
+        batch.append(span)
+        if len(batch) == 100000:
+            span_storage.add_many(batch)
+            batch.clear()
+    span_storage.add_many(batch)
+    partial.rename(path)
+    return path
+
+
+def benchmarks(opts: reports.Options) -> Dict[str, Callable[[], Callable[[], None]]]:
+    """Returns setup functions, which return the function to measure."""
+
+    def get_spans():
+        for _ in reports.get_spans(opts):
+            pass
+
+    def aggregate_calendar():
+        spans = list(reports.get_spans(opts))
+        dimensions = aggregate.group_by(['day', 'bucket', 'type', 'name'],
+                                        bucket_seconds=duration('30m'))
+        return lambda: aggregate.aggregate(spans, dimensions)
+
+    return {
+        'get_spans': lambda: get_spans,
+        'per_day_report': lambda: lambda: reports.per_day_report(opts),
+        'per_week_report': lambda: lambda: reports.per_week_report(opts),
+        'calendar_report': lambda: lambda: reports.calendar_report(opts),
+        # The calendar report's aggregation, excluding getting the spans.
+        'aggregate': aggregate_calendar,
+    }
+
+
+def measure(setup: Callable[[], Callable[[], None]], repeat: int, memory: bool) -> dict:
+    """Returns the best time of `repeat` runs, and peak memory if `memory`."""
+    result: dict = {}
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        try:
+            fn = setup()
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                fn()
+                times.append(time.perf_counter() - start)
+            result['seconds'] = min(times)
+            if memory:
+                tracemalloc.start()
+                try:
+                    fn()
+                    _, result['peak_bytes'] = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+        except Exception as e:
+            result['error'] = repr(e)
+    return result
+
+
+def compare(results: dict, baseline: dict, max_slowdown: float) -> bool:
+    """Prints the change against the baseline.  Returns whether it's within `max_slowdown`."""
+    ok = True
+    for size, by_name in results['results'].items():
+        for name, result in by_name.items():
+            base = baseline['results'].get(size, {}).get(name)
+            if not base or 'seconds' not in base or 'seconds' not in result:
+                continue
+            ratio = result['seconds'] / base['seconds']
+            line = f'{size:>9} {name:<20} time {ratio:6.2f}x'
+            if 'peak_bytes' in base and 'peak_bytes' in result:
+                line += f'  memory {result["peak_bytes"] / max(base["peak_bytes"], 1):6.2f}x'
+            if ratio > max_slowdown:
+                line += '  SLOWER'
+                ok = False
+            print(line)
+    return ok
+
+
+def _format_bytes(n: int) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if n < 1024:
+            return f'{n:.0f}{unit}'
+        n /= 1024
+    return f'{n:.1f}GiB'
+
+
+@click.command()
+@click.option('--sizes', default='10000,100000,1000000,10000000',
+              help='Comma-separated numbers of spans.')
+@click.option('--projects', default=GeneratorParams.projects)
+@click.option('--work_hosts', default=GeneratorParams.work_hosts)
+@click.option('--non_work_hosts', default=GeneratorParams.non_work_hosts)
+@click.option('--chrome_users', default=GeneratorParams.chrome_users)
+@click.option('--spans_per_day', default=GeneratorParams.spans_per_day)
+@click.option('--flapping', default=GeneratorParams.flapping,
+              help='Fraction of spans in flapping bursts.')
+@click.option('--midnight_crossings', default=GeneratorParams.midnight_crossings,
+              help='Fraction of days ending with a span over midnight.')
+@click.option('--seed', default=GeneratorParams.seed)
+@click.option('--workdir', type=click.Path(file_okay=False),
+              help='Where to keep generated databases.  A temporary directory by default.')
+@click.option('--repeat', default=1, help='Timed runs per measurement; the best one counts.')
+@click.option('--memory/--no-memory', default=True, help='Whether to measure peak memory.')
+@click.option('--output', default='reports_bench_results.json', type=click.Path(dir_okay=False))
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False),
+              help='Results of an earlier run to compare with.')
+@click.option('--max_slowdown', default=1.25,
+              help='Fail if anything is slower than the baseline by this factor.')
+def main(sizes, projects, work_hosts, non_work_hosts, chrome_users, spans_per_day, flapping,
+         midnight_crossings, seed, workdir, repeat, memory, output, baseline, max_slowdown):
+    params = GeneratorParams(
+            projects=projects, work_hosts=work_hosts, non_work_hosts=non_work_hosts,
+            chrome_users=chrome_users, spans_per_day=spans_per_day, flapping=flapping,
+            midnight_crossings=midnight_crossings, seed=seed)
+    results = {
+        'python': sys.version.split()[0],
+        'machine': platform.machine(),
+        'params': asdict(params),
+        'results': {},
+    }
+    with contextlib.ExitStack() as stack:
+        if workdir is None:
+            workdir = stack.enter_context(tempfile.TemporaryDirectory())
+        workdir = pathlib.Path(workdir)
+        workdir.mkdir(parents=True, exist_ok=True)
+        for n_spans in (int(size) for size in sizes.split(',')):
+            start = time.perf_counter()
+            db_path = make_db(params, n_spans, workdir)
+            print(f'{n_spans} spans ({time.perf_counter() - start:.1f}s to generate)')
+            by_name = results['results'][str(n_spans)] = {}
+            for name, setup in benchmarks(report_options(params, str(db_path))).items():
+                result = by_name[name] = measure(setup, repeat, memory)
+                if 'error' in result:
+                    print(f'  {name:<20} {result["error"]}')
+                    continue
+                line = f'  {name:<20} {result["seconds"]:9.3f}s'
+                if 'peak_bytes' in result:
+                    line += f'  peak {_format_bytes(result["peak_bytes"])}'
+                print(line)
+
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+
+    if baseline:
+        with open(baseline) as f:
+            if not compare(results, json.load(f), max_slowdown):
+                sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,14 @@
 import datetime
 import doctest
+import os
+import pathlib
+import subprocess
+import sys
+import tempfile
 import unittest
 
 import reports
-from time_utils import duration
-
-
-def make_span(start: str, end: str, name='Span', type_=reports.SpanType.WORK) -> reports.ReportSpan:
-    """A helper to create test ReportSpans.
-
-    All but `start` and `end` have sensible default values (for a test).
-    `start` and `end` should be text strings in form "HH:MM".
-    """
-
-    return reports.ReportSpan(
-            name=name,
-            type_=type_,
-            start=t(start),
-            end=t(end))
+import storage
 
 
 def t(s):
@@ -25,41 +16,43 @@ def t(s):
     return datetime.datetime(year=2000, month=1, day=1, hour=int(h), minute=int(m))
 
 
-class SplitIntoChunksTest(unittest.TestCase):
-
-    def test_doesnt_split_between_split_points(self):
-        self.assertEqual(
-                list(reports._split_into_chunks(
-                    spans=[make_span(start='10:10', end='10:20')],
-                    split_point=duration('30m'))),
-                [(t('10:00'), make_span(start='10:10', end='10:20'))])
-
-    def test_splits_in_two_at_split_point(self):
-        self.assertEqual(
-                list(reports._split_into_chunks(
-                    spans=[make_span(start='10:40', end='11:10')],
-                    split_point=duration('30m'))),
-                [(t('10:30'), make_span(start='10:40', end='11:00')),
-                 (t('11:00'), make_span(start='11:00', end='11:10'))])
-
-    def test_splits_in_three(self):
-        self.assertEqual(
-                list(reports._split_into_chunks(
-                    spans=[make_span(start='10:20', end='11:10')],
-                    split_point=duration('30m'))),
-                [(t('10:00'), make_span(start='10:20', end='10:30')),
-                 (t('10:30'), make_span(start='10:30', end='11:00')),
-                 (t('11:00'), make_span(start='11:00', end='11:10'))])
-
-    def test_splits_multiple_spans(self):
-        self.assertEqual(
-                list(reports._split_into_chunks(
-                    spans=[make_span(start='10:10', end='10:15'),
-                           make_span(start='10:20', end='10:40')],
-                    split_point=duration('30m'))),
-                [(t('10:00'), make_span(start='10:10', end='10:15')),
-                 (t('10:00'), make_span(start='10:20', end='10:30')),
-                 (t('10:30'), make_span(start='10:30', end='10:40'))])
+class GetSpansTest(unittest.TestCase):
+
+    def test_merges_databases(self):
+        desktop = storage.TmuxSession(session_name='trackd', hostname='desktop', server_pid=1)
+        laptop = storage.TmuxSession(session_name='dotfiles', hostname='laptop', server_pid=1)
+        first = storage.Span(session=desktop, start=t('10:00'), end=t('10:30'))
+        second = storage.Span(session=laptop, start=t('10:30'), end=t('11:00'))
+        third = storage.Span(session=desktop, start=t('11:00'), end=t('11:30'))
+        with tempfile.TemporaryDirectory() as temp_dir:
+            machines = pathlib.Path(temp_dir) / 'machines'
+            machines.mkdir()
+            # The laptop's database has a copy of the desktop's first span.
+            storage.SpanStorage(str(machines / 'laptop.db')).add_many([first, second])
+            desktop_db = str(pathlib.Path(temp_dir) / 'desktop.db')
+            storage.SpanStorage(desktop_db).add_many([first, third])
+            opts = reports.Options(
+                    hostnames_work=('desktop',), hostnames_non_work=('laptop',),
+                    chrome_user_work='work', chrome_user_non_work='home',
+                    min_length=0, db_paths=(desktop_db, str(machines)))
+
+            spans = [f'{span.start:%H:%M}-{span.end:%H:%M} {span.name}'
+                     for span in reports.get_spans(opts)]
+
+        self.assertEqual(spans, ['10:00-10:30 trackd', '10:30-11:00 dotfiles',
+                                 '11:00-11:30 trackd'])
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_doesnt_import_daemon_dependencies(self):
+        code = ('import sys, reports; '
+                'print(" ".join(m for m in ("grpc", "cherrypy", "Xlib", "tzlocal", "trackd") '
+                'if m in sys.modules))')
+        proc = subprocess.run([sys.executable, '-c', code],
+                              capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(proc.stdout.strip(), '')
 
 
 def load_tests(loader, tests, ignore):
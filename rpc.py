@@ -0,0 +1,58 @@
+"""trackd's gRPC server, shared by the sources that serve over gRPC."""
+from concurrent import futures
+
+from typing import Optional
+
+import grpc
+
+import metrics
+
+
+GRPC_REQUEST_DURATION = metrics.Histogram(
+        'trackd_grpc_request_duration_seconds', 'gRPC request latency.', ['method'])
+
+
+DEFAULT_MAX_WORKERS = 10
+# gRPC's default is 1000, which a burst of hooks from a few hosts can exceed
+# (see tmux_load_bench.py).
+DEFAULT_MAX_PENDING_RPCS = 10000
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """Records latency of unary gRPC requests."""
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None or handler.unary_unary is None:
+            return handler
+        method = handler_call_details.method.rsplit('/', 1)[-1]
+        behavior = handler.unary_unary
+
+        def timed_behavior(request, context):
+            with GRPC_REQUEST_DURATION.time(method):
+                return behavior(request, context)
+
+        return handler._replace(unary_unary=timed_behavior)
+
+
+def make_server(max_workers: int = DEFAULT_MAX_WORKERS,
+                max_concurrent_rpcs: Optional[int] = None,
+                max_pending_rpcs: int = DEFAULT_MAX_PENDING_RPCS) -> grpc.Server:
+    """Returns a server handling RPCs on `max_workers` threads.
+
+    RPCs that arrived, but that the server hasn't picked up yet, wait in
+    gRPC's queue, up to `max_pending_rpcs`; past that, they're cancelled.
+    RPCs past `max_concurrent_rpcs` being handled or waiting for a thread are
+    rejected with RESOURCE_EXHAUSTED; by default, they wait.  A hook's event
+    is lost if its RPC fails, so waiting is better, as long as the wait is
+    short.  Every relay stream (see relay.py) takes up a thread for as long
+    as it's connected, so `max_workers` needs to be well above the number of
+    relaying hosts.
+    """
+    return grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),
+                       interceptors=[MetricsInterceptor()],
+                       maximum_concurrent_rpcs=max_concurrent_rpcs,
+                       options=[
+                           ('grpc.server.max_pending_requests', max_pending_rpcs),
+                           ('grpc.server.max_pending_requests_hard_limit', max_pending_rpcs),
+                       ])
@@ -0,0 +1,199 @@
+"""Event sources, loaded as plugins.
+
+A source is anything feeding trackd: X focus changes, Chrome, tmux, or
+something else entirely (an editor, a shell).  Sources are registered by name
+with a "module:attribute" reference to a `Source` subclass, so a source's
+module, with its dependencies, is only imported if the source is enabled.
+
+Built-in sources are in `BUILTIN_SOURCES`.  More can be registered by
+packages with the "trackd.sources" entry point group, or in the config file:
+
+    [sources]
+    enabled = x11, tmux, editor
+
+    [source editor]
+    factory = my_editor_plugin:EditorSource
+    port = 3144
+
+Keys in a "[source <name>]" section, other than `factory`, are passed to the
+source's constructor.  Sources talk to each other through an `EventBus`, e.g.
+the x11 source publishes `events.FocusChanged`, and adapters subscribe to it.
+"""
+import configparser
+import importlib
+import importlib.metadata
+import logging
+import os
+import pathlib
+import threading
+
+from typing import Any, Callable, Dict, List, Mapping, MutableSequence, Optional, Type
+
+
+logger = logging.getLogger(__name__)
+
+
+BUILTIN_SOURCES = {
+    'x11': 'x11:X11Source',
+    'chrome': 'chrome:ChromeSource',
+    'tmux': 'tmux:TmuxSource',
+}
+ENTRY_POINT_GROUP = 'trackd.sources'
+DEFAULT_CONFIG = pathlib.Path(
+        os.environ.get('XDG_CONFIG_HOME', pathlib.Path.home() / '.config')) / 'trackd' / 'trackd.conf'
+
+
+class EventBus:
+    """Passes events to subscribers of their type.
+
+    Subscribers are called on the publishing thread, so they should be quick,
+    e.g. send a message to an actor.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[Type, List[Callable[[Any], None]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, event_type: Type, callback: Callable[[Any], None]) -> None:
+        with self._lock:
+            # Copy on write, so `publish()` doesn't need the lock.
+            subscribers = self._subscribers.get(event_type, [])
+            self._subscribers[event_type] = subscribers + [callback]
+
+    def publish(self, event) -> None:
+        for callback in self._subscribers.get(type(event), ()):
+            try:
+                callback(event)
+            except Exception:
+                logger.exception('%r failed to handle %r', callback, event)
+
+
+class SourceContext:
+    """What trackd provides to sources."""
+
+    def __init__(self, bus: EventBus, span_tracker: Callable[[], Any],
+                 grpc_server: Callable[[], Any],
+                 recorder: Optional[Callable[[str, Any], None]] = None):
+        self.bus = bus
+        self._span_tracker = span_tracker
+        self._grpc_server = grpc_server
+        self._recorder = recorder
+        self.actors: MutableSequence = []
+
+    def span_tracker(self):
+        """Returns a new `trackd.SpanTracker`.
+
+        Every source needs its own: sources get notified of a focus change in
+        no particular order, and one source's span ending must not cut
+        another's span short.
+        """
+        return self._span_tracker()
+
+    def grpc_server(self):
+        """Returns trackd's gRPC server, to add servicers to.
+
+        The server is only created (and started) if a source asks for it.
+        """
+        return self._grpc_server()
+
+    def add_actor(self, actor_) -> None:
+        """Makes an actor's inbox size show up in metrics, and its messages logged.
+
+        Call it before sending the actor anything.
+        """
+        self.actors.append(actor_)
+        if self._recorder is not None:
+            actor_.record_to(self._recorder)
+
+    def start_thread(self, target: Callable[[], None], name: str, **kwargs) -> threading.Thread:
+        thread = threading.Thread(target=target, name=name, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+
+class Source:
+    """Base class for sources.
+
+    The constructor gets the options from the source's config section, as
+    strings.  `start()` sets the source up and starts its threads.
+    """
+
+    def start(self, context: SourceContext) -> None:
+        raise NotImplementedError
+
+
+class Config:
+
+    def __init__(self, enabled: Optional[List[str]] = None,
+                 factories: Optional[Mapping[str, str]] = None,
+                 options: Optional[Mapping[str, Mapping[str, str]]] = None):
+        # `None` means the default sources.
+        self.enabled = enabled
+        self.factories = dict(factories or {})
+        self.options = dict(options or {})
+
+    @classmethod
+    def load(cls, path: pathlib.Path = DEFAULT_CONFIG) -> 'Config':
+        """Reads the config file; a missing file means the defaults."""
+        parser = configparser.ConfigParser()
+        parser.read(path)
+        enabled = None
+        if parser.has_option('sources', 'enabled'):
+            enabled = [name.strip() for name in parser.get('sources', 'enabled').split(',')
+                       if name.strip()]
+        factories = {}
+        options = {}
+        for section in parser.sections():
+            kind, _, name = section.partition(' ')
+            if kind != 'source' or not name:
+                continue
+            section_options = dict(parser.items(section))
+            if 'factory' in section_options:
+                factories[name] = section_options.pop('factory')
+            options[name] = section_options
+        return cls(enabled=enabled, factories=factories, options=options)
+
+
+def default_sources() -> List[str]:
+    """All the built-in sources, except x11 if there's no X display."""
+    return [name for name in BUILTIN_SOURCES if name != 'x11' or os.environ.get('DISPLAY')]
+
+
+def registry(config: Config) -> Dict[str, str]:
+    """Returns "module:attribute" references of all the known sources, by name."""
+    factories = dict(BUILTIN_SOURCES)
+    for entry_point in importlib.metadata.entry_points(group=ENTRY_POINT_GROUP):
+        factories[entry_point.name] = entry_point.value
+    factories.update(config.factories)
+    return factories
+
+
+def load(reference: str) -> Type[Source]:
+    """Imports the "module:attribute" `reference`."""
+    module_name, _, attribute = reference.partition(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def start(config: Config, context: SourceContext) -> List[Source]:
+    """Starts the enabled sources.
+
+    A source failing to start is logged, and doesn't stop the others.
+    """
+    factories = registry(config)
+    enabled = config.enabled if config.enabled is not None else default_sources()
+    started = []
+    for name in enabled:
+        try:
+            reference = factories[name]
+        except KeyError:
+            logger.error('Unknown source %r, known ones are: %s', name, ', '.join(factories))
+            continue
+        try:
+            source = load(reference)(**config.options.get(name, {}))
+            source.start(context)
+        except Exception:
+            logger.exception('Failed to start source %r', name)
+            continue
+        logger.info('Started source %r', name)
+        started.append(source)
+    return started
@@ -0,0 +1,120 @@
+import pathlib
+import sys
+import tempfile
+import unittest
+
+import sources
+
+
+class FakeSource(sources.Source):
+
+    def __init__(self, **options):
+        self.options = options
+
+    def start(self, context):
+        context.bus.publish(('started', self.options.get('name')))
+
+
+class FailingSource(sources.Source):
+
+    def start(self, context):
+        raise RuntimeError('No display')
+
+
+class EventBusTest(unittest.TestCase):
+
+    def test_passes_events_to_subscribers_of_their_type(self):
+        bus = sources.EventBus()
+        ints, strs = [], []
+        bus.subscribe(int, ints.append)
+        bus.subscribe(str, strs.append)
+        bus.subscribe(str, lambda event: strs.append(event.upper()))
+
+        bus.publish(1)
+        bus.publish('a')
+        bus.publish(2.0)
+
+        self.assertEqual(ints, [1])
+        self.assertEqual(strs, ['a', 'A'])
+
+    def test_failing_subscriber_doesnt_affect_others(self):
+        bus = sources.EventBus()
+        events = []
+        bus.subscribe(int, lambda event: 1 / 0)
+        bus.subscribe(int, events.append)
+
+        with self.assertLogs('sources', 'ERROR'):
+            bus.publish(1)
+
+        self.assertEqual(events, [1])
+
+
+class ConfigTest(unittest.TestCase):
+
+    def test_load(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = pathlib.Path(tmpdir) / 'trackd.conf'
+            path.write_text(
+                '[sources]\n'
+                'enabled = tmux, editor\n'
+                '\n'
+                '[source editor]\n'
+                'factory = editor_plugin:EditorSource\n'
+                'port = 3144\n'
+                '\n'
+                '[source chrome]\n'
+                'port = 3145\n')
+
+            config = sources.Config.load(path)
+
+        self.assertEqual(config.enabled, ['tmux', 'editor'])
+        self.assertEqual(config.factories, {'editor': 'editor_plugin:EditorSource'})
+        self.assertEqual(config.options, {'editor': {'port': '3144'}, 'chrome': {'port': '3145'}})
+
+    def test_missing_file_means_defaults(self):
+        config = sources.Config.load(pathlib.Path('/nonexistent/trackd.conf'))
+        self.assertIsNone(config.enabled)
+
+
+class StartTest(unittest.TestCase):
+
+    def setUp(self):
+        self.bus = sources.EventBus()
+        self.published = []
+        self.bus.subscribe(tuple, self.published.append)
+        self.context = sources.SourceContext(
+                bus=self.bus, span_tracker=lambda: None, grpc_server=lambda: None)
+
+    def test_starts_enabled_sources_only(self):
+        config = sources.Config(
+                enabled=['fake'],
+                factories={
+                    'fake': 'sources_test:FakeSource',
+                    # Never imported, as it's not enabled.
+                    'disabled': 'no_such_module:Source',
+                },
+                options={'fake': {'name': 'fake source'}})
+
+        started = sources.start(config, self.context)
+
+        self.assertEqual([type(source).__name__ for source in started], ['FakeSource'])
+        self.assertEqual(self.published, [('started', 'fake source')])
+        self.assertNotIn('no_such_module', sys.modules)
+
+    def test_failing_and_unknown_sources_dont_stop_others(self):
+        config = sources.Config(
+                enabled=['failing', 'unknown', 'fake'],
+                factories={
+                    'failing': 'sources_test:FailingSource',
+                    'fake': 'sources_test:FakeSource',
+                })
+
+        with self.assertLogs('sources', 'ERROR') as logs:
+            started = sources.start(config, self.context)
+
+        self.assertEqual(len(started), 1)
+        self.assertEqual(len(logs.records), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,335 @@
+"""Spans and their storage.
+
+Only imports stdlib modules (and trackd's own stdlib-only `clock`, `metrics`
+and `tracing`), so reading spans, e.g. for reports, doesn't pull in gRPC, CherryPy
+or Xlib.  `trackd`, `chrome` and `tmux` re-export what's defined here.
+"""
+from dataclasses import dataclass
+import datetime
+import heapq
+import operator
+import pathlib
+import sqlite3
+import threading
+
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+import clock
+import metrics
+from tracing import TRACE, Stage
+
+
+SPAN_STORAGE_ADD_DURATION = metrics.Histogram(
+        'trackd_span_storage_add_duration_seconds',
+        'Time to insert and commit a span, including waiting for the lock.')
+SPAN_STORAGE_LOCK_WAIT = metrics.Histogram(
+        'trackd_span_storage_lock_wait_seconds', 'Time waiting for the SpanStorage lock.')
+
+
+@dataclass(frozen=True)
+class ChromeSession:
+    """Chrome sessions are represented by the chrome user + session name."""
+    session_name: str
+    user: str
+
+
+@dataclass(frozen=True)
+class TmuxSession:
+    """Tmux sessions are represented by tmux server PID + session name."""
+    session_name: str
+    hostname: str
+    server_pid: int
+
+
+@dataclass(frozen=True)
+class Span:
+    session: object
+    start: datetime.datetime
+    end: datetime.datetime
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(session={self.session!r}, start={self.start}, end={self.end})'
+
+
+class SpanStorage:
+
+    def __init__(self, db_path: str, clock: clock.Clock = clock.SYSTEM, read_only: bool = False):
+        """`clock` gives the zone `query()` returns times in.
+
+        Opening a database for writing creates or migrates its tables and
+        indexes.  With `read_only`, e.g. for reports, the database is left as
+        it is, and lookups do without indexes it doesn't have yet.
+        """
+        self._clock = clock
+        self._connect(db_path, read_only)
+        self._lock = threading.Lock()
+
+    def _connect(self, db_path: str, read_only: bool) -> None:
+        if read_only:
+            self._conn = sqlite3.connect(
+                    pathlib.Path(db_path).absolute().as_uri() + '?mode=ro', uri=True,
+                    detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
+            self._has_interval_index = self._conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'spans_index'").fetchone() is not None
+            return
+        self._conn = sqlite3.connect(
+                db_path, detect_types=sqlite3.PARSE_DECLTYPES,  check_same_thread=False)
+        # The database may have been created by `event_log.EventLog`.
+        self._init_db()
+        self._has_interval_index = True
+
+    def _init_db(self) -> None:
+        c = self._conn.cursor()
+        # `timeline` is `spans` with overlaps resolved, see timeline.py.
+        for table in TABLES:
+            c.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                session_type text,
+                session_name text,
+                hostname text,
+                server_pid int,
+                user text,
+                start timestamp,
+                end timestamp
+            )
+            """)
+            c.execute(f'CREATE INDEX IF NOT EXISTS {table}_start ON {table} (start)')
+        self._init_interval_index(c)
+        # How far spans of other trackds have been replicated into this one,
+        # by origin, as the origin's rowids, see replication.py.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS replication (
+                origin text PRIMARY KEY,
+                last_id integer
+            )
+        """)
+        self._conn.commit()
+
+    def _init_interval_index(self, c: sqlite3.Cursor) -> None:
+        """Creates an R*Tree over spans' start and end, kept up to date by triggers.
+
+        Coordinates are whole seconds since `_INDEX_EPOCH`, rounded outwards,
+        so the index finds a superset of the spans, which the actual start and
+        end then filter.
+        """
+        exists = c.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'spans_index'").fetchone()
+        if exists:
+            return
+        seconds = "CAST(strftime('%s', {}) AS INTEGER) - {}"
+        start = seconds.format('{0}.start', _INDEX_EPOCH)
+        end = seconds.format('{0}.end', _INDEX_EPOCH - 1)
+        c.execute('CREATE VIRTUAL TABLE spans_index USING rtree_i32(id, start, end)')
+        c.execute(f"""
+            CREATE TRIGGER spans_index_insert AFTER INSERT ON spans BEGIN
+                INSERT INTO spans_index VALUES (
+                    NEW.rowid, {start.format('NEW')}, {end.format('NEW')});
+            END
+        """)
+        c.execute("""
+            CREATE TRIGGER spans_index_delete AFTER DELETE ON spans BEGIN
+                DELETE FROM spans_index WHERE id = OLD.rowid;
+            END
+        """)
+        # Spans saved before the index existed.
+        c.execute(f"""
+            INSERT INTO spans_index
+            SELECT rowid, {start.format('spans')}, {end.format('spans')} FROM spans
+        """)
+
+    def add(self, span: Span) -> None:
+        trace_id = TRACE.current()
+        TRACE.record(trace_id, Stage.STORAGE_ADD)
+        with SPAN_STORAGE_ADD_DURATION.time():
+            with SPAN_STORAGE_LOCK_WAIT.time():
+                self._lock.acquire()
+            try:
+                self._add(span)
+            finally:
+                self._lock.release()
+        TRACE.record(trace_id, Stage.STORAGE_COMMITTED)
+
+    def add_many(self, spans: Iterable[Span]) -> None:
+        """Inserts spans in a single transaction, e.g. to import or generate them."""
+        with self._lock:
+            self._conn.executemany(_INSERT.format(table='spans'), map(_to_row, spans))
+            self._conn.commit()
+
+    def replace_timeline(self, spans: Iterable[Span]) -> None:
+        """Replaces the `timeline` table's spans, in a single transaction."""
+        with self._lock:
+            self._conn.execute('DELETE FROM timeline')
+            self._conn.executemany(_INSERT.format(table='timeline'), map(_to_row, spans))
+            self._conn.commit()
+
+    def after(self, rowid: int, limit: int) -> List[Tuple[int, Span]]:
+        """Returns up to `limit` spans added after the one with `rowid`, with their rowids."""
+        with self._lock:
+            rows = self._conn.execute(
+                    "SELECT rowid, session_type, session_name, hostname, server_pid, user, "
+                    "start, end FROM spans WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (rowid, limit)).fetchall()
+        return [(row[0], self._to_span(row[1:])) for row in rows]
+
+    def replicated_id(self, origin: str) -> int:
+        """Returns the last of `origin`'s rowids added with `add_replicated()`, or 0."""
+        with self._lock:
+            row = self._conn.execute(
+                    'SELECT last_id FROM replication WHERE origin = ?', (origin,)).fetchone()
+        return row[0] if row else 0
+
+    def add_replicated(self, origin: str, spans: Sequence[Tuple[int, Span]]) -> int:
+        """Adds spans of another trackd, `origin`, with their rowids there.
+
+        Spans up to `replicated_id(origin)` are skipped, so a batch can be
+        resent.  The spans and the new last rowid are saved in one
+        transaction.  Returns the new last rowid.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                    'SELECT last_id FROM replication WHERE origin = ?', (origin,)).fetchone()
+            last_id = row[0] if row else 0
+            new = [(rowid, span) for rowid, span in spans if rowid > last_id]
+            if not new:
+                return last_id
+            self._conn.executemany(_INSERT.format(table='spans'),
+                                   (_to_row(span) for _, span in new))
+            last_id = max(rowid for rowid, _ in new)
+            self._conn.execute(
+                    'INSERT INTO replication (origin, last_id) VALUES (?, ?) '
+                    'ON CONFLICT (origin) DO UPDATE SET last_id = excluded.last_id',
+                    (origin, last_id))
+            self._conn.commit()
+            return last_id
+
+    def _add(self, span: Span) -> None:
+        c = self._conn.cursor()
+        c.execute(_INSERT.format(table='spans'), _to_row(span))
+        self._conn.commit()
+
+    def query(self, table: str = 'spans') -> Iterable[Span]:
+        """Returns spans in the order of their start."""
+        if table not in TABLES:
+            raise ValueError(f'Unknown table {table!r}')
+        c = self._conn.cursor()
+        for row in c.execute(
+                "SELECT session_type, session_name, hostname, server_pid, user, start, end "
+                f"FROM {table} ORDER BY start, rowid"):
+            yield self._to_span(row)
+
+    def at(self, timestamp: datetime.datetime) -> List[Span]:
+        """Returns spans going on at `timestamp`, in the order of their start."""
+        return self._overlapping(timestamp, timestamp, inclusive_start=True)
+
+    def overlapping(self, start: datetime.datetime, end: datetime.datetime) -> List[Span]:
+        """Returns spans overlapping [start, end), in the order of their start."""
+        return self._overlapping(start, end, inclusive_start=False)
+
+    def _overlapping(self, start: datetime.datetime, end: datetime.datetime,
+                     inclusive_start: bool) -> List[Span]:
+        start, end = _to_naive_utc(start), _to_naive_utc(end)
+        c = self._conn.cursor()
+        if not self._has_interval_index:
+            # A database opened read-only, before it was first opened for
+            # writing by a trackd with the index.
+            rows = c.execute(f"""
+                SELECT session_type, session_name, hostname, server_pid, user, start, end
+                FROM spans
+                WHERE start {'<=' if inclusive_start else '<'} ? AND end > ?
+                ORDER BY start, rowid
+            """, (end, start))
+            return [self._to_span(row) for row in rows]
+        rows = c.execute(f"""
+            SELECT session_type, session_name, hostname, server_pid, user, spans.start, spans.end
+            FROM spans_index JOIN spans ON spans.rowid = spans_index.id
+            WHERE spans_index.start <= ? AND spans_index.end >= ?
+                AND spans.start {'<=' if inclusive_start else '<'} ? AND spans.end > ?
+            ORDER BY spans.start, spans.rowid
+        """, (_index_seconds(end), _index_seconds(start), end, start))
+        return [self._to_span(row) for row in rows]
+
+    def _to_span(self, row: tuple) -> Span:
+        session_type, session_name, hostname, server_pid, user, start, end = row
+
+        if session_type == 'ChromeSession':
+            session = ChromeSession(session_name=session_name, user=user)
+        elif session_type == 'TmuxSession':
+            session = TmuxSession(
+                    session_name=session_name,
+                    hostname=hostname, server_pid=server_pid)
+        else:
+            raise RuntimeError(f'Invalid session_type: {session_type!r}')
+
+        # TODO: Do these data manipulations in converters and adapters.
+        zone = self._clock.zone()
+        start = start.replace(tzinfo=datetime.timezone.utc).astimezone(zone)
+        end = end.replace(tzinfo=datetime.timezone.utc).astimezone(zone)
+
+        return Span(session=session, start=start, end=end)
+
+
+def merge_queries(span_storages: Sequence[SpanStorage], table: str = 'spans') -> Iterator[Span]:
+    """Merges spans of several storages, in the order of their start.
+
+    E.g. databases of trackd on different machines, which may have rows in
+    common, if one was copied from another.  Same spans are yielded once.
+    Holds a span per storage, and the spans starting at the same time, so
+    memory doesn't grow with the number of spans.
+    """
+    queries = [span_storage.query(table) for span_storage in span_storages]
+    current_start = None
+    seen = set()
+    for span in heapq.merge(*queries, key=operator.attrgetter('start')):
+        if span.start != current_start:
+            current_start = span.start
+            seen.clear()
+        elif span in seen:
+            continue
+        seen.add(span)
+        yield span
+
+
+TABLES = ('spans', 'timeline')
+
+# The interval index stores 32-bit seconds since then, which lasts until 2068.
+_INDEX_EPOCH = 946684800  # 2000-01-01 UTC.
+
+_INSERT = """
+    INSERT INTO {table} (
+        session_type,
+        session_name,
+        hostname,
+        server_pid,
+        user,
+        start,
+        end
+    ) VALUES (
+        ?,
+        ?,
+        ?,
+        ?,
+        ?,
+        ?,
+        ?
+    )
+"""
+
+
+def _to_row(span: Span) -> tuple:
+    return (span.session.__class__.__name__,
+            span.session.session_name,
+            getattr(span.session, 'hostname', None),
+            getattr(span.session, 'server_pid', None),
+            getattr(span.session, 'user', None),
+            _to_naive_utc(span.start),
+            _to_naive_utc(span.end))
+
+
+def _index_seconds(naive_utc: datetime.datetime) -> int:
+    return int(naive_utc.replace(tzinfo=datetime.timezone.utc).timestamp()) - _INDEX_EPOCH
+
+
+def _to_naive_utc(timestamp: datetime.datetime) -> datetime.datetime:
+    # sqlite3's timestamp converter can't parse a UTC offset, unless there
+    # are microseconds in front of it.
+    return timestamp.astimezone(datetime.timezone.utc).replace(tzinfo=None)
@@ -1,5 +1,5 @@
 from collections import namedtuple
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 import re
 
 from typing import Tuple, Union
@@ -139,6 +139,58 @@ def hours(interval: Union[timedelta, int], unicode_=True) -> str:
     return ret
 
 
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def parse_time(s: str, now: datetime) -> datetime:
+    """Parses a point in time, in `now`'s time zone.
+
+    Weekdays mean the last one before today.
+
+    >>> now = datetime(2021, 3, 18, 12, 0)  # A Thursday.
+    >>> parse_time('14:35', now)
+    datetime.datetime(2021, 3, 18, 14, 35)
+    >>> parse_time('yesterday 9:05:30', now)
+    datetime.datetime(2021, 3, 17, 9, 5, 30)
+    >>> parse_time('last Tuesday 14:35', now)
+    datetime.datetime(2021, 3, 16, 14, 35)
+    >>> parse_time('thu 14:35', now)
+    datetime.datetime(2021, 3, 11, 14, 35)
+    >>> parse_time('2021-01-04 8:00', now)
+    datetime.datetime(2021, 1, 4, 8, 0)
+    >>> parse_time('someday 8:00', now)
+    Traceback (most recent call last):
+    ...
+    ValueError: Invalid day: 'someday'
+    """
+    words = s.lower().split()
+    if words[:1] == ['last']:
+        words = words[1:]
+    if not words:
+        raise ValueError(f'Invalid time: {s!r}')
+    *day_words, time_word = words
+    m = re.fullmatch(r'(\d{1,2}):(\d{2})(?::(\d{2}))?', time_word)
+    if m is None:
+        raise ValueError(f'Invalid time of day: {time_word!r}')
+    time_of_day = time(int(m[1]), int(m[2]), int(m[3] or 0))
+
+    day = now.date()
+    day_word = ' '.join(day_words)
+    weekdays = [i for i, name in enumerate(WEEKDAYS)
+                if len(day_word) >= 3 and name.startswith(day_word)]
+    if not day_word or day_word == 'today':
+        pass
+    elif day_word == 'yesterday':
+        day -= timedelta(days=1)
+    elif weekdays:
+        day -= timedelta(days=(day.weekday() - weekdays[0]) % 7 or 7)
+    else:
+        try:
+            day = date.fromisoformat(day_word)
+        except ValueError:
+            raise ValueError(f'Invalid day: {day_word!r}') from None
+    return datetime.combine(day, time_of_day, tzinfo=now.tzinfo)
+
 
 TimeParts = namedtuple('TimeParts', 'days hours minutes seconds')
 
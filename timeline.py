@@ -0,0 +1,128 @@
+"""Resolves overlapping spans into a timeline.
+
+Every source has its own `SpanTracker`, so spans of different sources can
+overlap, e.g. a tmux span that ends a little after the Chrome span following
+it has started.  `resolve()` sweeps over spans sorted by start, and at every
+moment keeps the span a policy prefers, cutting the others around it.  The
+result is sorted, doesn't overlap, and is the same for the same spans, so
+reports can rely on that.
+
+Only stdlib imports, as reports use it.  Spans are any frozen dataclasses with
+`start` and `end`, e.g. `storage.Span` or `reports.ReportSpan`.
+"""
+import dataclasses
+import heapq
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+
+SpanT = TypeVar('SpanT')
+
+# Returns a span's priority: where spans overlap, the one with the highest
+# priority wins.
+Policy = Callable[[SpanT], float]
+
+
+def latest_start(span) -> float:
+    """Prefers the span started last: focus has moved on to it."""
+    return span.start.timestamp()
+
+
+def by_session_type(*session_types: str) -> Policy:
+    """Prefers spans by their session's type, in the given order.
+
+    Other session types come last.  Between spans of the same type, the one
+    started last wins.
+    """
+    ranks = {session_type: len(session_types) - i for i, session_type in enumerate(session_types)}
+    return lambda span: ranks.get(span.session.__class__.__name__, 0)
+
+
+POLICIES: Dict[str, Policy] = {
+    'latest': latest_start,
+    'tmux-first': by_session_type('TmuxSession', 'ChromeSession'),
+    'chrome-first': by_session_type('ChromeSession', 'TmuxSession'),
+}
+
+
+def resolve(spans: Iterable[SpanT], policy: Policy = latest_start) -> Iterator[SpanT]:
+    """Yields the parts of `spans` that win under `policy`.
+
+    `spans` must be sorted by start.  Takes O(n log k) time and O(k) memory,
+    where k is the largest number of spans overlapping at once.  Spans are
+    passed through as they are, unless they need to be cut.
+
+    >>> from storage import Span, ChromeSession, TmuxSession
+    >>> from datetime import datetime
+    >>> def t(hh_mm): return datetime.fromisoformat(f'2021-03-16 {hh_mm}')
+    >>> tmux = TmuxSession(session_name='trackd', hostname='desktop', server_pid=1)
+    >>> chrome = ChromeSession(session_name='mail', user='work')
+    >>> spans = [Span(tmux, t('10:00'), t('10:30')), Span(chrome, t('10:10'), t('10:20'))]
+    >>> for span in resolve(spans):
+    ...     print(f'{span.session.session_name} {span.start:%H:%M}-{span.end:%H:%M}')
+    trackd 10:00-10:10
+    mail 10:10-10:20
+    trackd 10:20-10:30
+    >>> for span in resolve(spans, POLICIES['tmux-first']):
+    ...     print(f'{span.session.session_name} {span.start:%H:%M}-{span.end:%H:%M}')
+    trackd 10:00-10:30
+    """
+    # Spans which may be active, by priority, then by the order they
+    # started in.  Spans that ended are only removed once they get on top, or
+    # when the heap is compacted.
+    heap: List[Tuple[float, int, SpanT]] = []
+    compact_at = 16
+    cursor = None
+    # The last part, which the next one may continue.
+    pending: Optional[Tuple[int, SpanT, object, object]] = None
+
+    def sweep(until) -> Iterator[SpanT]:
+        """Yields parts up to `until`, or to the end if it's `None`."""
+        nonlocal cursor, pending
+        while heap:
+            _, seq, top = heap[0]
+            if top.end <= cursor:
+                heapq.heappop(heap)
+                continue
+            end = top.end if until is None or top.end < until else until
+            if end <= cursor:
+                break
+            if pending is not None and pending[0] == seq and pending[3] == cursor:
+                pending = (seq, top, pending[2], end)
+            else:
+                if pending is not None:
+                    yield _cut(*pending[1:])
+                pending = (seq, top, cursor, end)
+            cursor = end
+        if until is not None and until > cursor:
+            cursor = until
+
+    for seq, span in enumerate(spans):
+        if cursor is None:
+            cursor = span.start
+        elif span.start < previous_start:
+            raise ValueError(f'Spans are not sorted by start: {span!r} is after one '
+                             f'starting at {previous_start}')
+        previous_start = span.start
+        yield from sweep(span.start)
+        # Later spans win ties.
+        heapq.heappush(heap, (-policy(span), -seq, span))
+        if len(heap) > compact_at:
+            heap = [entry for entry in heap if entry[2].end > cursor]
+            heapq.heapify(heap)
+            compact_at = max(16, 2 * len(heap))
+    if cursor is not None:
+        yield from sweep(None)
+    if pending is not None:
+        yield _cut(*pending[1:])
+
+
+def _cut(span: SpanT, start, end) -> SpanT:
+    if span.start == start and span.end == end:
+        return span
+    return dataclasses.replace(span, start=start, end=end)
+
+
+def materialize(span_storage, policy: Policy = latest_start) -> None:
+    """Replaces `span_storage`'s timeline table with its spans resolved."""
+    span_storage.replace_timeline(resolve(span_storage.query(), policy))
@@ -0,0 +1,124 @@
+import datetime
+import doctest
+import pathlib
+import tempfile
+import unittest
+
+from click.testing import CliRunner
+
+import storage
+import timeline
+import trackctl
+
+
+TMUX = storage.TmuxSession(session_name='trackd', hostname='desktop', server_pid=1)
+OTHER_TMUX = storage.TmuxSession(session_name='dotfiles', hostname='desktop', server_pid=1)
+CHROME = storage.ChromeSession(session_name='mail', user='work')
+
+
+def t(hh_mm: str) -> datetime.datetime:
+    return datetime.datetime.fromisoformat(f'2021-03-16 {hh_mm}')
+
+
+def span(session, start: str, end: str) -> storage.Span:
+    return storage.Span(session=session, start=t(start), end=t(end))
+
+
+class ResolveTest(unittest.TestCase):
+
+    def test_passes_non_overlapping_spans_through(self):
+        spans = [span(TMUX, '10:00', '10:10'), span(CHROME, '10:10', '10:20'),
+                 span(TMUX, '10:30', '10:40')]
+
+        self.assertEqual(list(timeline.resolve(spans)), spans)
+
+    def test_latest_start_cuts_the_earlier_span(self):
+        spans = [span(TMUX, '10:00', '10:15'), span(CHROME, '10:10', '10:20')]
+
+        self.assertEqual(list(timeline.resolve(spans)),
+                         [span(TMUX, '10:00', '10:10'), span(CHROME, '10:10', '10:20')])
+
+    def test_resumes_a_span_after_a_nested_one(self):
+        spans = [span(TMUX, '10:00', '11:00'), span(CHROME, '10:10', '10:20'),
+                 span(OTHER_TMUX, '10:30', '10:40')]
+
+        self.assertEqual(list(timeline.resolve(spans)),
+                         [span(TMUX, '10:00', '10:10'), span(CHROME, '10:10', '10:20'),
+                          span(TMUX, '10:20', '10:30'), span(OTHER_TMUX, '10:30', '10:40'),
+                          span(TMUX, '10:40', '11:00')])
+
+    def test_doesnt_split_a_winning_span(self):
+        spans = [span(TMUX, '10:00', '11:00'), span(CHROME, '10:10', '10:20'),
+                 span(CHROME, '10:30', '10:40')]
+
+        self.assertEqual(list(timeline.resolve(spans, timeline.POLICIES['tmux-first'])),
+                         [span(TMUX, '10:00', '11:00')])
+
+    def test_priority_by_session_type(self):
+        spans = [span(CHROME, '10:00', '10:30'), span(TMUX, '10:10', '10:20')]
+
+        self.assertEqual(list(timeline.resolve(spans, timeline.POLICIES['chrome-first'])),
+                         [span(CHROME, '10:00', '10:30')])
+        self.assertEqual(list(timeline.resolve(spans, timeline.POLICIES['tmux-first'])),
+                         [span(CHROME, '10:00', '10:10'), span(TMUX, '10:10', '10:20'),
+                          span(CHROME, '10:20', '10:30')])
+
+    def test_many_overlapping_spans(self):
+        # Lots of short spans under a long one, which always wins: ended
+        # spans pile up in the heap until it's compacted.
+        spans = [span(TMUX, '09:00', '12:00')] + [
+            storage.Span(session=CHROME, start=t('10:00') + datetime.timedelta(seconds=i),
+                         end=t('10:00') + datetime.timedelta(seconds=i + 1))
+            for i in range(1000)]
+
+        self.assertEqual(list(timeline.resolve(spans, timeline.POLICIES['tmux-first'])),
+                         [span(TMUX, '09:00', '12:00')])
+
+    def test_rejects_unsorted_spans(self):
+        spans = [span(TMUX, '10:10', '10:20'), span(CHROME, '10:00', '10:05')]
+
+        with self.assertRaises(ValueError):
+            list(timeline.resolve(spans))
+
+    def test_empty(self):
+        self.assertEqual(list(timeline.resolve([])), [])
+
+
+class MaterializeTest(unittest.TestCase):
+
+    def test_saves_resolved_spans(self):
+        span_storage = storage.SpanStorage(':memory:')
+        span_storage.add_many([span(TMUX, '10:00', '10:15'), span(CHROME, '10:10', '10:20')])
+
+        timeline.materialize(span_storage)
+        # Materializing again replaces the timeline.
+        timeline.materialize(span_storage)
+
+        self.assertEqual(
+                [(s.session, s.start.time(), s.end.time())
+                 for s in span_storage.query('timeline')],
+                [(TMUX, t('10:00').time(), t('10:10').time()),
+                 (CHROME, t('10:10').time(), t('10:20').time())])
+
+    def test_rederiving_clears_the_timeline(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db = str(pathlib.Path(temp_dir) / 'spans.db')
+            output = str(pathlib.Path(temp_dir) / 'rederived.db')
+            span_storage = storage.SpanStorage(db)
+            span_storage.add(span(TMUX, '10:00', '10:15'))
+            timeline.materialize(span_storage)
+
+            result = CliRunner().invoke(trackctl.cli, ['rederive', '--db', db,
+                                                       '--output', output])
+            self.assertEqual(result.exit_code, 0, result.output)
+
+            self.assertEqual(list(storage.SpanStorage(output).query('timeline')), [])
+
+
+def load_tests(loader, tests, ignore):
+    tests.addTests(doctest.DocTestSuite(timeline))
+    return tests
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,28 @@
 from dataclasses import dataclass
 import logging
 import pprint
-import threading
 
-from typing import Optional
+from typing import Dict, FrozenSet, Iterable, Mapping, Optional, Set, Tuple
 
 from google.protobuf import empty_pb2
 
+import actor
+import events
+import metrics
+import sources
+import tmux_pb2
 import tmux_pb2_grpc
-import x11
+import tmux_snapshot
+from storage import TmuxSession
+from tracing import TRACE, Stage
+
+
+logger = logging.getLogger(__name__)
+
+
+RELAYED_EVENT_DURATION = metrics.Histogram(
+        'trackd_relayed_event_duration_seconds',
+        'Time to handle an event received through Tmux.relay.', ['method'])
 
 
 @dataclass(frozen=True)
@@ -21,35 +35,44 @@ class TmuxClient:
     client_name: str
 
 
-@dataclass(frozen=True)
-class TmuxSession:
-    """Tmux sessions are represented by tmux server PID + session name."""
-    session_name: str
-    hostname: str
-    server_pid: int
-
-
 class XWindowIdTmuxClientMap:
     """Maintains a mapping from a X Window ID to a tmux client.
 
+    Also maintains the reverse mapping, from a tmux client to X Window IDs.
+
     Thread-unsafe.
     """
 
     def __init__(self):
-        self._map = {}
+        self._map: Dict[events.XWindowId, TmuxClient] = {}
+        self._x_window_ids: Dict[TmuxClient, Set[events.XWindowId]] = {}
 
-    def __getitem__(self, x_window_id: x11.XWindowId) -> TmuxClient:
+    def __getitem__(self, x_window_id: events.XWindowId) -> TmuxClient:
         return self._map[x_window_id]
 
-    def __setitem__(self, x_window_id: x11.XWindowId, client: TmuxClient) -> None:
+    def __setitem__(self, x_window_id: events.XWindowId, client: TmuxClient) -> None:
+        if x_window_id in self._map:
+            del self[x_window_id]
         self._map[x_window_id] = client
+        self._x_window_ids.setdefault(client, set()).add(x_window_id)
 
-    def __delitem__(self, x_window_id: x11.XWindowId) -> None:
-        del self._map[x_window_id]
+    def __delitem__(self, x_window_id: events.XWindowId) -> None:
+        client = self._map.pop(x_window_id)
+        x_window_ids = self._x_window_ids[client]
+        x_window_ids.discard(x_window_id)
+        if not x_window_ids:
+            del self._x_window_ids[client]
 
-    def __contains__(self, x_window_id: x11.XWindowId) -> bool:
+    def __contains__(self, x_window_id: events.XWindowId) -> bool:
         return x_window_id in self._map
 
+    def x_window_ids(self, client: TmuxClient) -> FrozenSet[events.XWindowId]:
+        """Returns X Window IDs mapped to the client."""
+        return frozenset(self._x_window_ids.get(client, ()))
+
+    def items(self) -> Iterable[Tuple[events.XWindowId, TmuxClient]]:
+        return self._map.items()
+
     def __repr__(self):
         rpr = pprint.pformat({
             k: f'{v.hostname}:{v.client_name}'
@@ -59,147 +82,267 @@ class XWindowIdTmuxClientMap:
 
 
 class TmuxClientSessionMap:
-    """Maintains a mapping from a tmux client to a tmux session."""
+    """Maintains a mapping from a tmux client to a tmux session.
+
+    Also maintains the reverse mapping, from a tmux session to its clients, so
+    renaming or closing a session doesn't need to look at unrelated clients.
+
+    Thread-unsafe.
+    """
 
     def __init__(self):
-        self._map = {}
-        self._lock = threading.Lock()
+        self._map: Dict[TmuxClient, TmuxSession] = {}
+        self._clients: Dict[TmuxSession, Set[TmuxClient]] = {}
 
     def __getitem__(self, client: TmuxClient) -> TmuxSession:
-        with self._lock:
-            return self._map[client]
+        return self._map[client]
 
     def __setitem__(self, client: TmuxClient, session: TmuxSession) -> None:
-        with self._lock:
-            self._map[client] = session
+        if client in self._map:
+            self._remove(client)
+        self._map[client] = session
+        self._clients.setdefault(session, set()).add(client)
 
     def __delitem__(self, client: TmuxClient) -> None:
-        with self._lock:
-            del self._map[client]
+        self._remove(client)
+
+    def _remove(self, client: TmuxClient) -> None:
+        session = self._map.pop(client)
+        clients = self._clients[session]
+        clients.discard(client)
+        if not clients:
+            del self._clients[session]
 
     def __contains__(self, client: TmuxClient) -> bool:
-        with self._lock:
-            return client in self._map
+        return client in self._map
+
+    def items(self) -> Iterable[Tuple[TmuxClient, TmuxSession]]:
+        return self._map.items()
 
     def session_renamed(self, client: TmuxClient, new_session: TmuxSession) -> None:
-        with self._lock:
-            # * Find the name of the session the client is connected to
-            #   according to our data.
-            old_session = self._map[client]
-            # * Find if there are any other clients on that hostname connected
-            #   to the same session on the same tmux server.
-            clients_to_update = [
-                    client
-                    for client, session in self._map.items()
-                    if session == old_session
-            ]
-            # * For each client set it to the new session
-            for client in clients_to_update:
-                self._map[client] = new_session
+        # * Find the name of the session the client is connected to
+        #   according to our data.
+        old_session = self._map[client]
+        # * Find if there are any other clients on that hostname connected
+        #   to the same session on the same tmux server.
+        clients_to_update = self._clients.pop(old_session)
+        # * For each client set it to the new session
+        for client in clients_to_update:
+            self._map[client] = new_session
+        self._clients.setdefault(new_session, set()).update(clients_to_update)
 
     def session_closed(self, session: TmuxSession) -> None:
-        with self._lock:
-            clients_to_update = [
-                    client
-                    for client, session_ in self._map.items()
-                    if session_ == session
-            ]
-            for client in clients_to_update:
-                del self._map[client]
+        clients_to_update = self._clients.pop(session, ())
+        for client in clients_to_update:
+            del self._map[client]
 
     def __repr__(self):
-        with self._lock:
-            rpr = pprint.pformat({
-                k.client_name: f'{v.hostname}:{v.session_name}'
-                for k, v in self._map.items()
-            })
-            return f'{self.__class__.__name__}({rpr})'
+        rpr = pprint.pformat({
+            k.client_name: f'{v.hostname}:{v.session_name}'
+            for k, v in self._map.items()
+        })
+        return f'{self.__class__.__name__}({rpr})'
+
+
+##
+# Messages handled by TmuxAdapter.
+
+@dataclass(frozen=True)
+class ClientSetForXWindowId:
+    x_window_id: events.XWindowId
+    client: TmuxClient
+
+
+@dataclass(frozen=True)
+class ClientClearedForXWindowId:
+    x_window_id: events.XWindowId
+
+
+@dataclass(frozen=True)
+class ClientSessionChanged:
+    client: TmuxClient
+    session: TmuxSession
+
+
+@dataclass(frozen=True)
+class ClientDetached:
+    client: TmuxClient
+
+
+@dataclass(frozen=True)
+class SessionRenamed:
+    client: TmuxClient
+    new_session: TmuxSession
+
+
+@dataclass(frozen=True)
+class SessionClosed:
+    session: TmuxSession
+
+
+@dataclass(frozen=True)
+class StateSynced:
+    """A full snapshot of tmux clients on a host."""
+    hostname: str
+    x_window_clients: Mapping[events.XWindowId, TmuxClient]
+    client_sessions: Mapping[TmuxClient, TmuxSession]
+
+
+@dataclass(frozen=True)
+class TmuxAdapterState:
+    focused_x_window_id: Optional[events.XWindowId]
+    active_session: Optional[TmuxSession]
 
 
-class TmuxAdapter:
+class TmuxAdapter(actor.Actor[TmuxAdapterState]):
+    """Keeps track of which tmux session is active.
+
+    An actor: the public methods only send a message, which is handled on the
+    thread running `run()`.
+    """
 
     def __init__(self, span_tracker):
+        super().__init__()
         self._x_window_id_tmux_client_map = XWindowIdTmuxClientMap()
         self._tmux_client_session_map = TmuxClientSessionMap()
-        self._lock = threading.Lock()
         self._span_tracker = span_tracker
-        self._focused_x_window_id: Optional[x11.XWindowId] = None
+        self._focused_x_window_id: Optional[events.XWindowId] = None
+        self._handle(events.FocusChanged, self._on_focus_changed)
+        self._handle(ClientSetForXWindowId, self._on_client_set_for_x_window_id)
+        self._handle(ClientClearedForXWindowId, self._on_client_cleared_for_x_window_id)
+        self._handle(ClientSessionChanged, self._on_client_session_changed)
+        self._handle(ClientDetached, self._on_client_detached)
+        self._handle(SessionRenamed, self._on_session_renamed)
+        self._handle(SessionClosed, self._on_session_closed)
+        self._handle(StateSynced, self._on_state_synced)
+        self._publish(TmuxAdapterState(focused_x_window_id=None, active_session=None))
 
     def _check_span(self):
+        session = self._active_session()
+        self._span_tracker.update_active_session(session)
+        self._publish(TmuxAdapterState(
+            focused_x_window_id=self._focused_x_window_id,
+            active_session=session))
+
+    def _active_session(self) -> Optional[TmuxSession]:
         if self._focused_x_window_id not in self._x_window_id_tmux_client_map:
-            self._span_tracker.update_active_session(None)
-            return
+            return None
         client = self._x_window_id_tmux_client_map[self._focused_x_window_id]
 
         if client not in self._tmux_client_session_map:
-            self._span_tracker.update_active_session(None)
-            return
-        session = self._tmux_client_session_map[client]
+            return None
+        return self._tmux_client_session_map[client]
 
-        self._span_tracker.update_active_session(session)
+    def set_focused_x_window_id(self, x_window_id: events.XWindowId, window: events.XWindowInfo) -> None:
+        self.send(events.FocusChanged(x_window_id, window))
 
-    def set_focused_x_window_id(self, x_window_id: x11.XWindowId, window_name: str) -> None:
-        # logging.debug('set_focused_x_window_id(%r, %r)', x_window_id, window_name)
-        with self._lock:
-            self._focused_x_window_id = x_window_id
-            self._check_span()
+    def _on_focus_changed(self, message: events.FocusChanged) -> None:
+        logger.debug('%r', message)
+        self._focused_x_window_id = message.x_window_id
+        self._check_span()
 
     ##
     # Methods for maintaining X Window ID ↔ tmux client mapping.
 
-    def set_client_for_x_window_id(self, x_window_id: x11.XWindowId, client: TmuxClient) -> None:
-        logging.debug('set_client_for_x_window_id(%r, %r)', x_window_id, client)
-        with self._lock:
-            self._x_window_id_tmux_client_map[x_window_id] = client
-            # TODO: At this point the client shouldn't have a corresponding TmuxSession.
-            # If it does we should raise a "surprise alert" here.
-            self._check_span()
-
-    def clear_client_for_x_window_id(self, x_window_id: x11.XWindowId) -> None:
-        logging.debug('clear_client_for_x_window_id(%r)', x_window_id)
-        with self._lock:
+    def set_client_for_x_window_id(self, x_window_id: events.XWindowId, client: TmuxClient) -> None:
+        self.send(ClientSetForXWindowId(x_window_id, client))
+
+    def _on_client_set_for_x_window_id(self, message: ClientSetForXWindowId) -> None:
+        logger.debug('%r', message)
+        # Client names are tty names, which get reused.  If the client was
+        # mapped to another X Window, that mapping is stale.
+        for stale_x_window_id in self._x_window_id_tmux_client_map.x_window_ids(message.client):
+            del self._x_window_id_tmux_client_map[stale_x_window_id]
+        self._x_window_id_tmux_client_map[message.x_window_id] = message.client
+        # TODO: At this point the client shouldn't have a corresponding TmuxSession.
+        # If it does we should raise a "surprise alert" here.
+        self._check_span()
+
+    def clear_client_for_x_window_id(self, x_window_id: events.XWindowId) -> None:
+        self.send(ClientClearedForXWindowId(x_window_id))
+
+    def _on_client_cleared_for_x_window_id(self, message: ClientClearedForXWindowId) -> None:
+        logger.debug('%r', message)
+        try:
+            client = self._x_window_id_tmux_client_map[message.x_window_id]
+        except KeyError:
+            pass
+        else:
+            for x_window_id in self._x_window_id_tmux_client_map.x_window_ids(client):
+                del self._x_window_id_tmux_client_map[x_window_id]
+            # The client will also be detached from any sessions.
             try:
-                client = self._x_window_id_tmux_client_map[x_window_id]
+                del self._tmux_client_session_map[client]
             except KeyError:
                 pass
-            else:
-                del self._x_window_id_tmux_client_map[x_window_id]
-                # The client will also be detached from any sessions.
-                try:
-                    del self._tmux_client_session_map[client]
-                except KeyError:
-                    pass
-            self._check_span()
+        self._check_span()
 
     ##
     # Methods for maintaining tmux client ↔ session mapping.
 
     def client_session_changed(self, client: TmuxClient, session: TmuxSession) -> None:
-        logging.debug('client_session_changed(%r, %r)', client, session)
-        with self._lock:
-            self._tmux_client_session_map[client] = session
-            self._check_span()
+        self.send(ClientSessionChanged(client, session))
+
+    def _on_client_session_changed(self, message: ClientSessionChanged) -> None:
+        logger.debug('%r', message)
+        self._tmux_client_session_map[message.client] = message.session
+        self._check_span()
 
     def client_detached(self, client: TmuxClient) -> None:
-        logging.debug('client_detached(%r)', client)
-        with self._lock:
-            try:
-                del self._tmux_client_session_map[client]
-            except KeyError:
-                pass
-            self._check_span()
+        self.send(ClientDetached(client))
+
+    def _on_client_detached(self, message: ClientDetached) -> None:
+        logger.debug('%r', message)
+        try:
+            del self._tmux_client_session_map[message.client]
+        except KeyError:
+            pass
+        self._check_span()
 
     def session_renamed(self, client: TmuxClient, new_session: TmuxSession) -> None:
-        logging.debug('session_renamed(%r, %r)', client, new_session)
-        with self._lock:
-            self._tmux_client_session_map.session_renamed(client, new_session)
-            self._check_span()
+        self.send(SessionRenamed(client, new_session))
+
+    def _on_session_renamed(self, message: SessionRenamed) -> None:
+        logger.debug('%r', message)
+        self._tmux_client_session_map.session_renamed(message.client, message.new_session)
+        self._check_span()
 
     def session_closed(self, session: TmuxSession) -> None:
-        logging.debug('session_closed(%r)', session)
-        with self._lock:
-            self._tmux_client_session_map.session_closed(session)
-            self._check_span()
+        self.send(SessionClosed(session))
+
+    def _on_session_closed(self, message: SessionClosed) -> None:
+        logger.debug('%r', message)
+        self._tmux_client_session_map.session_closed(message.session)
+        self._check_span()
+
+    ##
+    # Bulk resync, e.g. after trackd restarted and lost its state.
+
+    def sync_state(self, hostname: str,
+                   x_window_clients: Mapping[events.XWindowId, TmuxClient],
+                   client_sessions: Mapping[TmuxClient, TmuxSession]) -> None:
+        """Replaces everything known about clients on `hostname`."""
+        self.send(StateSynced(hostname, x_window_clients, client_sessions))
+
+    def _on_state_synced(self, message: StateSynced) -> None:
+        logger.debug('%r', message)
+        x_window_id_tmux_client_map = XWindowIdTmuxClientMap()
+        for x_window_id, client in self._x_window_id_tmux_client_map.items():
+            if client.hostname != message.hostname:
+                x_window_id_tmux_client_map[x_window_id] = client
+        for x_window_id, client in message.x_window_clients.items():
+            x_window_id_tmux_client_map[x_window_id] = client
+
+        tmux_client_session_map = TmuxClientSessionMap()
+        for client, session in self._tmux_client_session_map.items():
+            if client.hostname != message.hostname:
+                tmux_client_session_map[client] = session
+        for client, session in message.client_sessions.items():
+            tmux_client_session_map[client] = session
+
+        self._x_window_id_tmux_client_map = x_window_id_tmux_client_map
+        self._tmux_client_session_map = tmux_client_session_map
+        self._check_span()
 
 
 class Tmux(tmux_pb2_grpc.TmuxServicer):
@@ -212,16 +355,19 @@ class Tmux(tmux_pb2_grpc.TmuxServicer):
         self._tmux_adapter = tmux_adapter
 
     def set_client_for_x_window_id(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('set_client_for_x_window_id'))
         client = TmuxClient(hostname=request.hostname,
                             client_name=request.client_name)
         self._tmux_adapter.set_client_for_x_window_id(request.x_window_id, client)
         return empty_pb2.Empty()
 
     def clear_client_for_x_window_id(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('clear_client_for_x_window_id'))
         self._tmux_adapter.clear_client_for_x_window_id(request.x_window_id)
         return empty_pb2.Empty()
 
     def client_session_changed(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('client_session_changed'))
         client = TmuxClient(hostname=request.hostname,
                             client_name=request.client_name)
         session = TmuxSession(hostname=request.hostname,
@@ -232,12 +378,14 @@ class Tmux(tmux_pb2_grpc.TmuxServicer):
         return empty_pb2.Empty()
 
     def client_detached(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('client_detached'))
         client = TmuxClient(hostname=request.hostname,
                             client_name=request.client_name)
         self._tmux_adapter.client_detached(client)
         return empty_pb2.Empty()
 
     def session_renamed(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('session_renamed'))
         client = TmuxClient(hostname=request.hostname,
                             client_name=request.client_name)
         new_session = TmuxSession(hostname=request.hostname,
@@ -247,8 +395,48 @@ class Tmux(tmux_pb2_grpc.TmuxServicer):
         return empty_pb2.Empty()
 
     def session_closed(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('session_closed'))
         session = TmuxSession(hostname=request.hostname,
                               server_pid=request.server_pid,
                               session_name=request.session_name)
         self._tmux_adapter.session_closed(session)
         return empty_pb2.Empty()
+
+    def sync_state(self, request, context):
+        TRACE.new_trace(Stage.TMUX_RPC, TRACE.label('sync_state'))
+        x_window_clients = {}
+        client_sessions = {}
+        for client_state in request.clients:
+            client = TmuxClient(hostname=request.hostname,
+                                client_name=client_state.client_name)
+            if client_state.x_window_id:
+                x_window_clients[client_state.x_window_id] = client
+            client_sessions[client] = TmuxSession(hostname=request.hostname,
+                                                  server_pid=client_state.server_pid,
+                                                  session_name=client_state.session_name)
+        self._tmux_adapter.sync_state(request.hostname, x_window_clients, client_sessions)
+        return empty_pb2.Empty()
+
+    def relay(self, request_iterator, context):
+        for batch in request_iterator:
+            for event in batch.events:
+                method = event.WhichOneof('event')
+                with RELAYED_EVENT_DURATION.time(method):
+                    getattr(self, method)(getattr(event, method), context)
+            if batch.events:
+                yield tmux_pb2.RelayAck(seq=batch.events[-1].seq)
+
+
+class TmuxSource(sources.Source):
+    """Gets tmux clients' sessions from hooks over gRPC, and focus from the event bus."""
+
+    def start(self, context: sources.SourceContext) -> None:
+        tmux_adapter = TmuxAdapter(context.span_tracker())
+        context.add_actor(tmux_adapter)
+        context.start_thread(tmux_adapter.run, name='tmux-adapter')
+        context.bus.subscribe(events.FocusChanged, lambda event: (
+            tmux_adapter.set_focused_x_window_id(event.x_window_id, event.window)))
+        tmux_servicer = Tmux(tmux_adapter)
+        # Pick up tmux clients that were attached before trackd started.
+        tmux_servicer.sync_state(tmux_snapshot.sync_state_request(), context=None)
+        tmux_pb2_grpc.add_TmuxServicer_to_server(tmux_servicer, context.grpc_server())
@@ -23,5 +23,8 @@ function cleanup() {
 
 trap cleanup EXIT
 
+# For `trackctl tmux resync` to find the X Window of the tmux client.
+export TRACKD_X_WINDOW_ID="$X_WINDOW_ID"
+
 tmux $@
 
@@ -0,0 +1,69 @@
+"""Micro-benchmark for tmux client/session maps.
+
+Sets up a lot of clients, spread over many hosts (as with tmux on remote hosts
+reporting over SSH, see ssh-to-desktop.sh), and times renaming/closing a
+session.  Time per operation should stay flat as the number of clients grows.
+
+Usage: python tmux_bench.py
+"""
+import timeit
+
+import click
+
+from tmux import TmuxClient, TmuxClientSessionMap, TmuxSession, XWindowIdTmuxClientMap
+
+
+def make_maps(n_clients: int, n_hosts: int, clients_per_session: int):
+    x_window_id_map = XWindowIdTmuxClientMap()
+    session_map = TmuxClientSessionMap()
+    for i in range(n_clients):
+        hostname = f'host{i % n_hosts}'
+        client = TmuxClient(hostname=hostname, client_name=f'/dev/pts/{i}')
+        session = TmuxSession(session_name=f'session{i // clients_per_session}',
+                              hostname=hostname, server_pid=42)
+        x_window_id_map[i] = client
+        session_map[client] = session
+    return x_window_id_map, session_map
+
+
+def bench(n_clients: int, n_hosts: int, clients_per_session: int, number: int) -> dict:
+    x_window_id_map, session_map = make_maps(n_clients, n_hosts, clients_per_session)
+    client = x_window_id_map[n_clients // 2]
+    session = session_map[client]
+    renamed = TmuxSession(session_name='renamed', hostname=session.hostname,
+                          server_pid=session.server_pid)
+
+    def rename():
+        session_map.session_renamed(client, renamed)
+        session_map.session_renamed(client, session)
+
+    def close():
+        clients = session_map._clients.get(session, set()).copy()
+        session_map.session_closed(session)
+        for client_ in clients:
+            session_map[client_] = session
+
+    def stale_windows():
+        x_window_id_map.x_window_ids(client)
+
+    return {
+        'session_renamed': timeit.timeit(rename, number=number) / number / 2,
+        'session_closed': timeit.timeit(close, number=number) / number,
+        'x_window_ids': timeit.timeit(stale_windows, number=number) / number,
+    }
+
+
+@click.command()
+@click.option('--hosts', default=50)
+@click.option('--clients_per_session', default=2)
+@click.option('--number', default=10000, help='Repetitions per measurement.')
+def main(hosts, clients_per_session, number):
+    print(f'{"clients":>10} {"session_renamed":>16} {"session_closed":>16} {"x_window_ids":>16}')
+    for n_clients in (1_000, 10_000, 100_000):
+        result = bench(n_clients, hosts, clients_per_session, number)
+        print(f'{n_clients:>10} ' + ' '.join(
+            f'{result[op] * 1e6:>14.2f}µs' for op in ('session_renamed', 'session_closed', 'x_window_ids')))
+
+
+if __name__ == '__main__':
+    main()
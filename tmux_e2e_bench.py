@@ -0,0 +1,209 @@
+"""End-to-end latency benchmark, from a tmux hook firing to the span's row.
+
+Starts trackd in-process, with only the tmux source, on free ports and with a
+temporary database, and a throwaway tmux server with tmux-hooks.conf and one
+client (as in tmux_hooks_test.py).  The hooks run trackctl.py through a
+wrapper, which logs when the hook started and finished.  The client's
+(made up) X window is focused, so every session switch or rename ends a span.
+
+Then switches between sessions and renames them, one at a time, and for each
+measures:
+  - dispatch: from the tmux command to the hook starting,
+  - hook: the hook's run time, i.e. mostly trackctl's start-up,
+  - hook → row: from the hook starting to the span's row being visible in
+    the database.
+
+Usage: python tmux_e2e_bench.py [--actions 200]
+"""
+import contextlib
+import os
+import pathlib
+import shlex
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+from typing import Dict, Iterator, List, Tuple
+
+import click
+import ptyprocess
+
+import events
+import sources
+import trackd
+
+
+HERE = pathlib.Path(__file__).resolve().parent
+X_WINDOW_ID = 4242
+
+HOOK_WRAPPER = """#!/bin/sh
+start=$(date +%%s.%%N)
+%(python)s %(trackctl)s "$@"
+echo "$start $(date +%%s.%%N) $2" >> %(log)s
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+class TmuxServer:
+    """A tmux server with one client, on its own socket."""
+
+    def __init__(self, temp_dir: pathlib.Path, trackd_port: int):
+        self._temp_dir = temp_dir
+        self._socket = temp_dir / 'tmux.socket'
+        self.hook_log = temp_dir / 'hooks.log'
+        self.hook_log.touch()
+
+        wrapper = temp_dir / 'trackctl.sh'
+        wrapper.write_text(HOOK_WRAPPER % {
+            'python': shlex.quote(sys.executable),
+            'trackctl': shlex.quote(str(HERE / 'trackctl.py')),
+            'log': shlex.quote(str(self.hook_log)),
+        })
+        wrapper.chmod(0o755)
+        config = temp_dir / 'tmux.conf'
+        hooks = (HERE / 'tmux-hooks.conf').read_text()
+        config.write_text(hooks.replace('$HOME/projects/trackd/trackctl.sh', str(wrapper)))
+
+        env = {k: v for k, v in os.environ.items() if k != 'TMUX'}
+        env['TRACKD_SERVER'] = f'localhost:{trackd_port}'
+        self._client = ptyprocess.PtyProcess.spawn(
+                ['tmux', '-f', str(config), '-S', str(self._socket), 'new', '-s', 'session0'],
+                env=env)
+
+    def run(self, *args: str) -> str:
+        return subprocess.run(['tmux', '-S', str(self._socket), *args],
+                              check=True, capture_output=True, text=True).stdout.strip()
+
+    def client_name(self) -> str:
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with contextlib.suppress(subprocess.CalledProcessError):
+                client_name = self.run('list-clients', '-F', '#{client_name}')
+                if client_name:
+                    return client_name
+            time.sleep(.05)
+        raise RuntimeError("tmux client didn't start")
+
+    def kill(self) -> None:
+        with contextlib.suppress(subprocess.CalledProcessError):
+            self.run('kill-server')
+        self._client.close(force=True)
+
+
+def hook_records(path: pathlib.Path) -> List[Tuple[float, float, str]]:
+    records = []
+    for line in path.read_text().splitlines():
+        start, end, hook = line.split()
+        records.append((float(start), float(end), hook))
+    return records
+
+
+def wait_for(condition, timeout: float, interval: float = 5e-4) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(interval)
+    return True
+
+
+def actions(n_actions: int, n_sessions: int) -> Iterator[Tuple[str, List[str]]]:
+    """Alternates switching to the next session and renaming it."""
+    names = [f'session{i}' for i in range(n_sessions)]
+    current = 0
+    for i in range(n_actions):
+        if i % 2 == 0:
+            current = (current + 1) % n_sessions
+            yield 'client-session-changed', ['switch-client', '-t', names[current]]
+        else:
+            new_name = f'session{current}-{i}'
+            yield 'session-renamed', ['rename-session', '-t', names[current], new_name]
+            names[current] = new_name
+
+
+def bench(n_actions: int, n_sessions: int, timeout: float) -> Dict[str, List[float]]:
+    import grpc
+    import tmux_pb2
+    import tmux_pb2_grpc
+
+    samples: Dict[str, List[float]] = {'dispatch': [], 'hook': [], 'hook → row': []}
+    with tempfile.TemporaryDirectory() as temp_dir_name:
+        temp_dir = pathlib.Path(temp_dir_name)
+        port = free_port()
+        trackd_ = trackd.Trackd(db_path=str(temp_dir / 'spans.db'), port=port,
+                                admin_port=free_port(), config=sources.Config(enabled=['tmux']))
+        trackd_.start()
+        tmux = TmuxServer(temp_dir, port)
+        try:
+            client_name = tmux.client_name()
+            for i in range(1, n_sessions):
+                tmux.run('new-session', '-d', '-s', f'session{i}')
+            # Wait for the client's own client-session-changed hook.
+            if not wait_for(lambda: hook_records(tmux.hook_log), timeout):
+                raise RuntimeError("Hooks don't run")
+            with grpc.insecure_channel(f'localhost:{port}') as channel:
+                tmux_pb2_grpc.TmuxStub(channel).set_client_for_x_window_id(
+                        tmux_pb2.SetClientForXWindowIdRequest(
+                            hostname=tmux.run('display-message', '-p', '#{host}'),
+                            client_name=client_name,
+                            x_window_id=X_WINDOW_ID))
+            trackd_.bus.publish(events.FocusChanged(
+                X_WINDOW_ID, events.XWindowInfo(name='tmux', wm_class=('xterm', 'XTerm'))))
+
+            db = sqlite3.connect(temp_dir / 'spans.db')
+            count_rows = lambda: db.execute('SELECT count(*) FROM spans').fetchone()[0]
+            lost = 0
+            for hook, command in actions(n_actions, n_sessions):
+                rows = count_rows()
+                hooks = len(hook_records(tmux.hook_log))
+                sent = time.time()
+                tmux.run(*command)
+                row_visible = wait_for(lambda: count_rows() > rows, timeout)
+                visible = time.time()
+                if not (row_visible and
+                        wait_for(lambda: len(hook_records(tmux.hook_log)) > hooks, timeout)):
+                    lost += 1
+                    continue
+                start, end, logged_hook = hook_records(tmux.hook_log)[hooks]
+                assert logged_hook == hook, (logged_hook, hook)
+                samples['dispatch'].append(start - sent)
+                samples['hook'].append(end - start)
+                samples['hook → row'].append(visible - start)
+            if lost:
+                print(f'{lost} of {n_actions} actions timed out')
+        finally:
+            tmux.kill()
+            trackd_.stop()
+    return samples
+
+
+def _format_ms(seconds: float) -> str:
+    return f'{seconds * 1e3:7.1f}ms'
+
+
+@click.command()
+@click.option('--actions', 'n_actions', default=200, help='Session switches and renames.')
+@click.option('--sessions', 'n_sessions', default=5)
+@click.option('--timeout', default=5.0, help='Seconds to wait for a row.')
+def main(n_actions, n_sessions, timeout):
+    samples = bench(n_actions, n_sessions, timeout)
+    for name, values in samples.items():
+        if not values:
+            continue
+        values.sort()
+        p50 = values[len(values) // 2]
+        p99 = values[min(len(values) - 1, int(len(values) * .99))]
+        print(f'{name:<12} n={len(values)} p50={_format_ms(p50)} p99={_format_ms(p99)} '
+              f'max={_format_ms(values[-1])}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""Load test for the tmux gRPC servicer.
+
+Starts trackd in-process, with only the tmux source and in-memory databases,
+and fires hook RPCs at it from `--processes` client processes, each keeping
+up to `--concurrency` calls in flight.  Calls are a mix of
+client_session_changed, session_renamed and session_closed, from many hosts
+and clients.  One of the clients is focused, so some calls end spans.
+
+For every server configuration (`--workers` × `--max_concurrent_rpcs`, see
+`rpc.make_server()`) reports:
+  - throughput, and failed calls by status code,
+  - client-side latency, i.e. including waiting for a server thread,
+  - server-side handler latency,
+  - lock contention: how many senders waited for an actor's record lock
+    (see actor.py), and for how long, and the same for the SpanStorage lock,
+  - the TmuxAdapter's queue wait and peak inbox size.
+
+Usage: python tmux_load_bench.py --workers 2,10,50 --max_concurrent_rpcs 0,100
+"""
+import collections
+import math
+import multiprocessing
+import random
+import socket
+import threading
+import time
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import click
+
+import events
+import metrics
+import sources
+import trackd
+
+
+X_WINDOW_ID = 4242
+FOCUSED_HOST = 'host0-0'
+FOCUSED_CLIENT = '/dev/pts/0'
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def drive(port: int, process: int, calls: int, concurrency: int, hosts: int,
+          clients_per_host: int) -> Tuple[List[float], Dict[str, int]]:
+    """Makes `calls` calls, `concurrency` at a time.
+
+    Returns their latencies, and counts of failures by status code.  Runs in
+    a client process.
+    """
+    import grpc
+    import tmux_pb2
+    import tmux_pb2_grpc
+
+    rng = random.Random(process)
+    hostnames = [f'host{process}-{i}' for i in range(hosts)]
+    # Sessions of the clients the server knows about, so renames are valid.
+    sessions: Dict[Tuple[str, str], str] = {}
+    lock = threading.Lock()
+    in_flight = threading.BoundedSemaphore(concurrency)
+    done = threading.Event()
+    latencies: List[float] = []
+    failures: Dict[str, int] = collections.Counter()
+    remaining = calls
+    # A call is cancelled if its future is garbage collected.
+    futures = set()
+
+    def request():
+        hostname = rng.choice(hostnames)
+        client_name = f'/dev/pts/{rng.randrange(clients_per_host)}'
+        kind = rng.random()
+        with lock:
+            session = sessions.get((hostname, client_name))
+        if kind < .1:
+            # Closing a detached session: there are no clients to update.
+            return stub.session_closed, tmux_pb2.SessionClosedRequest(
+                    hostname=hostname, server_pid=1, session_name=f'detached{rng.randrange(100)}')
+        if kind < .3 and session is not None:
+            return stub.session_renamed, tmux_pb2.SessionRenamedRequest(
+                    hostname=hostname, client_name=client_name, server_pid=1,
+                    new_session_name=f'renamed{rng.randrange(100)}')
+        new_session = f'session{rng.randrange(100)}'
+
+        def update():
+            with lock:
+                sessions[(hostname, client_name)] = new_session
+        return stub.client_session_changed, tmux_pb2.ClientSessionChangedRequest(
+                hostname=hostname, client_name=client_name, server_pid=1,
+                session_name=new_session), update
+
+    def call_done(future, start, update):
+        nonlocal remaining
+        latency = time.perf_counter() - start
+        code = future.code()
+        with lock:
+            if code == grpc.StatusCode.OK:
+                latencies.append(latency)
+            else:
+                failures[code.name] += 1
+            futures.discard(future)
+            remaining -= 1
+            if not remaining:
+                done.set()
+        if code == grpc.StatusCode.OK and update is not None:
+            update()
+        in_flight.release()
+
+    with grpc.insecure_channel(f'localhost:{port}') as channel:
+        # Calls made while the connection is being set up, before the
+        # server's stream limit is known, may be refused.
+        grpc.channel_ready_future(channel).result(timeout=10)
+        stub = tmux_pb2_grpc.TmuxStub(channel)
+        for _ in range(calls):
+            method, message, *update = request()
+            in_flight.acquire()
+            start = time.perf_counter()
+            future = method.future(message)
+            with lock:
+                futures.add(future)
+            future.add_done_callback(
+                    lambda future, start=start, update=update: call_done(
+                        future, start, update[0] if update else None))
+        done.wait()
+    return latencies, dict(failures)
+
+
+def histograms(names: Sequence[str]) -> Dict[str, Dict[float, float]]:
+    """Returns cumulative bucket counts of histograms, summed over their labels."""
+    buckets: Dict[str, Dict[float, float]] = {name: collections.Counter() for name in names}
+    for name, labels, value in metrics.parse(metrics.REGISTRY.exposition()):
+        base = name[:-len('_bucket')]
+        if name.endswith('_bucket') and base in buckets:
+            buckets[base][float(labels['le'])] += value
+    return buckets
+
+
+LATENCY_METRICS = {
+    'handler': 'trackd_grpc_request_duration_seconds',
+    'adapter queue wait': 'trackd_actor_queue_wait_seconds',
+    'record lock wait': 'trackd_actor_record_lock_wait_seconds',
+    'storage lock wait': 'trackd_span_storage_lock_wait_seconds',
+}
+
+
+def bench(workers: int, max_concurrent_rpcs: int, max_pending_rpcs: Optional[int],
+          processes: int, calls: int, concurrency: int, hosts: int, clients_per_host: int) -> None:
+    import grpc
+    import tmux_pb2
+    import tmux_pb2_grpc
+
+    port = free_port()
+    trackd_ = trackd.Trackd(db_path=':memory:', port=port, admin_port=free_port(),
+                            config=sources.Config(enabled=['tmux']),
+                            grpc_workers=workers,
+                            max_concurrent_rpcs=max_concurrent_rpcs or None,
+                            max_pending_rpcs=max_pending_rpcs)
+    trackd_.start()
+    try:
+        with grpc.insecure_channel(f'localhost:{port}') as channel:
+            tmux_pb2_grpc.TmuxStub(channel).set_client_for_x_window_id(
+                    tmux_pb2.SetClientForXWindowIdRequest(
+                        hostname=FOCUSED_HOST, client_name=FOCUSED_CLIENT,
+                        x_window_id=X_WINDOW_ID))
+        trackd_.bus.publish(events.FocusChanged(X_WINDOW_ID, events.XWindowInfo(name='tmux')))
+
+        before = histograms(LATENCY_METRICS.values())
+        peak_inbox = 0
+        stop_sampling = threading.Event()
+
+        def sample_inbox():
+            nonlocal peak_inbox
+            while not stop_sampling.wait(.01):
+                peak_inbox = max([peak_inbox] + [actor_.inbox_size() for actor_ in trackd_.actors])
+
+        sampler = threading.Thread(target=sample_inbox, daemon=True)
+        sampler.start()
+
+        # Clients run in their own processes, not to compete with the server
+        # for the GIL.
+        with multiprocessing.get_context('spawn').Pool(processes) as pool:
+            start = time.perf_counter()
+            results = pool.starmap(drive, [
+                (port, process, calls // processes, concurrency, hosts, clients_per_host)
+                for process in range(processes)])
+            elapsed = time.perf_counter() - start
+        stop_sampling.set()
+        sampler.join()
+        after = histograms(LATENCY_METRICS.values())
+    finally:
+        trackd_.stop()
+
+    latencies = sorted(latency for process_latencies, _ in results for latency in process_latencies)
+    failures: Dict[str, int] = collections.Counter()
+    for _, process_failures in results:
+        failures.update(process_failures)
+
+    print(f'workers={workers} max_concurrent_rpcs={max_concurrent_rpcs or "-"}: '
+          f'{len(latencies) / elapsed:.0f} calls/s, {len(latencies)} ok, '
+          + (', '.join(f'{n} {code}' for code, n in sorted(failures.items())) or 'no failures'))
+    if latencies:
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * .99))]
+        print(f'  {"client":<18} p50={_format_seconds(p50)} p99={_format_seconds(p99)} '
+              f'max={_format_seconds(latencies[-1])}')
+    for label, name in LATENCY_METRICS.items():
+        delta = [(le, after[name][le] - before[name].get(le, 0)) for le in after[name]]
+        count = max((count for _, count in delta), default=0)
+        if not count:
+            print(f'  {label:<18} count=0')
+            continue
+        print(f'  {label:<18} count={count:g} p50={_format_seconds(metrics.quantile(.5, delta))} '
+              f'p99={_format_seconds(metrics.quantile(.99, delta))}')
+    print(f'  {"peak adapter inbox":<18} {peak_inbox:g}')
+
+
+def _format_seconds(seconds: float) -> str:
+    if math.isnan(seconds):
+        return '-'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.0f}µs'
+    if seconds < 1:
+        return f'{seconds * 1e3:.1f}ms'
+    return f'{seconds:.2f}s'
+
+
+@click.command()
+@click.option('--workers', default='10', help='Comma-separated server thread pool sizes.')
+@click.option('--max_concurrent_rpcs', default='0',
+              help='Comma-separated limits on concurrent RPCs; 0 is no limit.')
+@click.option('--max_pending_rpcs', type=int,
+              help="Limit on RPCs waiting to be picked up; rpc.py's default by default.")
+@click.option('--processes', default=4, help='Client processes.')
+@click.option('--calls', default=20000, help='Calls, in total.')
+@click.option('--concurrency', default=500, help='Calls in flight per client process.')
+@click.option('--hosts', default=10, help='Hosts per client process.')
+@click.option('--clients_per_host', default=10)
+def main(workers, max_concurrent_rpcs, max_pending_rpcs, processes, calls, concurrency, hosts,
+         clients_per_host):
+    for workers_ in (int(w) for w in workers.split(',')):
+        for max_concurrent_rpcs_ in (int(m) for m in max_concurrent_rpcs.split(',')):
+            bench(workers_, max_concurrent_rpcs_, max_pending_rpcs, processes, calls, concurrency,
+                  hosts, clients_per_host)
+
+
+if __name__ == '__main__':
+    main()
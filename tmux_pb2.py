@@ -1,12 +1,22 @@
 # -*- coding: utf-8 -*-
 # Generated by the protocol buffer compiler.  DO NOT EDIT!
+# NO CHECKED-IN PROTOBUF GENCODE
 # source: tmux.proto
-# Protobuf Python Version: 4.25.0
+# Protobuf Python Version: 7.35.1
 """Generated protocol buffer code."""
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import runtime_version as _runtime_version
 from google.protobuf import symbol_database as _symbol_database
 from google.protobuf.internal import builder as _builder
+_runtime_version.ValidateProtobufRuntimeVersion(
+    _runtime_version.Domain.PUBLIC,
+    7,
+    35,
+    1,
+    '',
+    'tmux.proto'
+)
 # @@protoc_insertion_point(imports)
 
 _sym_db = _symbol_database.Default()
@@ -15,13 +25,13 @@ _sym_db = _symbol_database.Default()
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\ntmux.proto\x12\x06trackd\x1a\x1bgoogle/protobuf/empty.proto\"Z\n\x1cSetClientForXWindowIdRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\x12\x13\n\x0bx_window_id\x18\x03 \x01(\x03\"5\n\x1e\x43learClientForXWindowIdRequest\x12\x13\n\x0bx_window_id\x18\x01 \x01(\x03\"n\n\x1b\x43lientSessionChangedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\x12\x12\n\nserver_pid\x18\x03 \x01(\x03\x12\x14\n\x0csession_name\x18\x04 \x01(\t\">\n\x15\x43lientDetachedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\"l\n\x15SessionRenamedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\x12\x12\n\nserver_pid\x18\x03 \x01(\x03\x12\x18\n\x10new_session_name\x18\x04 \x01(\t\"R\n\x14SessionClosedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x12\n\nserver_pid\x18\x02 \x01(\x03\x12\x14\n\x0csession_name\x18\x03 \x01(\t2\xf5\x03\n\x04Tmux\x12Z\n\x1aset_client_for_x_window_id\x12$.trackd.SetClientForXWindowIdRequest\x1a\x16.google.protobuf.Empty\x12^\n\x1c\x63lear_client_for_x_window_id\x12&.trackd.ClearClientForXWindowIdRequest\x1a\x16.google.protobuf.Empty\x12U\n\x16\x63lient_session_changed\x12#.trackd.ClientSessionChangedRequest\x1a\x16.google.protobuf.Empty\x12H\n\x0f\x63lient_detached\x12\x1d.trackd.ClientDetachedRequest\x1a\x16.google.protobuf.Empty\x12H\n\x0fsession_renamed\x12\x1d.trackd.SessionRenamedRequest\x1a\x16.google.protobuf.Empty\x12\x46\n\x0esession_closed\x12\x1c.trackd.SessionClosedRequest\x1a\x16.google.protobuf.Emptyb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\ntmux.proto\x12\x06trackd\x1a\x1bgoogle/protobuf/empty.proto\"Z\n\x1cSetClientForXWindowIdRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\x12\x13\n\x0bx_window_id\x18\x03 \x01(\x03\"5\n\x1e\x43learClientForXWindowIdRequest\x12\x13\n\x0bx_window_id\x18\x01 \x01(\x03\"n\n\x1b\x43lientSessionChangedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\x12\x12\n\nserver_pid\x18\x03 \x01(\x03\x12\x14\n\x0csession_name\x18\x04 \x01(\t\">\n\x15\x43lientDetachedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\"l\n\x15SessionRenamedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x13\n\x0b\x63lient_name\x18\x02 \x01(\t\x12\x12\n\nserver_pid\x18\x03 \x01(\x03\x12\x18\n\x10new_session_name\x18\x04 \x01(\t\"R\n\x14SessionClosedRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12\x12\n\nserver_pid\x18\x02 \x01(\x03\x12\x14\n\x0csession_name\x18\x03 \x01(\t\"N\n\x10SyncStateRequest\x12\x10\n\x08hostname\x18\x01 \x01(\t\x12(\n\x07\x63lients\x18\x02 \x03(\x0b\x32\x17.trackd.TmuxClientState\"e\n\x0fTmuxClientState\x12\x13\n\x0b\x63lient_name\x18\x01 \x01(\t\x12\x12\n\nserver_pid\x18\x02 \x01(\x03\x12\x14\n\x0csession_name\x18\x03 \x01(\t\x12\x13\n\x0bx_window_id\x18\x04 \x01(\x03\"\xe1\x03\n\nRelayEvent\x12\x0b\n\x03seq\x18\x01 \x01(\x04\x12J\n\x1aset_client_for_x_window_id\x18\x02 \x01(\x0b\x32$.trackd.SetClientForXWindowIdRequestH\x00\x12N\n\x1c\x63lear_client_for_x_window_id\x18\x03 \x01(\x0b\x32&.trackd.ClearClientForXWindowIdRequestH\x00\x12\x45\n\x16\x63lient_session_changed\x18\x04 \x01(\x0b\x32#.trackd.ClientSessionChangedRequestH\x00\x12\x38\n\x0f\x63lient_detached\x18\x05 \x01(\x0b\x32\x1d.trackd.ClientDetachedRequestH\x00\x12\x38\n\x0fsession_renamed\x18\x06 \x01(\x0b\x32\x1d.trackd.SessionRenamedRequestH\x00\x12\x36\n\x0esession_closed\x18\x07 \x01(\x0b\x32\x1c.trackd.SessionClosedRequestH\x00\x12.\n\nsync_state\x18\x08 \x01(\x0b\x32\x18.trackd.SyncStateRequestH\x00\x42\x07\n\x05\x65vent\"0\n\nRelayBatch\x12\"\n\x06\x65vents\x18\x01 \x03(\x0b\x32\x12.trackd.RelayEvent\"\x17\n\x08RelayAck\x12\x0b\n\x03seq\x18\x01 \x01(\x04\x32\xe8\x04\n\x04Tmux\x12Z\n\x1aset_client_for_x_window_id\x12$.trackd.SetClientForXWindowIdRequest\x1a\x16.google.protobuf.Empty\x12^\n\x1c\x63lear_client_for_x_window_id\x12&.trackd.ClearClientForXWindowIdRequest\x1a\x16.google.protobuf.Empty\x12U\n\x16\x63lient_session_changed\x12#.trackd.ClientSessionChangedRequest\x1a\x16.google.protobuf.Empty\x12H\n\x0f\x63lient_detached\x12\x1d.trackd.ClientDetachedRequest\x1a\x16.google.protobuf.Empty\x12H\n\x0fsession_renamed\x12\x1d.trackd.SessionRenamedRequest\x1a\x16.google.protobuf.Empty\x12\x46\n\x0esession_closed\x12\x1c.trackd.SessionClosedRequest\x1a\x16.google.protobuf.Empty\x12>\n\nsync_state\x12\x18.trackd.SyncStateRequest\x1a\x16.google.protobuf.Empty\x12\x31\n\x05relay\x12\x12.trackd.RelayBatch\x1a\x10.trackd.RelayAck(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'tmux_pb2', _globals)
-if _descriptor._USE_C_DESCRIPTORS == False:
-  DESCRIPTOR._options = None
+if not _descriptor._USE_C_DESCRIPTORS:
+  DESCRIPTOR._loaded_options = None
   _globals['_SETCLIENTFORXWINDOWIDREQUEST']._serialized_start=51
   _globals['_SETCLIENTFORXWINDOWIDREQUEST']._serialized_end=141
   _globals['_CLEARCLIENTFORXWINDOWIDREQUEST']._serialized_start=143
@@ -34,6 +44,16 @@ if _descriptor._USE_C_DESCRIPTORS == False:
   _globals['_SESSIONRENAMEDREQUEST']._serialized_end=482
   _globals['_SESSIONCLOSEDREQUEST']._serialized_start=484
   _globals['_SESSIONCLOSEDREQUEST']._serialized_end=566
-  _globals['_TMUX']._serialized_start=569
-  _globals['_TMUX']._serialized_end=1070
+  _globals['_SYNCSTATEREQUEST']._serialized_start=568
+  _globals['_SYNCSTATEREQUEST']._serialized_end=646
+  _globals['_TMUXCLIENTSTATE']._serialized_start=648
+  _globals['_TMUXCLIENTSTATE']._serialized_end=749
+  _globals['_RELAYEVENT']._serialized_start=752
+  _globals['_RELAYEVENT']._serialized_end=1233
+  _globals['_RELAYBATCH']._serialized_start=1235
+  _globals['_RELAYBATCH']._serialized_end=1283
+  _globals['_RELAYACK']._serialized_start=1285
+  _globals['_RELAYACK']._serialized_end=1308
+  _globals['_TMUX']._serialized_start=1311
+  _globals['_TMUX']._serialized_end=1927
 # @@protoc_insertion_point(module_scope)
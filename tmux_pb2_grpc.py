@@ -1,12 +1,32 @@
 # Generated by the gRPC Python protocol compiler plugin. DO NOT EDIT!
 """Client and server classes corresponding to protobuf-defined services."""
 import grpc
+import warnings
 
 from google.protobuf import empty_pb2 as google_dot_protobuf_dot_empty__pb2
 import tmux_pb2 as tmux__pb2
 
+GRPC_GENERATED_VERSION = '1.84.0'
+GRPC_VERSION = grpc.__version__
+_version_not_supported = False
 
-class TmuxStub(object):
+try:
+    from grpc._utilities import first_version_is_lower
+    _version_not_supported = first_version_is_lower(GRPC_VERSION, GRPC_GENERATED_VERSION)
+except ImportError:
+    _version_not_supported = True
+
+if _version_not_supported:
+    raise RuntimeError(
+        f'The grpc package installed is at version {GRPC_VERSION},'
+        + ' but the generated code in tmux_pb2_grpc.py depends on'
+        + f' grpcio>={GRPC_GENERATED_VERSION}.'
+        + f' Please upgrade your grpc module to grpcio>={GRPC_GENERATED_VERSION}'
+        + f' or downgrade your generated code using grpcio-tools<={GRPC_VERSION}.'
+    )
+
+
+class TmuxStub:
     """Missing associated documentation comment in .proto file."""
 
     def __init__(self, channel):
@@ -19,35 +39,45 @@ class TmuxStub(object):
                 '/trackd.Tmux/set_client_for_x_window_id',
                 request_serializer=tmux__pb2.SetClientForXWindowIdRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
         self.clear_client_for_x_window_id = channel.unary_unary(
                 '/trackd.Tmux/clear_client_for_x_window_id',
                 request_serializer=tmux__pb2.ClearClientForXWindowIdRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
         self.client_session_changed = channel.unary_unary(
                 '/trackd.Tmux/client_session_changed',
                 request_serializer=tmux__pb2.ClientSessionChangedRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
         self.client_detached = channel.unary_unary(
                 '/trackd.Tmux/client_detached',
                 request_serializer=tmux__pb2.ClientDetachedRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
         self.session_renamed = channel.unary_unary(
                 '/trackd.Tmux/session_renamed',
                 request_serializer=tmux__pb2.SessionRenamedRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
         self.session_closed = channel.unary_unary(
                 '/trackd.Tmux/session_closed',
                 request_serializer=tmux__pb2.SessionClosedRequest.SerializeToString,
                 response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-                )
+                _registered_method=True)
+        self.sync_state = channel.unary_unary(
+                '/trackd.Tmux/sync_state',
+                request_serializer=tmux__pb2.SyncStateRequest.SerializeToString,
+                response_deserializer=google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+                _registered_method=True)
+        self.relay = channel.stream_stream(
+                '/trackd.Tmux/relay',
+                request_serializer=tmux__pb2.RelayBatch.SerializeToString,
+                response_deserializer=tmux__pb2.RelayAck.FromString,
+                _registered_method=True)
 
 
-class TmuxServicer(object):
+class TmuxServicer:
     """Missing associated documentation comment in .proto file."""
 
     def set_client_for_x_window_id(self, request, context):
@@ -88,6 +118,21 @@ class TmuxServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def sync_state(self, request, context):
+        """Replaces everything known about tmux clients on a host with a snapshot.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def relay(self, request_iterator, context):
+        """A persistent stream of the events above, used by `trackctl relay`.
+        Every batch is acknowledged with the sequence number of its last event.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_TmuxServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -121,14 +166,25 @@ def add_TmuxServicer_to_server(servicer, server):
                     request_deserializer=tmux__pb2.SessionClosedRequest.FromString,
                     response_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
             ),
+            'sync_state': grpc.unary_unary_rpc_method_handler(
+                    servicer.sync_state,
+                    request_deserializer=tmux__pb2.SyncStateRequest.FromString,
+                    response_serializer=google_dot_protobuf_dot_empty__pb2.Empty.SerializeToString,
+            ),
+            'relay': grpc.stream_stream_rpc_method_handler(
+                    servicer.relay,
+                    request_deserializer=tmux__pb2.RelayBatch.FromString,
+                    response_serializer=tmux__pb2.RelayAck.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'trackd.Tmux', rpc_method_handlers)
     server.add_generic_rpc_handlers((generic_handler,))
+    server.add_registered_method_handlers('trackd.Tmux', rpc_method_handlers)
 
 
  # This class is part of an EXPERIMENTAL API.
-class Tmux(object):
+class Tmux:
     """Missing associated documentation comment in .proto file."""
 
     @staticmethod
@@ -142,11 +198,21 @@ class Tmux(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Tmux/set_client_for_x_window_id',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/set_client_for_x_window_id',
             tmux__pb2.SetClientForXWindowIdRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def clear_client_for_x_window_id(request,
@@ -159,11 +225,21 @@ class Tmux(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Tmux/clear_client_for_x_window_id',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/clear_client_for_x_window_id',
             tmux__pb2.ClearClientForXWindowIdRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def client_session_changed(request,
@@ -176,11 +252,21 @@ class Tmux(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Tmux/client_session_changed',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/client_session_changed',
             tmux__pb2.ClientSessionChangedRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def client_detached(request,
@@ -193,11 +279,21 @@ class Tmux(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Tmux/client_detached',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/client_detached',
             tmux__pb2.ClientDetachedRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def session_renamed(request,
@@ -210,11 +306,21 @@ class Tmux(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Tmux/session_renamed',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/session_renamed',
             tmux__pb2.SessionRenamedRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
 
     @staticmethod
     def session_closed(request,
@@ -227,8 +333,72 @@ class Tmux(object):
             wait_for_ready=None,
             timeout=None,
             metadata=None):
-        return grpc.experimental.unary_unary(request, target, '/trackd.Tmux/session_closed',
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/session_closed',
             tmux__pb2.SessionClosedRequest.SerializeToString,
             google_dot_protobuf_dot_empty__pb2.Empty.FromString,
-            options, channel_credentials,
-            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def sync_state(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/trackd.Tmux/sync_state',
+            tmux__pb2.SyncStateRequest.SerializeToString,
+            google_dot_protobuf_dot_empty__pb2.Empty.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def relay(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/trackd.Tmux/relay',
+            tmux__pb2.RelayBatch.SerializeToString,
+            tmux__pb2.RelayAck.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
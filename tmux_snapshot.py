@@ -0,0 +1,85 @@
+"""Builds a snapshot of tmux clients, for the `sync_state` RPC.
+
+Uses one `tmux list-clients` call per tmux server.  X Window IDs are taken
+from the clients' environment: tmux.sh and ssh-to-desktop.sh export them as
+TRACKD_X_WINDOW_ID and LC_TRACKD_X_WINDOW_ID, respectively.
+"""
+import logging
+import os
+import pathlib
+import socket
+import subprocess
+
+from typing import Iterable, List, Optional
+
+import tmux_pb2
+
+
+logger = logging.getLogger(__name__)
+
+
+X_WINDOW_ID_VARIABLES = (b'TRACKD_X_WINDOW_ID', b'LC_TRACKD_X_WINDOW_ID')
+
+PROC = pathlib.Path('/proc')
+
+# Tab-separated, as session names may contain spaces.
+LIST_CLIENTS_FORMAT = '#{client_name}\t#{client_pid}\t#{pid}\t#{session_name}'
+
+
+def server_sockets() -> List[pathlib.Path]:
+    """Returns sockets of the current user's tmux servers."""
+    tmux_tmpdir = os.environ.get('TMUX_TMPDIR', '/tmp')
+    sockets_dir = pathlib.Path(tmux_tmpdir) / f'tmux-{os.getuid()}'
+    if not sockets_dir.is_dir():
+        return []
+    return sorted(path for path in sockets_dir.iterdir() if path.is_socket())
+
+
+def list_clients(server_socket: pathlib.Path) -> List[tmux_pb2.TmuxClientState]:
+    try:
+        output = subprocess.run(
+                ['tmux', '-S', str(server_socket), 'list-clients', '-F', LIST_CLIENTS_FORMAT],
+                check=True, capture_output=True, text=True).stdout
+    except subprocess.CalledProcessError as e:
+        # Most likely a stale socket of a server that's gone.
+        logger.debug('Skipping %s: %s', server_socket, e.stderr.strip())
+        return []
+    except FileNotFoundError:
+        logger.warning('tmux is not installed')
+        return []
+
+    clients = []
+    for line in output.splitlines():
+        client_name, client_pid, server_pid, session_name = line.split('\t', 3)
+        clients.append(tmux_pb2.TmuxClientState(
+            client_name=client_name,
+            server_pid=int(server_pid),
+            session_name=session_name,
+            x_window_id=_get_x_window_id(int(client_pid)) or 0,
+        ))
+    return clients
+
+
+def sync_state_request(
+        server_sockets_: Optional[Iterable[pathlib.Path]] = None) -> tmux_pb2.SyncStateRequest:
+    if server_sockets_ is None:
+        server_sockets_ = server_sockets()
+    request = tmux_pb2.SyncStateRequest(hostname=socket.gethostname())
+    for server_socket in server_sockets_:
+        request.clients.extend(list_clients(server_socket))
+    return request
+
+
+def _get_x_window_id(pid: int) -> Optional[int]:
+    try:
+        environ = (PROC / str(pid) / 'environ').read_bytes()
+    except OSError:
+        return None
+    variables = dict(
+            item.split(b'=', 1) for item in environ.split(b'\0') if b'=' in item)
+    for name in X_WINDOW_ID_VARIABLES:
+        try:
+            return int(variables[name])
+        except (KeyError, ValueError):
+            pass
+    return None
@@ -0,0 +1,86 @@
+import pathlib
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+import tmux_pb2
+import tmux_snapshot
+
+
+class FakeProcTest(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.proc = pathlib.Path(temp_dir.name)
+        patcher = mock.patch.object(tmux_snapshot, 'PROC', self.proc)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def set_environ(self, pid: int, *variables: bytes) -> None:
+        (self.proc / str(pid)).mkdir()
+        (self.proc / str(pid) / 'environ').write_bytes(b'\0'.join(variables) + b'\0')
+
+
+class ListClientsTest(FakeProcTest):
+
+    def list_clients(self, stdout: str):
+        with mock.patch.object(subprocess, 'run', return_value=subprocess.CompletedProcess(
+                args=[], returncode=0, stdout=stdout)) as run:
+            clients = tmux_snapshot.list_clients(pathlib.Path('/tmp/tmux-1000/default'))
+        self.assertEqual(run.call_args.args[0][:3], ['tmux', '-S', '/tmp/tmux-1000/default'])
+        return clients
+
+    def test_parses_clients(self):
+        self.set_environ(100, b'HOME=/home/user', b'TRACKD_X_WINDOW_ID=42')
+
+        clients = self.list_clients('/dev/pts/1\t100\t7\tmy session\twith a tab\n'
+                                    '/dev/pts/2\t101\t7\tother\n')
+
+        self.assertEqual(clients, [
+            tmux_pb2.TmuxClientState(client_name='/dev/pts/1', server_pid=7,
+                                     session_name='my session\twith a tab', x_window_id=42),
+            tmux_pb2.TmuxClientState(client_name='/dev/pts/2', server_pid=7,
+                                     session_name='other'),
+        ])
+
+    def test_no_clients(self):
+        self.assertEqual(self.list_clients(''), [])
+
+    def test_skips_stale_socket(self):
+        error = subprocess.CalledProcessError(
+                1, ['tmux'], stderr='no server running on /tmp/tmux-1000/default\n')
+        with mock.patch.object(subprocess, 'run', side_effect=error):
+            self.assertEqual(
+                    tmux_snapshot.list_clients(pathlib.Path('/tmp/tmux-1000/default')), [])
+
+
+class GetXWindowIdTest(FakeProcTest):
+
+    def test_trackd_x_window_id(self):
+        self.set_environ(100, b'TRACKD_X_WINDOW_ID=42')
+        self.assertEqual(tmux_snapshot._get_x_window_id(100), 42)
+
+    def test_lc_trackd_x_window_id(self):
+        # Passed through SSH, see ssh-to-desktop.sh.
+        self.set_environ(100, b'LC_TRACKD_X_WINDOW_ID=43')
+        self.assertEqual(tmux_snapshot._get_x_window_id(100), 43)
+
+    def test_prefers_trackd_x_window_id(self):
+        self.set_environ(100, b'LC_TRACKD_X_WINDOW_ID=43', b'TRACKD_X_WINDOW_ID=42')
+        self.assertEqual(tmux_snapshot._get_x_window_id(100), 42)
+
+    def test_skips_non_numeric_value(self):
+        self.set_environ(100, b'TRACKD_X_WINDOW_ID=', b'LC_TRACKD_X_WINDOW_ID=43')
+        self.assertEqual(tmux_snapshot._get_x_window_id(100), 43)
+
+        self.set_environ(101, b'TRACKD_X_WINDOW_ID=0x2a')
+        self.assertIsNone(tmux_snapshot._get_x_window_id(101))
+
+    def test_gone_process(self):
+        self.assertIsNone(tmux_snapshot._get_x_window_id(100))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,12 @@
-import datetime
 import unittest
-from unittest import mock
 
-import trackd
+import clock
 from trackd import SpanTracker
-from tmux import TmuxClient, TmuxClientSessionMap, TmuxSession, TmuxAdapter
+from tmux import TmuxClient, TmuxClientSessionMap, TmuxSession, TmuxAdapter, XWindowIdTmuxClientMap
+from x11 import XWindowInfo
+
+
+TERMINAL = XWindowInfo(name='Terminal', wm_class=('gnome-terminal-server', 'Gnome-terminal'))
 
 
 class TmuxClientSessionMapTest(unittest.TestCase):
@@ -42,6 +44,55 @@ class TmuxClientSessionMapTest(unittest.TestCase):
         self.assertNotIn(client_foo, session_map)
         self.assertNotIn(client_bar, session_map)
 
+    def test_session_closed_after_rename(self):
+        session_map = TmuxClientSessionMap()
+        client_foo = TmuxClient(client_name='foo', hostname='host')
+        client_bar = TmuxClient(client_name='bar', hostname='host')
+        old_session = TmuxSession(session_name='old', hostname='host', server_pid=42)
+        new_session = TmuxSession(session_name='new', hostname='host', server_pid=42)
+        session_map[client_foo] = old_session
+        session_map[client_bar] = old_session
+        session_map.session_renamed(client=client_foo, new_session=new_session)
+
+        # Closing the renamed session should detach both clients.
+        session_map.session_closed(new_session)
+
+        self.assertNotIn(client_foo, session_map)
+        self.assertNotIn(client_bar, session_map)
+
+    def test_session_closed_leaves_clients_that_switched_away(self):
+        session_map = TmuxClientSessionMap()
+        client_foo = TmuxClient(client_name='foo', hostname='host')
+        client_bar = TmuxClient(client_name='bar', hostname='host')
+        session = TmuxSession(session_name='session', hostname='host', server_pid=42)
+        other_session = TmuxSession(session_name='other', hostname='host', server_pid=42)
+        session_map[client_foo] = session
+        session_map[client_bar] = session
+        # Switch one of the clients to another session.
+        session_map[client_bar] = other_session
+
+        session_map.session_closed(session)
+
+        self.assertNotIn(client_foo, session_map)
+        self.assertEqual(session_map[client_bar], other_session)
+
+
+class XWindowIdTmuxClientMapTest(unittest.TestCase):
+
+    def test_x_window_ids(self):
+        client_map = XWindowIdTmuxClientMap()
+        client_foo = TmuxClient(client_name='foo', hostname='host')
+        client_bar = TmuxClient(client_name='bar', hostname='host')
+        client_map[1] = client_foo
+        client_map[2] = client_foo
+        client_map[3] = client_bar
+        # Remap an X Window to another client.
+        client_map[2] = client_bar
+        del client_map[3]
+
+        self.assertEqual(client_map.x_window_ids(client_foo), {1})
+        self.assertEqual(client_map.x_window_ids(client_bar), {2})
+
 
 class FakeSpanStorage:
 
@@ -56,17 +107,15 @@ class TmuxAdapterTest(unittest.TestCase):
 
     def setUp(self):
         self.span_storage = FakeSpanStorage()
-        self.span_tracker = SpanTracker(self.span_storage)
+        self.clock = clock.FakeClock()
+        self.span_tracker = SpanTracker(self.span_storage, clock=self.clock)
         self.adapter = TmuxAdapter(self.span_tracker)
-        self.now_patcher = mock.patch.object(trackd, 'now')
-        self.now = self.now_patcher.start()
         self.set_now(0)
 
-    def tearDown(self):
-        self.now_patcher.stop()
-
     def set_now(self, timestamp: int):
-        self.now.return_value = datetime.datetime.fromtimestamp(timestamp)
+        # Messages sent so far are handled at the previous time.
+        self.adapter.process_pending()
+        self.clock.set_timestamp(timestamp)
 
     def test_session_closed(self):
         x_window_id = 42
@@ -74,7 +123,7 @@ class TmuxAdapterTest(unittest.TestCase):
         session = TmuxSession(session_name='session', hostname='host', server_pid=42)
         # Activate a session in the adapter.
         self.set_now(0)
-        self.adapter.set_focused_x_window_id(x_window_id, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
         self.adapter.set_client_for_x_window_id(x_window_id, client)
         self.adapter.client_session_changed(client, session)
 
@@ -83,6 +132,8 @@ class TmuxAdapterTest(unittest.TestCase):
         self.set_now(duration)
         self.adapter.session_closed(session)
 
+        self.adapter.process_pending()
+
         # Check the Span is there, and has the right name and duration.
         self.assertEqual(len(self.span_storage.spans), 1)
         (span,) = self.span_storage.spans
@@ -96,7 +147,7 @@ class TmuxAdapterTest(unittest.TestCase):
         renamed_session = TmuxSession(session_name='renamed_session', hostname='host', server_pid=42)
         # Activate a session in the adapter.
         self.set_now(0)
-        self.adapter.set_focused_x_window_id(x_window_id, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
         self.adapter.set_client_for_x_window_id(x_window_id, client)
         self.adapter.client_session_changed(client, session)
 
@@ -105,6 +156,8 @@ class TmuxAdapterTest(unittest.TestCase):
         self.set_now(duration)
         self.adapter.session_renamed(client, renamed_session)
 
+        self.adapter.process_pending()
+
         # Check the Span is there, and has the right name and duration.
         self.assertEqual(len(self.span_storage.spans), 1)
         (span,) = self.span_storage.spans
@@ -117,7 +170,7 @@ class TmuxAdapterTest(unittest.TestCase):
         session = TmuxSession(session_name='session', hostname='host', server_pid=42)
         # Activate a session in the adapter.
         self.set_now(0)
-        self.adapter.set_focused_x_window_id(x_window_id, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
         self.adapter.set_client_for_x_window_id(x_window_id, client)
         self.adapter.client_session_changed(client, session)
 
@@ -126,6 +179,8 @@ class TmuxAdapterTest(unittest.TestCase):
         self.set_now(duration)
         self.adapter.client_detached(client)
 
+        self.adapter.process_pending()
+
         # Check the Span is there, and has the right name and duration.
         self.assertEqual(len(self.span_storage.spans), 1)
         (span,) = self.span_storage.spans
@@ -139,7 +194,7 @@ class TmuxAdapterTest(unittest.TestCase):
         second_session = TmuxSession(session_name='second_session', hostname='host', server_pid=42)
         # Activate a session in the adapter.
         self.set_now(0)
-        self.adapter.set_focused_x_window_id(x_window_id, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
         self.adapter.set_client_for_x_window_id(x_window_id, client)
         self.adapter.client_session_changed(client, first_session)
 
@@ -148,6 +203,8 @@ class TmuxAdapterTest(unittest.TestCase):
         self.set_now(duration)
         self.adapter.client_session_changed(client, second_session)
 
+        self.adapter.process_pending()
+
         # Check the Span is there, and has the right name and duration.
         self.assertEqual(len(self.span_storage.spans), 1)
         (span,) = self.span_storage.spans
@@ -160,7 +217,7 @@ class TmuxAdapterTest(unittest.TestCase):
         session = TmuxSession(session_name='session', hostname='host', server_pid=42)
         # Activate a session in the adapter.
         self.set_now(0)
-        self.adapter.set_focused_x_window_id(x_window_id, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
         self.adapter.set_client_for_x_window_id(x_window_id, client)
         self.adapter.client_session_changed(client, session)
 
@@ -169,26 +226,79 @@ class TmuxAdapterTest(unittest.TestCase):
         self.set_now(duration)
         self.adapter.clear_client_for_x_window_id(x_window_id)
 
+        self.adapter.process_pending()
+
         # Check the Span is there, and has the right name and duration.
         self.assertEqual(len(self.span_storage.spans), 1)
         (span,) = self.span_storage.spans
         self.assertEqual(span.session, session)
         self.assertEqual((span.end - span.start).total_seconds(), duration)
 
+    def test_set_client_for_x_window_id_drops_stale_x_window(self):
+        stale_x_window_id = 41
+        x_window_id = 42
+        client = TmuxClient(client_name='client', hostname='host')
+        session = TmuxSession(session_name='session', hostname='host', server_pid=42)
+        # The client's tty used to be in another X Window, which has gone
+        # without clearing its mapping.
+        self.adapter.set_client_for_x_window_id(stale_x_window_id, client)
+        self.adapter.set_client_for_x_window_id(x_window_id, client)
+        self.adapter.client_session_changed(client, session)
+
+        # Focusing the stale X Window shouldn't activate the session.
+        self.adapter.set_focused_x_window_id(stale_x_window_id, TERMINAL)
+        self.set_now(120)
+        self.adapter.set_focused_x_window_id(x_window_id - 2, TERMINAL)
+        self.adapter.process_pending()
+
+        self.assertEqual(self.span_storage.spans, [])
+
+    def test_sync_state(self):
+        x_window_id = 42
+        client = TmuxClient(client_name='client', hostname='host')
+        session = TmuxSession(session_name='session', hostname='host', server_pid=42)
+        stale_client = TmuxClient(client_name='stale', hostname='host')
+        remote_client = TmuxClient(client_name='client', hostname='remote')
+        remote_session = TmuxSession(session_name='session', hostname='remote', server_pid=42)
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
+        self.adapter.set_client_for_x_window_id(x_window_id - 1, stale_client)
+        self.adapter.client_session_changed(stale_client, session)
+        self.adapter.set_client_for_x_window_id(x_window_id + 1, remote_client)
+        self.adapter.client_session_changed(remote_client, remote_session)
+
+        # Resync the state of "host", which trackd has missed.
+        self.adapter.sync_state('host', {x_window_id: client}, {client: session})
+        duration = 120
+        self.set_now(duration)
+        self.adapter.set_focused_x_window_id(x_window_id - 1, TERMINAL)
+        self.adapter.process_pending()
+
+        # The synced session was active, and the stale client is gone.
+        (span,) = self.span_storage.spans
+        self.assertEqual(span.session, session)
+        self.assertEqual((span.end - span.start).total_seconds(), duration)
+        self.assertIsNone(self.adapter.snapshot.active_session)
+        # Clients on other hosts are kept.
+        self.adapter.set_focused_x_window_id(x_window_id + 1, TERMINAL)
+        self.adapter.process_pending()
+        self.assertEqual(self.adapter.snapshot.active_session, remote_session)
+
     def test_set_focused_x_window_id(self):
         x_window_id = 42
         client = TmuxClient(client_name='client', hostname='host')
         session = TmuxSession(session_name='session', hostname='host', server_pid=42)
         # Activate a session in the adapter.
         self.set_now(0)
-        self.adapter.set_focused_x_window_id(x_window_id, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id, TERMINAL)
         self.adapter.set_client_for_x_window_id(x_window_id, client)
         self.adapter.client_session_changed(client, session)
 
         # X Window going out of focus should create a Span.
         duration = 120
         self.set_now(duration)
-        self.adapter.set_focused_x_window_id(x_window_id - 1, 'Terminal')
+        self.adapter.set_focused_x_window_id(x_window_id - 1, TERMINAL)
+
+        self.adapter.process_pending()
 
         # Check the Span is there, and has the right name and duration.
         self.assertEqual(len(self.span_storage.spans), 1)
@@ -0,0 +1,145 @@
+"""Per-event tracing, for reconstructing why a span came out the way it did.
+
+Every incoming event (a tmux RPC, a Chrome request, an X focus change, a
+screen lock change) gets a trace ID, and every stage it passes (adapter,
+`SpanTracker`, `SpanWriter`/`SpanStorage`) records the trace ID with a
+monotonic timestamp into a fixed-size ring buffer.
+
+The buffer is preallocated, and recording only stores integers into it.  The
+trace ID travels between threads with the event (see `actor.Actor.send()`),
+and within a thread as the "current" trace ID.
+"""
+import array
+import enum
+import itertools
+import json
+import threading
+import time
+
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+
+class Stage(enum.IntEnum):
+    TMUX_RPC = 1
+    CHROME_REQUEST = 2
+    X_FOCUS = 3
+    SCREEN_LOCK = 4
+    FOCUS_DISPATCH = 5
+    ADAPTER = 6
+    SPAN_EMIT = 7
+    STORAGE_ADD = 8
+    STORAGE_COMMITTED = 9
+
+
+class TraceBuffer:
+
+    def __init__(self, size: int = 1 << 16):
+        self._size = size
+        self._trace_ids = array.array('Q', bytes(8 * size))
+        self._stages = array.array('B', bytes(size))
+        self._labels = array.array('H', bytes(2 * size))
+        self._timestamps = array.array('q', bytes(8 * size))
+        # `next()` on itertools.count is atomic, so no locks are needed.
+        self._next_record = itertools.count()
+        self._next_trace_id = itertools.count(1)
+        self._label_ids: Dict[str, int] = {'': 0}
+        self._label_names: List[str] = ['']
+        self._label_lock = threading.Lock()
+        self._local = threading.local()
+
+    def new_trace(self, stage: Stage, label: int = 0) -> int:
+        """Starts a new trace, and makes it the current one."""
+        trace_id = next(self._next_trace_id)
+        self._local.trace_id = trace_id
+        self.record(trace_id, stage, label)
+        return trace_id
+
+    def current(self) -> int:
+        """Returns the current thread's trace ID, 0 if there is none."""
+        return getattr(self._local, 'trace_id', 0)
+
+    def set_current(self, trace_id: int) -> None:
+        self._local.trace_id = trace_id
+
+    def label(self, name: str) -> int:
+        """Returns an ID for a label, e.g. an RPC name."""
+        try:
+            return self._label_ids[name]
+        except KeyError:
+            pass
+        with self._label_lock:
+            if name not in self._label_ids:
+                self._label_ids[name] = len(self._label_names)
+                self._label_names.append(name)
+            return self._label_ids[name]
+
+    def record(self, trace_id: int, stage: Stage, label: int = 0) -> None:
+        if not trace_id:
+            return
+        i = next(self._next_record) % self._size
+        self._trace_ids[i] = trace_id
+        self._stages[i] = stage
+        self._labels[i] = label
+        self._timestamps[i] = time.monotonic_ns()
+
+    def last(self, n: int) -> List[Mapping]:
+        """Returns the last `n` records, oldest first."""
+        # Taking a slot is the only way to read the counter.  Clear the slot,
+        # so it doesn't show a record from the previous lap later.
+        end = next(self._next_record)
+        self._stages[end % self._size] = 0
+        n = min(n, end, self._size - 1)
+        records = []
+        for i in range(end - n, end):
+            i %= self._size
+            if not self._stages[i]:
+                continue
+            records.append({
+                'trace_id': self._trace_ids[i],
+                'stage': Stage(self._stages[i]).name.lower(),
+                'label': self._label_names[self._labels[i]],
+                'timestamp_ns': self._timestamps[i],
+            })
+        return records
+
+
+TRACE = TraceBuffer()
+
+
+def to_chrome_trace(records: Iterable[Mapping]) -> Mapping:
+    """Converts records to the Chrome trace event format.
+
+    Every trace is a row, with a slice per stage, lasting until the next
+    stage of the trace.  Open it in chrome://tracing or Perfetto.
+    """
+    by_trace: Dict[int, List[Mapping]] = {}
+    for record in records:
+        by_trace.setdefault(record['trace_id'], []).append(record)
+
+    events = []
+    for trace_id, trace_records in by_trace.items():
+        trace_records.sort(key=lambda record: record['timestamp_ns'])
+        for record, next_record in itertools.zip_longest(trace_records, trace_records[1:]):
+            name = record['stage']
+            if record['label']:
+                name += f' {record["label"]}'
+            event = {
+                'name': name,
+                'pid': 1,
+                'tid': trace_id,
+                'ts': record['timestamp_ns'] / 1000,
+            }
+            if next_record is None:
+                event['ph'] = 'i'
+                event['s'] = 't'
+            else:
+                event['ph'] = 'X'
+                event['dur'] = (next_record['timestamp_ns'] - record['timestamp_ns']) / 1000
+            events.append(event)
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def handle_debug_trace(query: Mapping[str, List[str]]) -> Tuple[str, bytes]:
+    """Admin server handler, returns the last `last` records as JSON."""
+    last = int(query.get('last', ['500'])[0])
+    return 'application/json', json.dumps(TRACE.last(last)).encode('utf-8')
@@ -0,0 +1,96 @@
+import threading
+import unittest
+
+import chrome
+import events
+import trackd
+import tracing
+from tracing import Stage
+
+
+class TraceBufferTest(unittest.TestCase):
+
+    def test_last_returns_records_oldest_first(self):
+        buffer = tracing.TraceBuffer(size=16)
+        trace_id = buffer.new_trace(Stage.TMUX_RPC, buffer.label('session_closed'))
+        buffer.record(trace_id, Stage.ADAPTER)
+
+        records = buffer.last(10)
+
+        self.assertEqual([(r['trace_id'], r['stage'], r['label']) for r in records], [
+            (trace_id, 'tmux_rpc', 'session_closed'),
+            (trace_id, 'adapter', ''),
+        ])
+        self.assertLessEqual(records[0]['timestamp_ns'], records[1]['timestamp_ns'])
+
+    def test_wraps_around(self):
+        buffer = tracing.TraceBuffer(size=8)
+        for trace_id in range(1, 21):
+            buffer.record(trace_id, Stage.X_FOCUS)
+
+        records = buffer.last(100)
+
+        self.assertEqual([r['trace_id'] for r in records], list(range(14, 21)))
+        buffer.record(21, Stage.X_FOCUS)
+        self.assertEqual([r['trace_id'] for r in buffer.last(100)], list(range(16, 22)))
+
+    def test_doesnt_record_without_trace(self):
+        buffer = tracing.TraceBuffer(size=8)
+        buffer.record(buffer.current(), Stage.SPAN_EMIT)
+        self.assertEqual(buffer.last(10), [])
+
+    def test_current_is_per_thread(self):
+        buffer = tracing.TraceBuffer(size=8)
+        trace_id = buffer.new_trace(Stage.X_FOCUS)
+        other = []
+        thread = threading.Thread(target=lambda: other.append(buffer.current()))
+        thread.start()
+        thread.join()
+        self.assertEqual(buffer.current(), trace_id)
+        self.assertEqual(other, [0])
+
+
+class ToChromeTraceTest(unittest.TestCase):
+
+    def test_slices_last_until_next_stage(self):
+        records = [
+            {'trace_id': 1, 'stage': 'tmux_rpc', 'label': 'client_detached', 'timestamp_ns': 1000},
+            {'trace_id': 2, 'stage': 'x_focus', 'label': '', 'timestamp_ns': 1500},
+            {'trace_id': 1, 'stage': 'adapter', 'label': '', 'timestamp_ns': 3000},
+        ]
+        events = tracing.to_chrome_trace(records)['traceEvents']
+        self.assertEqual(events, [
+            {'name': 'tmux_rpc client_detached', 'pid': 1, 'tid': 1, 'ts': 1.0,
+             'ph': 'X', 'dur': 2.0},
+            {'name': 'adapter', 'pid': 1, 'tid': 1, 'ts': 3.0, 'ph': 'i', 's': 't'},
+            {'name': 'x_focus', 'pid': 1, 'tid': 2, 'ts': 1.5, 'ph': 'i', 's': 't'},
+        ])
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_trace_follows_event_to_storage(self):
+        span_storage = trackd.SpanStorage(':memory:')
+        span_writer = trackd.SpanWriter(span_storage)
+        writer_thread = threading.Thread(target=span_writer.run, daemon=True)
+        writer_thread.start()
+        adapter = chrome.ChromeAdapter(trackd.SpanTracker(span_writer))
+        adapter.set_focused_x_window_id(1, events.XWindowInfo(
+            name='', wm_class=('google-chrome', 'Google-chrome')))
+        adapter.set_active_window('user', 1)
+        adapter.set_session_for_window_id('user', 1, 'project')
+        adapter.process_pending()
+
+        trace_id = tracing.TRACE.new_trace(Stage.CHROME_REQUEST)
+        adapter.set_session_for_window_id('user', 1, 'other project')
+        tracing.TRACE.set_current(0)
+        adapter.process_pending()
+        span_writer.close(timeout=10)
+
+        stages = [r['stage'] for r in tracing.TRACE.last(1000) if r['trace_id'] == trace_id]
+        self.assertEqual(stages, [
+            'chrome_request', 'adapter', 'span_emit', 'storage_add', 'storage_committed'])
+
+
+if __name__ == '__main__':
+    unittest.main()
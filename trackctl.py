@@ -1,11 +1,25 @@
+import collections
+import contextlib
+import json
+import logging
+import math
+import os
+import pathlib
+import sqlite3
+import threading
+import urllib.parse
+import urllib.request
+
 import click
-import grpc
 
-import tmux_pb2
-import tmux_pb2_grpc
+import admin
+import metrics
+import timeline
+import tracing
 
 
-SERVER = 'localhost:3141'
+# trackd's gRPC address, e.g. for hooks of a test tmux server.
+SERVER = os.environ.get('TRACKD_SERVER', 'localhost:3141')
 
 
 @click.group()
@@ -13,6 +27,16 @@ def cli():
     pass
 
 
+@contextlib.contextmanager
+def _tmux_stub():
+    # gRPC takes a while to import; only import it for commands that need it.
+    import grpc
+    import tmux_pb2_grpc
+
+    with grpc.insecure_channel(SERVER) as channel:
+        yield tmux_pb2_grpc.TmuxStub(channel)
+
+
 @cli.group()
 def tmux():
     pass
@@ -23,8 +47,9 @@ def tmux():
 @click.option('--client_name', required=True)
 @click.option('--x_window_id', type=int, required=True)
 def set_client_for_x_window_id(hostname, client_name, x_window_id):
-    with grpc.insecure_channel(SERVER) as channel:
-        stub = tmux_pb2_grpc.TmuxStub(channel)
+    import tmux_pb2
+
+    with _tmux_stub() as stub:
         response = stub.set_client_for_x_window_id(
                 tmux_pb2.SetClientForXWindowIdRequest(
                     hostname=hostname,
@@ -37,8 +62,9 @@ def set_client_for_x_window_id(hostname, client_name, x_window_id):
 @tmux.command()
 @click.option('--x_window_id', type=int, required=True)
 def clear_client_for_x_window_id(x_window_id):
-    with grpc.insecure_channel(SERVER) as channel:
-        stub = tmux_pb2_grpc.TmuxStub(channel)
+    import tmux_pb2
+
+    with _tmux_stub() as stub:
         response = stub.clear_client_for_x_window_id(
                 tmux_pb2.ClearClientForXWindowIdRequest(
                     x_window_id=x_window_id,
@@ -52,8 +78,9 @@ def clear_client_for_x_window_id(x_window_id):
 @click.option('--server_pid', type=int, required=True)
 @click.option('--session_name', required=True)
 def client_session_changed(hostname, client_name, server_pid, session_name):
-    with grpc.insecure_channel(SERVER) as channel:
-        stub = tmux_pb2_grpc.TmuxStub(channel)
+    import tmux_pb2
+
+    with _tmux_stub() as stub:
         response = stub.client_session_changed(
                 tmux_pb2.ClientSessionChangedRequest(
                     hostname=hostname,
@@ -68,12 +95,13 @@ def client_session_changed(hostname, client_name, server_pid, session_name):
 @click.option('--hostname', required=True)
 @click.option('--client_name')
 def client_detached(hostname, client_name):
+    import tmux_pb2
+
     if not client_name:
         # If a client exists because a session is closed, client-detached hook
         # can't expand #{client_name} for some reason.
         return
-    with grpc.insecure_channel(SERVER) as channel:
-        stub = tmux_pb2_grpc.TmuxStub(channel)
+    with _tmux_stub() as stub:
         response = stub.client_detached(
                 tmux_pb2.ClientDetachedRequest(
                     hostname=hostname,
@@ -88,8 +116,9 @@ def client_detached(hostname, client_name):
 @click.option('--server_pid', type=int, required=True)
 @click.option('--new_session_name', required=True)
 def session_renamed(hostname, client_name, server_pid, new_session_name):
-    with grpc.insecure_channel(SERVER) as channel:
-        stub = tmux_pb2_grpc.TmuxStub(channel)
+    import tmux_pb2
+
+    with _tmux_stub() as stub:
         response = stub.session_renamed(
                 tmux_pb2.SessionRenamedRequest(
                     hostname=hostname,
@@ -105,8 +134,9 @@ def session_renamed(hostname, client_name, server_pid, new_session_name):
 @click.option('--server_pid', type=int, required=True)
 @click.option('--session_name', required=True)
 def session_closed(hostname, server_pid, session_name):
-    with grpc.insecure_channel(SERVER) as channel:
-        stub = tmux_pb2_grpc.TmuxStub(channel)
+    import tmux_pb2
+
+    with _tmux_stub() as stub:
         response = stub.session_closed(
                 tmux_pb2.SessionClosedRequest(
                     hostname=hostname,
@@ -116,5 +146,244 @@ def session_closed(hostname, server_pid, session_name):
         )
 
 
+@tmux.command()
+@click.option('--socket', 'sockets', multiple=True, type=click.Path(exists=True),
+              help="tmux server socket.  All of the user's servers by default.")
+def resync(sockets):
+    """Sends all the tmux clients and their sessions to trackd at once."""
+    import tmux_snapshot
+
+    if sockets:
+        request = tmux_snapshot.sync_state_request([pathlib.Path(s) for s in sockets])
+    else:
+        request = tmux_snapshot.sync_state_request()
+    with _tmux_stub() as stub:
+        response = stub.sync_state(request)
+
+
+@cli.command(name='relay')
+@click.option('--socket', 'socket_path', type=click.Path(),
+              help='Unix datagram socket to get events from hooks on.  '
+                   '$XDG_RUNTIME_DIR/trackd-relay.sock by default.')
+@click.option('--server', default=SERVER, help='trackd address.')
+def run_relay(socket_path, server):
+    """Forwards tmux hook events to trackd over a persistent stream."""
+    import relay
+
+    logging.basicConfig(level=logging.INFO)
+    if socket_path is None:
+        socket_path = relay.DEFAULT_SOCKET
+    relay_ = relay.Relay(server=server)
+    forward_thread = threading.Thread(target=relay_.forward, daemon=True)
+    forward_thread.start()
+    relay_.serve(pathlib.Path(socket_path))
+
+
+@cli.command()
+@click.option('--port', default=admin.DEFAULT_PORT, help="trackd's admin port.")
+@click.option('--raw', is_flag=True, help='Print metrics in the Prometheus text format.')
+def stats(port, raw):
+    """Prints trackd metrics."""
+    with urllib.request.urlopen(f'http://localhost:{port}/metrics') as response:
+        text = response.read().decode('utf-8')
+    if raw:
+        click.echo(text, nl=False)
+        return
+
+    buckets = collections.defaultdict(list)
+    sums = {}
+    for name, labels, value in metrics.parse(text):
+        if name.endswith('_bucket'):
+            le = float(labels.pop('le'))
+            key = (name[:-len('_bucket')], tuple(sorted(labels.items())))
+            buckets[key].append((le, value))
+        elif name.endswith('_sum'):
+            sums[(name[:-len('_sum')], tuple(sorted(labels.items())))] = value
+        elif name.endswith('_count'):
+            pass
+        else:
+            click.echo(f'{_format_metric(name, labels.items())} {value:g}')
+
+    for key, histogram in buckets.items():
+        name, labels = key
+        count = max(count for _, count in histogram)
+        if not count:
+            continue
+        mean = sums[key] / count
+        p50 = metrics.quantile(.5, histogram)
+        p99 = metrics.quantile(.99, histogram)
+        click.echo(f'{_format_metric(name, labels)} count={count:g} '
+                   f'mean={_format_seconds(mean)} p50={_format_seconds(p50)} '
+                   f'p99={_format_seconds(p99)}')
+
+
+@cli.command()
+@click.option('--db', default='spans.db', type=click.Path(exists=True, dir_okay=False),
+              help='Database with the event log.')
+@click.option('--output', required=True, type=click.Path(dir_okay=False),
+              help='New database, a copy of --db with spans derived again.')
+def rederive(db, output):
+    """Derives spans from the event log again, e.g. after an adapter fix."""
+    import event_log
+    import reducer
+    import storage
+
+    if pathlib.Path(output).exists():
+        raise click.UsageError(f'{output} already exists')
+    with sqlite3.connect(db) as source, sqlite3.connect(output) as copy:
+        source.backup(copy)
+        copy.execute('DELETE FROM spans')
+        # Spans replicated from other trackds aren't in the event log, so
+        # they're gone too.  Forgets the origins' high-water marks with
+        # them, so origins send the spans again once it's put in place.
+        # The timeline was resolved from the old spans.
+        for table in ('replication', 'timeline'):
+            if copy.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (table,)).fetchone():
+                copy.execute(f'DELETE FROM {table}')
+    n_events = reducer.derive_spans(event_log.EventLog(output), storage.SpanStorage(output))
+    click.echo(f'Replayed {n_events} events into {output}; '
+               f'run "trackctl timeline --db {output}" to resolve its timeline again')
+
+
+@cli.command()
+@click.argument('time', nargs=-1, required=True)
+@click.option('--until', help='End of a window to list spans in, instead of a point in time.')
+@click.option('--db', default='spans.db', type=click.Path(exists=True, dir_okay=False))
+def at(time, until, db):
+    """Prints what was going on at TIME, e.g. "14:35" or "last tue 14:35"."""
+    import clock
+    import storage
+    import time_utils
+
+    now = clock.SYSTEM.now()
+    try:
+        start = time_utils.parse_time(' '.join(time), now)
+        end = time_utils.parse_time(until, now) if until else None
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    span_storage = storage.SpanStorage(db, read_only=True)
+    spans = span_storage.overlapping(start, end) if end else span_storage.at(start)
+    for span in spans:
+        session = span.session
+        where = getattr(session, 'hostname', None) or getattr(session, 'user', '')
+        click.echo(f'{span.start:%a %b %d %H:%M:%S}–{span.end:%H:%M:%S} '
+                   f'{session.session_name} ({session.__class__.__name__}, {where})')
+
+
+@cli.command(context_settings={'ignore_unknown_options': True, 'help_option_names': []})
+@click.option('--db', 'db_paths', multiple=True,
+              help='trackd database, or a directory of them.  Can be repeated.')
+@click.argument('args', nargs=-1, type=click.UNPROCESSED)
+def query(db_paths, args):
+    """Time per group of dimensions, e.g. --group-by week,host --bucket 1h.
+
+    Runs `reports.py query`, with reports' other options from ~/trackctl.conf.
+    """
+    import reports
+
+    reports_args = [arg for db_path in db_paths for arg in ('--db', db_path)]
+    reports.cli.main([*reports_args, 'query', *args], prog_name='trackctl')
+
+
+@cli.command(name='timeline')
+@click.option('--db', default='spans.db', type=click.Path(exists=True, dir_okay=False))
+@click.option('--policy', type=click.Choice(list(timeline.POLICIES)),
+              default='latest', help='Which of overlapping spans to keep, see timeline.py.')
+def materialize_timeline(db, policy):
+    """Saves spans with overlaps resolved into the timeline table."""
+    import storage
+
+    span_storage = storage.SpanStorage(db)
+    timeline.materialize(span_storage, timeline.POLICIES[policy])
+
+
+@cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--speed', default=0.0,
+              help='Relative to the recorded speed, e.g. 1 or 10.  0 is as fast as possible.')
+@click.option('--spans', 'show_spans', is_flag=True, help='Print the derived spans.')
+@click.option('--state', 'show_state', is_flag=True, help="Print the adapters' final state.")
+def replay(path, speed, show_spans, show_state):
+    """Replays a recording (see recording.py) into fresh adapters."""
+    import recording
+    import reducer
+    import storage
+
+    span_storage = storage.SpanStorage(':memory:')
+    reducer_ = reducer.Reducer(span_storage)
+    replay_stats = recording.replay(recording.read(path), reducer_.handle, speed=speed)
+
+    click.echo(f'{replay_stats.events} events ({replay_stats.skipped} skipped), '
+               f'{_format_seconds(replay_stats.busy)} busy, '
+               f'{replay_stats.events / replay_stats.busy if replay_stats.busy else 0:.0f} events/s')
+    for message_type, latencies in sorted(replay_stats.latencies.items()):
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * .99))]
+        click.echo(f'  {message_type:<26} count={len(latencies)} p50={_format_seconds(p50)} '
+                   f'p99={_format_seconds(p99)} max={_format_seconds(latencies[-1])}')
+    if show_spans:
+        for span in span_storage.query():
+            click.echo(span)
+    if show_state:
+        for source, adapter in reducer_.adapters.items():
+            click.echo(f'{source}: {adapter.snapshot!r}')
+
+
+@cli.group()
+def debug():
+    """Looks into a running trackd."""
+
+
+@debug.command()
+@click.option('--port', default=admin.DEFAULT_PORT, help="trackd's admin port.")
+@click.option('--last', default=500, help='Number of trace records to dump.')
+@click.option('--format', 'output_format', type=click.Choice(['json', 'chrome']), default='json',
+              help='"chrome" is the trace event format, for chrome://tracing or Perfetto.')
+def trace(port, last, output_format):
+    """Dumps the last traced events."""
+    url = f'http://localhost:{port}/debug/trace?last={last}'
+    with urllib.request.urlopen(url) as response:
+        records = json.load(response)
+    if output_format == 'chrome':
+        click.echo(json.dumps(tracing.to_chrome_trace(records)))
+    else:
+        for record in records:
+            click.echo(json.dumps(record))
+
+
+@debug.command()
+@click.option('--port', default=admin.DEFAULT_PORT, help="trackd's admin port.")
+@click.option('--seconds', default=30.0, help='How long to sample for.')
+@click.option('--mode', type=click.Choice(['wall', 'cpu']), default='wall',
+              help='"cpu" only counts samples of running threads.')
+@click.option('--format', 'output_format', type=click.Choice(['collapsed', 'pstats']),
+              default='collapsed',
+              help='"collapsed" is for flamegraph.pl or speedscope, "pstats" for pstats/snakeviz.')
+@click.option('-o', '--output', type=click.File('wb'), default='-')
+def profile(port, seconds, mode, output_format, output):
+    """Profiles all of trackd's threads."""
+    query = urllib.parse.urlencode({'seconds': seconds, 'mode': mode, 'format': output_format})
+    url = f'http://localhost:{port}/debug/profile?{query}'
+    with urllib.request.urlopen(url, timeout=seconds + 30) as response:
+        output.write(response.read())
+
+
+def _format_metric(name, labels) -> str:
+    if not labels:
+        return name
+    return name + '{' + ','.join(f'{k}={v}' for k, v in labels) + '}'
+
+
+def _format_seconds(seconds: float) -> str:
+    if math.isnan(seconds):
+        return '-'
+    if seconds < 1e-3:
+        return f'{seconds * 1e6:.0f}µs'
+    if seconds < 1:
+        return f'{seconds * 1e3:.1f}ms'
+    return f'{seconds:.2f}s'
+
+
 if __name__ == '__main__':
     cli()
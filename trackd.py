@@ -4,60 +4,80 @@ Main classes:
     - Span: a span of work.  Consists of a "session" name -- any project or activity,
       and start/end times.  Every time you switch from a Chrome window marked as
       belonging to a project to something else, a new `Span` is saved to the storage.
-    - SpanStorage: has an `add(Span)` method and a `query()` method.
+    - SpanStorage: has an `add(Span)` method and a `query()` method.  `Span` and
+      `SpanStorage` live in storage.py, which doesn't need the daemon's dependencies.
     - SpanTracker: the object that knows the name of the active session, and that is
       being notified when the active session changes.  When that happens, creates
       a new `Span` and saves it into `SpanStorage`.
+    - EventLog: the raw events (messages to adapters) behind spans.  Spans can be
+      derived from it again (see reducer.py).
+    - SpanWriter: sits between `SpanTracker`s and `SpanStorage`, and saves spans
+      on its own thread, so trackers never wait for the database.
     - (Chrome|Tmux)Adapter: get notified when, respectively, a Chrome window tagged,
       with a tab group or a tmux session chages, and notifies a `SpanTracker`.
+      Adapters are actors (see actor.py): notifications are queued, and handled
+      on the adapter's own thread.
+
+Adapters are set up by sources (see sources.py), which are plugins: only the
+enabled ones get imported and started.
 
 ChromeAdapter is using a web server that gets HTTP requests from a special Chrome
 extension when a Chrome window gets or loses focus.
 
 TmuxAdapter is using a gRPC server that gets called from tmux hooks.  Plus it
 watches for X Windows focused window to track when a terminal with tmux is in
-focus.
+focus: the x11 source publishes focus changes on the event bus.
 """
 from dataclasses import dataclass
-from concurrent import futures
-import datetime
 import logging
+import logging.handlers
 import pathlib
-import sqlite3
+import signal
+import socket
 import threading
 
-from typing import Iterable, Optional
+from typing import Iterable, List, Optional, Union
 
-import absl.logging
-import grpc
-import tzlocal
+import click
 
-import chrome
-import tmux
-import tmux_pb2_grpc
-import x11
+import actor
+import admin
+import clock
+import event_log
+import logs
+import metrics
+import profiler
+import recording
+import sources
+import tracing
+import writer
+from storage import Span, SpanStorage
+from tracing import TRACE, Stage
 
 
-@dataclass(frozen=True)
-class Span:
-    session: object
-    start: datetime.datetime
-    end: datetime.datetime
+# Not `__name__`, which is "__main__" when run as a script.
+logger = logging.getLogger('trackd')
+
 
-    def __repr__(self):
-        return f'{self.__class__.__name__}(session={self.session!r}, start={self.start}, end={self.end})'
+DEFAULT_PORT = 3141
 
 
-def now() -> datetime.datetime:
-    return datetime.datetime.now(tzlocal.get_localzone())
+SPANS_EMITTED = metrics.Counter(
+        'trackd_spans_emitted_total', 'Spans emitted, per session type.', ['session_type'])
+SPAN_WRITER = metrics.Gauge(
+        'trackd_span_writer', 'SpanWriter queue statistics, see SpanWriterStats.', ['stat'])
+ACTOR_INBOX_SIZE = metrics.Gauge(
+        'trackd_actor_inbox_size', 'Messages waiting in actor inboxes.', ['actor'])
 
 
 class SpanTracker:
 
-    def __init__(self, span_storage: 'SpanStorage'):
+    def __init__(self, span_storage: 'Union[SpanStorage, SpanWriter]',
+                 clock: clock.Clock = clock.SYSTEM):
         self._active_session: Optional[object] = None
-        self._active_session_start: Optional[datetime.datetime] = None
+        self._active_session_start: 'Optional[clock.Instant]' = None
         self._span_storage = span_storage
+        self._clock = clock
 
     def update_active_session(self, session) -> None:
         if self._active_session == session:
@@ -67,155 +87,253 @@ class SpanTracker:
             self._emit()
 
         self._active_session = session
-        self._active_session_start = now()
+        self._active_session_start = self._clock.instant()
 
     def _emit(self) -> None:
         span = self._make_span()
-        logging.info('Emmiting %r', span)
+        logger.info('Emmiting %r', span)
+        SPANS_EMITTED.inc(span.session.__class__.__name__)
+        TRACE.record(TRACE.current(), Stage.SPAN_EMIT)
         self._span_storage.add(span)
 
     def _make_span(self) -> Span:
         assert self._active_session is not None
         assert self._active_session_start is not None
         return Span(
-                start=self._active_session_start,
-                end=now(),
+                start=self._active_session_start.wall,
+                end=self._clock.since(self._active_session_start),
                 session=self._active_session,
         )
 
 
-class SpanStorage:
+@dataclass(frozen=True)
+class SpanWriterStats:
+    queue_depth: int
+    max_queue_depth: int
+    enqueued: int
+    written: int
+    dropped: int
+    failed: int
 
-    def __init__(self, db_path: str):
-        self._connect(db_path)
-        self._lock = threading.Lock()
 
-    def _connect(self, db_path: str) -> None:
-        do_init = db_path == ':memory:' or not pathlib.Path(db_path).exists()
-        self._conn = sqlite3.connect(
-                db_path, detect_types=sqlite3.PARSE_DECLTYPES,  check_same_thread=False)
+class SpanWriter:
+    """Saves spans into a `SpanStorage` on a dedicated thread.
 
-        if do_init:
-            self._init_db()
+    `add()` never blocks: spans go into a bounded queue, and if the queue is
+    full (i.e. the storage is stuck) the span is dropped and counted.
+    """
 
-    def _init_db(self) -> None:
-        c = self._conn.cursor()
-        c.execute("""
-        CREATE TABLE spans (
-            session_type text,
-            session_name text,
-            hostname text,
-            server_pid int,
-            user text,
-            start timestamp,
-            end timestamp
-        )
-        """)
-        self._conn.commit()
+    def __init__(self, span_storage: 'SpanStorage', max_queue_size: int = 10000):
+        self._span_storage = span_storage
+        self._writer = writer.QueueWriter(self._write, max_queue_size)
+        self._stats_lock = threading.Lock()
+        self._max_queue_depth = 0
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
 
     def add(self, span: Span) -> None:
-        with self._lock:
-            c = self._conn.cursor()
-            c.execute("""
-                INSERT INTO spans (
-                    session_type,
-                    session_name,
-                    hostname,
-                    server_pid,
-                    user,
-                    start,
-                    end
-                ) VALUES (
-                    ?,
-                    ?,
-                    ?,
-                    ?,
-                    ?,
-                    ?,
-                    ?
-                )
-            """, (span.session.__class__.__name__,
-                  span.session.session_name,
-                  getattr(span.session, 'hostname', None),
-                  getattr(span.session, 'server_pid', None),
-                  getattr(span.session, 'user', None),
-                  span.start.astimezone(datetime.timezone.utc),
-                  span.end.astimezone(datetime.timezone.utc)))
-            self._conn.commit()
-
-    def query(self) -> Iterable[Span]:
-        c = self._conn.cursor()
-        for row in c.execute(
-                "SELECT session_type, session_name, hostname, server_pid, user, start, end FROM spans"):
-            session_type, session_name, hostname, server_pid, user, start, end = row
-
-            if session_type == 'ChromeSession':
-                session = chrome.ChromeSession(session_name=session_name, user=user)
-            elif session_type == 'TmuxSession':
-                session = tmux.TmuxSession(
-                        session_name=session_name,
-                        hostname=hostname, server_pid=server_pid)
+        if not self._writer.put((TRACE.current(), span)):
+            with self._stats_lock:
+                self._dropped += 1
+            logger.error('Span queue is full, dropping %r', span)
+            return
+        with self._stats_lock:
+            self._enqueued += 1
+            self._max_queue_depth = max(self._max_queue_depth, self._writer.qsize())
+
+    def run(self) -> None:
+        self._writer.run()
+
+    def _write(self, batch) -> None:
+        for trace_id, span in batch:
+            TRACE.set_current(trace_id)
+            try:
+                self._span_storage.add(span)
+            except Exception:
+                logger.exception('Failed to save %r', span)
+                with self._stats_lock:
+                    self._failed += 1
             else:
-                raise RuntimeError(f'Invalid session_type: {session_type!r}')
-
-            # TODO: Do these data manipulations in converters and adapters.
-            start = start.replace(tzinfo=datetime.timezone.utc)
-            start = start.astimezone(tzlocal.get_localzone())
-            end = end.replace(tzinfo=datetime.timezone.utc)
-            end = end.astimezone(tzlocal.get_localzone())
-
-            yield Span(session=session, start=start, end=end)
-
+                with self._stats_lock:
+                    self._written += 1
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Saves all the queued spans and stops `run()`, waiting up to `timeout`."""
+        if not self._writer.close(timeout):
+            logger.error('Timed out saving spans, %d left unsaved', self._writer.qsize())
+        logger.info('%r', self.stats())
+
+    def stats(self) -> SpanWriterStats:
+        with self._stats_lock:
+            return SpanWriterStats(
+                    queue_depth=self._writer.qsize(),
+                    max_queue_depth=self._max_queue_depth,
+                    enqueued=self._enqueued,
+                    written=self._written,
+                    dropped=self._dropped,
+                    failed=self._failed,
+            )
+
+
+def setup_metrics(span_writer: SpanWriter, actors: Iterable[actor.Actor]) -> None:
+    for stat in SpanWriterStats.__dataclass_fields__:
+        SPAN_WRITER.set_function(
+                lambda stat=stat: getattr(span_writer.stats(), stat), stat)
+    for actor_ in actors:
+        ACTOR_INBOX_SIZE.set_function(actor_.inbox_size, actor_.__class__.__name__)
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    import absl.logging
 
-def setup_logging():
     handler = logging.StreamHandler()
     handler.setFormatter(absl.logging.PythonFormatter())
-    root_logger = logging.getLogger()
-    root_logger.addHandler(handler)
-    root_logger.setLevel(logging.DEBUG)
-
-    class Filter():
-
-        def filter(self, record):
-            return 'site-packages' not in record.pathname
-
-    handler.addFilter(Filter())
-
-
-def main():
-    setup_logging()
-
-    x_window_focus_tracker = x11.XWindowFocusTracker()
-    x_thread = threading.Thread(target=x_window_focus_tracker.run, daemon=True)
-    x_thread.start()
-
-    span_storage = SpanStorage('spans.db')
-    # We can't use the same tracker for both tmux and chrome.
-    # Otherwise, when e.g. focus is changed from chrome to terminal, it's
-    # possible that TmuxAdapter will get notified before ChromeAdapter;
-    # then TmuxAdapter will set the active span to current tmux session, just
-    # before ChromeAdapter sets the active span to None.
-    chrome_span_tracker = SpanTracker(span_storage)
-    tmux_span_tracker = SpanTracker(span_storage)
-
-    chrome_adapter = chrome.ChromeAdapter(chrome_span_tracker)
-    x_window_focus_tracker.register(chrome_adapter.set_focused_x_window_id)
-    chrome_http = chrome.Chrome(chrome_adapter)
-    chrome_thread = threading.Thread(target=chrome.serve, kwargs={
-        'chrome_http': chrome_http,
-        'port': 3142,
-    }, daemon=True)
-    chrome_thread.start()
-
-    tmux_adapter = tmux.TmuxAdapter(tmux_span_tracker)
-    x_window_focus_tracker.register(tmux_adapter.set_focused_x_window_id)
-    tmux_servicer = tmux.Tmux(tmux_adapter)
-
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=10))
-    tmux_pb2_grpc.add_TmuxServicer_to_server(tmux_servicer, server)
-    server.add_insecure_port('[::]:3141')
-    server.start()
-    server.wait_for_termination()
+    return logs.setup(handler)
+
+
+class Trackd:
+    """trackd's sources, storage and servers, for running it in-process.
+
+    `main()` runs one until SIGTERM; benchmarks and tests can run their own,
+    on other ports, with another database.
+    """
+
+    def __init__(self, db_path: str = 'spans.db', port: int = DEFAULT_PORT,
+                 admin_port: int = admin.DEFAULT_PORT,
+                 config: Optional[sources.Config] = None,
+                 grpc_workers: Optional[int] = None,
+                 max_concurrent_rpcs: Optional[int] = None,
+                 max_pending_rpcs: Optional[int] = None,
+                 replicate_to: Optional[str] = None,
+                 origin: Optional[str] = None,
+                 accept_replication: bool = False):
+        """The gRPC server's options are passed to `rpc.make_server()`.
+
+        With `replicate_to`, spans are replicated to the central trackd at that
+        address, as `origin` (the hostname by default); with
+        `accept_replication`, this is the central trackd.  See replication.py.
+        """
+        self._db_path = db_path
+        self._port = port
+        self._admin_port = admin_port
+        self._grpc_options = {'max_concurrent_rpcs': max_concurrent_rpcs}
+        if grpc_workers is not None:
+            self._grpc_options['max_workers'] = grpc_workers
+        if max_pending_rpcs is not None:
+            self._grpc_options['max_pending_rpcs'] = max_pending_rpcs
+        self._replicate_to = replicate_to
+        self._origin = origin if origin is not None else socket.gethostname()
+        self._accept_replication = accept_replication
+        self._config = config if config is not None else sources.Config.load()
+        self.bus = sources.EventBus()
+
+    def start(self) -> None:
+        self.span_storage = SpanStorage(self._db_path)
+        self._span_writer = SpanWriter(self.span_storage)
+        span_writer_thread = threading.Thread(target=self._span_writer.run, daemon=True)
+        span_writer_thread.start()
+        self._event_log_writer = event_log.EventLogWriter(event_log.EventLog(self._db_path))
+        event_log_thread = threading.Thread(target=self._event_log_writer.run, daemon=True)
+        event_log_thread.start()
+        # Optionally, also record events for `trackctl replay`.
+        self._recorder = recording.recorder_from_env()
+
+        def record(source: str, message) -> None:
+            self._event_log_writer.record(source, message)
+            if self._recorder is not None:
+                self._recorder.record(source, message)
+
+        self._grpc_servers: List = []
+
+        def grpc_server():
+            if not self._grpc_servers:
+                # Only import gRPC if a source needs it.
+                import rpc
+                self._grpc_servers.append(rpc.make_server(**self._grpc_options))
+            return self._grpc_servers[0]
+
+        context = sources.SourceContext(
+                bus=self.bus,
+                span_tracker=lambda: SpanTracker(self._span_writer),
+                grpc_server=grpc_server,
+                recorder=record)
+        sources.start(self._config, context)
+        self.actors = context.actors
+
+        self.replicator = None
+        if self._accept_replication or self._replicate_to:
+            import replication
+            if self._accept_replication:
+                replication.add_servicer(grpc_server(), self.span_storage)
+            if self._replicate_to:
+                self.replicator = replication.Replicator(
+                        self.span_storage, self._replicate_to, self._origin)
+                threading.Thread(target=self.replicator.run, daemon=True).start()
+
+        setup_metrics(self._span_writer, self.actors)
+        admin_server = admin.AdminServer(port=self._admin_port)
+        admin_server.route('/metrics', lambda query: (
+            'text/plain; version=0.0.4', metrics.REGISTRY.exposition().encode('utf-8')))
+        admin_server.route('/debug/trace', tracing.handle_debug_trace)
+        admin_server.route('/debug/profile', profiler.handle_debug_profile)
+        admin_thread = threading.Thread(target=admin_server.serve, daemon=True)
+        admin_thread.start()
+
+        for server in self._grpc_servers:
+            server.add_insecure_port(f'[::]:{self._port}')
+            server.start()
+
+    def stop(self) -> None:
+        """Stops the servers, and saves what's queued."""
+        for server in self._grpc_servers:
+            server.stop(grace=1)
+        if self.replicator is not None:
+            self.replicator.close()
+        self._span_writer.close(timeout=10)
+        self._event_log_writer.close(timeout=10)
+        if self._recorder is not None:
+            self._recorder.close()
+
+
+@click.command()
+@click.option('--db', default='spans.db', help='Database to save spans and events to.')
+@click.option('--port', type=int, default=DEFAULT_PORT, help='gRPC port.')
+@click.option('--admin_port', type=int, default=admin.DEFAULT_PORT,
+              help='Port of the admin server, see admin.py.')
+@click.option('--config', type=click.Path(dir_okay=False, path_type=pathlib.Path),
+              default=sources.DEFAULT_CONFIG, help='Sources config, see sources.py.')
+@click.option('--grpc_workers', type=int,
+              help='Threads handling gRPC requests, see rpc.make_server().')
+@click.option('--max_concurrent_rpcs', type=int,
+              help='Reject RPCs past this many, instead of queueing them.')
+@click.option('--max_pending_rpcs', type=int,
+              help='Cancel RPCs past this many waiting to be picked up by the server.')
+@click.option('--replicate_to', help='Address of a central trackd to replicate spans to.')
+@click.option('--origin', help='Name to replicate spans as; the hostname by default.')
+@click.option('--accept_replication', is_flag=True,
+              help='Save spans replicated from other trackds, see replication.py.')
+def main(db, port, admin_port, config, grpc_workers, max_concurrent_rpcs, max_pending_rpcs,
+         replicate_to, origin, accept_replication):
+    """Tracks activity in tmux and Chrome."""
+    log_listener = setup_logging()
+    trackd = Trackd(db_path=db, port=port, admin_port=admin_port,
+                    config=sources.Config.load(config),
+                    grpc_workers=grpc_workers,
+                    max_concurrent_rpcs=max_concurrent_rpcs,
+                    max_pending_rpcs=max_pending_rpcs,
+                    replicate_to=replicate_to,
+                    origin=origin,
+                    accept_replication=accept_replication)
+    trackd.start()
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    try:
+        stopped.wait()
+    finally:
+        trackd.stop()
+        log_listener.stop()
 
 
 if __name__ == '__main__':
@@ -1,10 +1,17 @@
 import datetime
 import unittest
 
+import clock
+import sources
+import storage
+import tmux
 import trackd
 
 import pathlib
 import sqlite3
+import tempfile
+import threading
+import time
 
 from typing import Iterable
 
@@ -13,8 +20,8 @@ class SpanStoreTest(unittest.TestCase):
 
     def test_retrieves_same_as_saved(self):
         storage = trackd.SpanStorage(db_path=':memory:')
-        now = trackd.now()
-        session = trackd.tmux.TmuxSession(session_name='foo', hostname='host', server_pid=42)
+        now = clock.SYSTEM.now()
+        session = tmux.TmuxSession(session_name='foo', hostname='host', server_pid=42)
         span = trackd.Span(
                 session=session,
                 start=now,
@@ -26,6 +33,191 @@ class SpanStoreTest(unittest.TestCase):
         (retrieved,) = list(storage.query())
         self.assertEqual(span, retrieved)
 
+    def test_add_many(self):
+        storage = trackd.SpanStorage(db_path=':memory:')
+        spans = [make_span('foo'), make_span('bar')]
+
+        storage.add_many(spans)
+
+        self.assertEqual(list(storage.query()), spans)
+
+    def test_query_orders_by_start(self):
+        storage = trackd.SpanStorage(db_path=':memory:')
+        earlier, later = make_span('foo'), make_span('bar')
+
+        storage.add(later)
+        storage.add(earlier)
+
+        self.assertEqual(list(storage.query()), [earlier, later])
+
+    def test_merge_queries(self):
+        foo = make_span('foo')
+        bar = make_span('bar', start=foo.start)
+        baz = make_span('baz', start=foo.end)
+        first, second = (trackd.SpanStorage(db_path=':memory:') for _ in range(2))
+        first.add_many([foo, baz])
+        second.add_many([bar, foo])
+
+        self.assertEqual(list(storage.merge_queries([first, second])), [foo, bar, baz])
+
+    def test_at(self):
+        storage = trackd.SpanStorage(db_path=':memory:')
+        span = make_span('foo')
+        storage.add_many([span, make_span('bar', start=span.end)])
+
+        self.assertEqual(storage.at(span.start), [span])
+        self.assertEqual(storage.at(span.start + datetime.timedelta(seconds=.5)), [span])
+        self.assertEqual([s.session.session_name for s in storage.at(span.end)], ['bar'])
+        self.assertEqual(storage.at(span.start - datetime.timedelta(microseconds=1)), [])
+
+    def test_overlapping(self):
+        storage = trackd.SpanStorage(db_path=':memory:')
+        foo = make_span('foo')
+        bar = make_span('bar', start=foo.end + datetime.timedelta(minutes=1))
+        storage.add_many([foo, bar])
+
+        self.assertEqual(storage.overlapping(foo.start, bar.end), [foo, bar])
+        self.assertEqual(storage.overlapping(foo.end, bar.start), [])
+        self.assertEqual(
+                storage.overlapping(foo.end - datetime.timedelta(microseconds=1), bar.start), [foo])
+
+    def test_indexes_spans_saved_before_the_index(self):
+        span = make_span('foo')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = str(pathlib.Path(temp_dir) / 'spans.db')
+            trackd.SpanStorage(db_path).add(span)
+            conn = sqlite3.connect(db_path)
+            for statement in ('DROP TRIGGER spans_index_insert', 'DROP TRIGGER spans_index_delete',
+                              'DROP TABLE spans_index'):
+                conn.execute(statement)
+            conn.commit()
+            conn.close()
+
+            self.assertEqual(trackd.SpanStorage(db_path).at(span.start), [span])
+
+    def test_read_only_leaves_database_as_it_is(self):
+        span = make_span('foo')
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = pathlib.Path(temp_dir) / 'spans.db'
+            # A database of a trackd from before the interval index.
+            conn = sqlite3.connect(db_path)
+            conn.execute("""
+                CREATE TABLE spans (session_type text, session_name text, hostname text,
+                                    server_pid integer, user text, start timestamp, end timestamp)
+            """)
+            conn.commit()
+            conn.close()
+            with sqlite3.connect(db_path) as conn:
+                conn.execute(storage._INSERT.format(table='spans'), storage._to_row(span))
+            db_path.chmod(0o444)
+
+            span_storage = trackd.SpanStorage(str(db_path), read_only=True)
+
+            self.assertEqual(list(span_storage.query()), [span])
+            self.assertEqual(span_storage.at(span.start), [span])
+            self.assertEqual(
+                    span_storage.overlapping(span.end, span.end + datetime.timedelta(minutes=1)), [])
+            tables = [row[0] for row in sqlite3.connect(db_path).execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'")]
+            self.assertEqual(tables, ['spans'])
+
+
+def make_span(session_name: str, start: datetime.datetime = None) -> trackd.Span:
+    start = start or clock.SYSTEM.now()
+    return trackd.Span(
+            session=tmux.TmuxSession(session_name=session_name, hostname='host', server_pid=42),
+            start=start,
+            end=start + datetime.timedelta(minutes=5),
+    )
+
+
+class SpanWriterTest(unittest.TestCase):
+
+    def test_close_saves_queued_spans(self):
+        storage = trackd.SpanStorage(db_path=':memory:')
+        writer = trackd.SpanWriter(storage)
+        spans = [make_span('foo'), make_span('bar')]
+        for span in spans:
+            writer.add(span)
+
+        threading.Thread(target=writer.run, daemon=True).start()
+        writer.close(timeout=5)
+
+        self.assertEqual(list(storage.query()), spans)
+        stats = writer.stats()
+        self.assertEqual(stats.enqueued, 2)
+        self.assertEqual(stats.written, 2)
+        self.assertEqual(stats.max_queue_depth, 2)
+
+    def test_drops_spans_when_queue_is_full(self):
+        storage = trackd.SpanStorage(db_path=':memory:')
+        writer = trackd.SpanWriter(storage, max_queue_size=1)
+
+        writer.add(make_span('foo'))
+        with self.assertLogs(level='ERROR'):
+            writer.add(make_span('bar'))
+
+        stats = writer.stats()
+        self.assertEqual(stats.enqueued, 1)
+        self.assertEqual(stats.dropped, 1)
+        self.assertEqual(stats.queue_depth, 1)
+
+    def test_close_times_out_when_storage_is_stuck(self):
+        storage = StuckSpanStorage()
+        writer = trackd.SpanWriter(storage, max_queue_size=1)
+        threading.Thread(target=writer.run, daemon=True).start()
+        writer.add(make_span('foo'))
+        storage.adding.wait(timeout=5)
+        # The queue is full.
+        writer.add(make_span('bar'))
+        with self.assertLogs(level='ERROR'):
+            writer.add(make_span('baz'))
+
+        start = time.monotonic()
+        with self.assertLogs(level='ERROR') as logs:
+            writer.close(timeout=.1)
+
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn('Timed out saving spans, 1 left unsaved', logs.output[0])
+        storage.unstuck.set()
+
+
+class StuckSpanStorage:
+
+    def __init__(self):
+        self.adding = threading.Event()
+        self.unstuck = threading.Event()
+
+    def add(self, span):
+        self.adding.set()
+        self.unstuck.wait()
+
+
+class FakeSource(sources.Source):
+    """Switches between two sessions."""
+
+    def start(self, context: sources.SourceContext) -> None:
+        span_tracker = context.span_tracker()
+        for session_name in ('foo', 'bar'):
+            span_tracker.update_active_session(
+                    tmux.TmuxSession(session_name=session_name, hostname='host', server_pid=42))
+
+
+class TrackdTest(unittest.TestCase):
+
+    def test_saves_spans_from_sources(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            db_path = str(pathlib.Path(temp_dir) / 'spans.db')
+            trackd_ = trackd.Trackd(
+                    db_path=db_path, admin_port=0,
+                    config=sources.Config(enabled=['fake'],
+                                          factories={'fake': 'trackd_test:FakeSource'}))
+            trackd_.start()
+            trackd_.stop()
+
+            (span,) = trackd.SpanStorage(db_path).query()
+        self.assertEqual(span.session.session_name, 'foo')
+
 
 if __name__ == '__main__':
     unittest.main()
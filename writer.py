@@ -0,0 +1,74 @@
+"""A bounded queue drained on a dedicated thread, shared by trackd's writers.
+
+`trackd.SpanWriter` and `event_log.EventLogWriter` keep the threads that
+produce spans and events from ever waiting for the database: items go into a
+bounded queue, and a writer thread saves them.  Only imports stdlib modules.
+"""
+import queue
+import threading
+
+from typing import Any, Callable, List, Optional
+
+
+class QueueWriter:
+    """Passes queued items to `write`, in batches of up to `max_batch`.
+
+    `put()` never blocks: if the queue is full, i.e. `write` is stuck, the
+    item isn't queued.  `close()` returns within its timeout, even then.
+    """
+
+    _STOP = object()
+    # How often `run()` checks whether it's closed, if the stop marker didn't
+    # fit into a full queue.
+    _POLL_INTERVAL = 0.1
+
+    def __init__(self, write: Callable[[List[Any]], None], max_queue_size: int,
+                 max_batch: int = 1):
+        self._write = write
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._max_batch = max_batch
+        self._closed = threading.Event()
+        self._stopped = threading.Event()
+
+    def put(self, item) -> bool:
+        """Queues `item`, unless the queue is full.  Returns whether it was queued."""
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        return True
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def run(self) -> None:
+        """Writes queued items until `close()` is called and the queue is empty."""
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self._POLL_INTERVAL)]
+            except queue.Empty:
+                if self._closed.is_set():
+                    break
+                continue
+            while len(batch) < self._max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is self._STOP
+            batch = [item for item in batch if item is not self._STOP]
+            if batch:
+                self._write(batch)
+            if stop:
+                break
+        self._stopped.set()
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Stops `run()` once the queued items are written.
+
+        Returns whether that happened within `timeout`.
+        """
+        self._closed.set()
+        # Wakes `run()` up right away, if there's room.
+        self.put(self._STOP)
+        return self._stopped.wait(timeout)
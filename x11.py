@@ -1,88 +1,278 @@
+from dataclasses import dataclass, field
 import logging
+import queue
 import subprocess
 import threading
 
-from typing import Callable, MutableSequence
+from typing import Callable, Dict, MutableSequence, Optional, Tuple, Union
 
 import Xlib.error
-from Xlib import X
+from Xlib import X, Xatom
 from Xlib.display import Display
 from Xlib.protocol.rq import Event
 
+import clock
+import metrics
+import sources
+from events import (FocusChanged, LOCKED_WINDOW, LOCKED_WINDOW_ID, UNKNOWN_WINDOW,
+                    XWindowId, XWindowInfo)
+from tracing import TRACE, Stage
 
-XWindowId = int
-Callback = Callable[[XWindowId, str], None]
 
+logger = logging.getLogger(__name__)
 
-class XWindowFocusTracker:
 
-    def __init__(self):
+X_EVENTS = metrics.Counter('trackd_x_events_total', 'X events handled.')
+X_EVENTS_DURATION = metrics.Histogram(
+        'trackd_x_events_duration_seconds', 'Time to handle a batch of pending X events.')
+FOCUS_DISPATCH_DURATION = metrics.Histogram(
+        'trackd_focus_dispatch_duration_seconds',
+        'Time to pass a focus change to all callbacks.')
+FOCUS_DISPATCHER_QUEUE_SIZE = metrics.Gauge(
+        'trackd_focus_dispatcher_queue_size', 'Focus changes waiting to be debounced.')
+
+Callback = Callable[[XWindowId, XWindowInfo], None]
+
+
+@dataclass(frozen=True)
+class ScreenLockChanged:
+    locked: bool
+    trace_id: int = field(default=0, compare=False)
+
+
+# Focus has to stay on a window for this long (in seconds) to be reported.
+DEFAULT_DEBOUNCE = 0.3
+
+
+class FocusDispatcher:
+    """Passes focus changes to callbacks on its own thread.
+
+    Focus changes are debounced: a change is delivered only after focus has
+    stayed on the window for `debounce` seconds, so alt-tabbing through a few
+    windows produces a single change.  A change back to the last delivered
+    window isn't delivered at all.
+
+    While the screen is locked, callbacks see `LOCKED_WINDOW` focused.
+
+    The focus and screen lock state is only touched by the thread running
+    `run()`, or calling `poll()` instead; other threads pass changes through
+    a queue.  Changes are timed by `clock`.
+    """
+
+    def __init__(self, debounce: float = DEFAULT_DEBOUNCE, clock: clock.Clock = clock.SYSTEM):
+        self._debounce = debounce
+        self._clock = clock
         self._callbacks: MutableSequence[Callback] = []
-        self._disp = Display()
+        # Changes, with the monotonic time they were made at.
+        self._queue: 'queue.Queue[Tuple[float, Union[FocusChanged, ScreenLockChanged]]]' = (
+                queue.Queue())
+        self._focus: Optional[FocusChanged] = None
+        self._screen_locked = False
+        self._delivered: Optional[FocusChanged] = None
+        # When the last change was made, `None` once it's been settled.
+        self._changed_at: Optional[float] = None
+        # Trace of the last applied change.
+        self._trace_id = 0
+        FOCUS_DISPATCHER_QUEUE_SIZE.set_function(self._queue.qsize)
+
+    def register(self, callback: Callback) -> None:
+        self._callbacks.append(callback)
+
+    def put(self, window_id: XWindowId, window: XWindowInfo) -> None:
+        trace_id = TRACE.new_trace(Stage.X_FOCUS)
+        self._queue.put((self._clock.monotonic(), FocusChanged(window_id, window, trace_id)))
+
+    def set_screen_locked(self, locked: bool) -> None:
+        trace_id = TRACE.new_trace(Stage.SCREEN_LOCK)
+        self._queue.put((self._clock.monotonic(), ScreenLockChanged(locked, trace_id)))
+
+    def run(self) -> None:
+        while True:
+            timeout = self.poll()
+            try:
+                changed_at, change = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                continue
+            self._apply(changed_at, change)
+
+    def poll(self) -> Optional[float]:
+        """Applies queued changes, and delivers the focus if it has settled.
+
+        Doesn't block.  Returns the seconds left until the focus settles, or
+        `None` if there's nothing to wait for.
+        """
+        while True:
+            try:
+                self._apply(*self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if self._changed_at is None:
+            return None
+        left = self._changed_at + self._debounce - self._clock.monotonic()
+        if left > 0:
+            return left
+        self._changed_at = None
+        self._deliver()
+        return None
+
+    def _apply(self, changed_at: float, change: Union[FocusChanged, ScreenLockChanged]) -> None:
+        self._changed_at = changed_at
+        self._trace_id = change.trace_id
+        if isinstance(change, ScreenLockChanged):
+            self._screen_locked = change.locked
+        else:
+            self._focus = change
+
+    def _deliver(self) -> None:
+        if self._screen_locked:
+            focus = FocusChanged(LOCKED_WINDOW_ID, LOCKED_WINDOW)
+        else:
+            focus = self._focus
+        if focus is None or focus == self._delivered:
+            return
+        self._delivered = focus
+        TRACE.set_current(self._trace_id)
+        TRACE.record(self._trace_id, Stage.FOCUS_DISPATCH)
+        with FOCUS_DISPATCH_DURATION.time():
+            for callback in self._callbacks:
+                callback(focus.x_window_id, focus.window)
+
+
+class XWindowFocusTracker:
+    """Tracks the focused X window.
+
+    X state is only touched by the thread running `run()`.
+    """
+
+    def __init__(self, debounce: float = DEFAULT_DEBOUNCE, display: Optional[Display] = None):
+        self._dispatcher = FocusDispatcher(debounce=debounce)
+        self._disp = display if display is not None else Display()
         self._current_window_id: Optional[XWindowId] = None
         self.NET_ACTIVE_WINDOW = self._disp.intern_atom('_NET_ACTIVE_WINDOW')
         self.NET_WM_NAME = self._disp.intern_atom('_NET_WM_NAME')
-        self._screen_locked = False
-        self._lock = threading.Lock()
+        # Windows we've seen focused.  Kept up to date with PropertyNotify and
+        # DestroyNotify events, so a focus change doesn't need a round-trip
+        # to the X server.
+        self._windows: Dict[XWindowId, XWindowInfo] = {}
 
     def register(self, callback: Callback) -> None:
-        with self._lock:
-            self._callbacks.append(callback)
+        """Registers a callback.
+
+        Callbacks are called on the dispatcher thread, one at a time.
+        """
+        self._dispatcher.register(callback)
 
     def run(self) -> None:
+        dispatcher_thread = threading.Thread(target=self._dispatcher.run, daemon=True)
+        dispatcher_thread.start()
+
         screen_lock_tracker = ScreenLockTracker(self)
         screen_lock_tracker_thread = threading.Thread(target=screen_lock_tracker.run, daemon=True)
         screen_lock_tracker_thread.start()
 
-        root = self._disp.screen().root
-        root.change_attributes(event_mask=X.PropertyChangeMask)
+        self._root = self._disp.screen().root
+        self._root.change_attributes(event_mask=X.PropertyChangeMask)
 
         while True:
-            self._handle_xevent(self._disp.next_event())
+            event = self._disp.next_event()
+            # Handle everything that has piled up, but look up the active
+            # window only once.
+            with X_EVENTS_DURATION.time():
+                n_events = 1
+                active_window_changed = self._handle_xevent(event)
+                while self._disp.pending_events():
+                    n_events += 1
+                    active_window_changed |= self._handle_xevent(self._disp.next_event())
+                if active_window_changed:
+                    self._active_window_changed()
+            X_EVENTS.inc(amount=n_events)
 
     def set_screen_locked(self, locked: bool) -> None:
-        logging.info(f'XWindowFocusTracker.set_screen_locked(locked={locked})')
-        with self._lock:
-            self._screen_locked = locked
-            if locked:
-                window_id = -1
-                window_name = 'locked'
-            else:
-                window_id = self._current_window_id
-                window_name = self._get_window_name(window_id)
-            for callback in self._callbacks:
-                callback(window_id, window_name)
+        logger.info('XWindowFocusTracker.set_screen_locked(locked=%s)', locked)
+        self._dispatcher.set_screen_locked(locked)
+
+    def _handle_xevent(self, event: Event) -> bool:
+        """Handler for X events which ignores anything but focus/title change
 
+        Returns whether the active window has changed.
+        """
+        if event.type == X.DestroyNotify:
+            self._windows.pop(event.window.id, None)
+            return False
 
-    def _handle_xevent(self, event: Event) -> None:
-        """Handler for X events which ignores anything but focus/title change"""
         if event.type != X.PropertyNotify:
-            return
+            return False
 
-        if event.atom != self.NET_ACTIVE_WINDOW:
-            return
+        if event.atom in (self.NET_WM_NAME, Xatom.WM_NAME, Xatom.WM_CLASS):
+            if event.window.id in self._windows:
+                window = self._fetch_window(event.window.id)
+                if window is UNKNOWN_WINDOW:
+                    # It's gone; DestroyNotify may not have arrived yet.
+                    del self._windows[event.window.id]
+                else:
+                    self._windows[event.window.id] = window
+            return False
 
-        window_id = event.window.get_full_property(
+        return event.atom == self.NET_ACTIVE_WINDOW
+
+    def _active_window_changed(self) -> None:
+        window_id = self._root.get_full_property(
                 self.NET_ACTIVE_WINDOW, X.AnyPropertyType).value[0]
 
-        with self._lock:
-            if self._current_window_id == window_id:
-                return
-            self._current_window_id = window_id
+        if self._current_window_id == window_id:
+            return
+        self._current_window_id = window_id
 
-            window_name = self._get_window_name(window_id)
+        window = self._get_window(window_id)
 
-            for callback in self._callbacks:
-                callback(window_id, window_name)
+        self._dispatcher.put(window_id, window)
+
+    def _get_window(self, window_id: Optional[XWindowId]) -> XWindowInfo:
+        """Returns cached window info, starts tracking the window if it's new."""
+        if not window_id:
+            return UNKNOWN_WINDOW
+        try:
+            return self._windows[window_id]
+        except KeyError:
+            pass
 
-    def _get_window_name(self, window_id: XWindowId) -> str:
+        window_obj = self._disp.create_resource_object('window', window_id)
+        # Subscribe to title changes and the window being destroyed.  Errors
+        # of requests without a reply only arrive later, to `onerror`; if the
+        # window is gone, fetching it fails too, and it isn't cached.
+        window_obj.change_attributes(
+                event_mask=X.PropertyChangeMask | X.StructureNotifyMask,
+                onerror=Xlib.error.CatchError(Xlib.error.BadWindow))
+        window = self._fetch_window(window_id)
+        if window is not UNKNOWN_WINDOW:
+            self._windows[window_id] = window
+        return window
+
+    def _fetch_window(self, window_id: XWindowId) -> XWindowInfo:
         window_obj = self._disp.create_resource_object('window', window_id)
         try:
             window_name_property = window_obj.get_full_property(self.NET_WM_NAME, 0)
+            wm_class = window_obj.get_wm_class()
         except Xlib.error.BadWindow:
-            return ''
+            return UNKNOWN_WINDOW
+        if window_name_property is None:
+            name = ''
         else:
-            return window_name_property.value.decode('utf-8')
+            name = window_name_property.value.decode('utf-8')
+        return XWindowInfo(name=name, wm_class=tuple(wm_class or ()))
+
+
+class X11Source(sources.Source):
+    """Publishes `events.FocusChanged` on the event bus."""
+
+    def __init__(self, debounce: str = str(DEFAULT_DEBOUNCE)):
+        self._debounce = float(debounce)
+
+    def start(self, context: sources.SourceContext) -> None:
+        tracker = XWindowFocusTracker(debounce=self._debounce)
+        tracker.register(lambda x_window_id, window: context.bus.publish(
+            FocusChanged(x_window_id, window)))
+        context.start_thread(tracker.run, name='x11')
 
 
 class ScreenLockTracker:
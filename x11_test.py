@@ -0,0 +1,200 @@
+from types import SimpleNamespace
+import unittest
+
+import Xlib.error
+from Xlib import X, Xatom
+
+import clock
+from events import UNKNOWN_WINDOW
+from x11 import FocusDispatcher, LOCKED_WINDOW_ID, XWindowFocusTracker, XWindowInfo
+
+
+DEBOUNCE = 0.05
+
+FIRST = XWindowInfo(name='first')
+SECOND = XWindowInfo(name='second')
+THIRD = XWindowInfo(name='third')
+
+
+class FocusDispatcherTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = clock.FakeClock()
+        self.dispatcher = FocusDispatcher(debounce=DEBOUNCE, clock=self.clock)
+        self.delivered = []
+        self.dispatcher.register(lambda window_id, window: self.delivered.append(window_id))
+
+    def settle(self):
+        self.clock.advance(DEBOUNCE)
+        self.assertIsNone(self.dispatcher.poll())
+
+    def test_delivers_focus_change(self):
+        self.dispatcher.put(1, FIRST)
+        self.settle()
+
+        self.assertEqual(self.delivered, [1])
+
+    def test_coalesces_rapid_focus_changes(self):
+        self.dispatcher.put(1, FIRST)
+        self.dispatcher.put(2, SECOND)
+        self.dispatcher.put(3, THIRD)
+        self.settle()
+
+        self.assertEqual(self.delivered, [3])
+
+    def test_waits_for_focus_to_settle(self):
+        self.dispatcher.put(1, FIRST)
+        self.clock.advance(DEBOUNCE / 2)
+        self.assertAlmostEqual(self.dispatcher.poll(), DEBOUNCE / 2)
+        self.dispatcher.put(2, SECOND)
+        self.clock.advance(DEBOUNCE / 2)
+        self.assertAlmostEqual(self.dispatcher.poll(), DEBOUNCE / 2)
+        self.assertEqual(self.delivered, [])
+
+        self.settle()
+
+        self.assertEqual(self.delivered, [2])
+
+    def test_delivers_focus_changes_further_apart_than_debounce(self):
+        self.dispatcher.put(1, FIRST)
+        self.settle()
+        self.dispatcher.put(2, SECOND)
+        self.settle()
+
+        self.assertEqual(self.delivered, [1, 2])
+
+    def test_doesnt_deliver_flapping_back_to_the_same_window(self):
+        self.dispatcher.put(1, FIRST)
+        self.settle()
+        self.dispatcher.put(2, SECOND)
+        self.dispatcher.put(1, FIRST)
+        self.settle()
+
+        self.assertEqual(self.delivered, [1])
+
+    def test_screen_lock(self):
+        self.dispatcher.put(1, FIRST)
+        self.settle()
+        self.dispatcher.set_screen_locked(True)
+        self.settle()
+        # Focus changes while locked are only seen after unlocking.
+        self.dispatcher.put(2, SECOND)
+        self.settle()
+        self.dispatcher.set_screen_locked(False)
+        self.settle()
+
+        self.assertEqual(self.delivered, [1, LOCKED_WINDOW_ID, 2])
+
+
+def bad_window() -> Xlib.error.BadWindow:
+    # Skips parsing the error's wire data.
+    return Xlib.error.BadWindow.__new__(Xlib.error.BadWindow)
+
+
+class FakeWindow:
+
+    def __init__(self, display, window_id):
+        self._display = display
+        self.id = window_id
+
+    def _check(self):
+        if self.id not in self._display.windows:
+            raise bad_window()
+
+    def change_attributes(self, onerror=None, **keys):
+        # Like Xlib, reports the error asynchronously, if at all.
+        if self.id not in self._display.windows:
+            if onerror is None:
+                raise AssertionError('An uncaught BadWindow')
+            onerror(bad_window(), None)
+
+    def get_full_property(self, atom, property_type):
+        self._display.round_trips += 1
+        self._check()
+        if atom != self._display.intern_atom('_NET_WM_NAME'):
+            return None
+        return SimpleNamespace(value=self._display.windows[self.id][0].encode('utf-8'))
+
+    def get_wm_class(self):
+        self._display.round_trips += 1
+        self._check()
+        return self._display.windows[self.id][1]
+
+
+class FakeDisplay:
+    """Windows are set by hand, as {window_id: (name, wm_class)}."""
+
+    def __init__(self):
+        self.windows = {}
+        self.round_trips = 0
+        self._atoms = {}
+
+    def intern_atom(self, name):
+        return self._atoms.setdefault(name, 1000 + len(self._atoms))
+
+    def create_resource_object(self, type_, resource_id):
+        assert type_ == 'window'
+        return FakeWindow(self, resource_id)
+
+
+class WindowCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.display = FakeDisplay()
+        self.display.windows[1] = ('first', ('xterm', 'XTerm'))
+        self.tracker = XWindowFocusTracker(display=self.display)
+
+    def property_notify(self, window_id, atom):
+        return self.tracker._handle_xevent(SimpleNamespace(
+                type=X.PropertyNotify, atom=atom, window=SimpleNamespace(id=window_id)))
+
+    def test_cache_hit_doesnt_round_trip(self):
+        window = self.tracker._get_window(1)
+        round_trips = self.display.round_trips
+
+        self.assertEqual(self.tracker._get_window(1), window)
+        self.assertEqual(self.display.round_trips, round_trips)
+        self.assertEqual(window, XWindowInfo(name='first', wm_class=('xterm', 'XTerm')))
+
+    def test_property_notify_refreshes_entry(self):
+        self.tracker._get_window(1)
+
+        for atom, window in [
+                (self.display.intern_atom('_NET_WM_NAME'), ('renamed', ('xterm', 'XTerm'))),
+                (Xatom.WM_NAME, ('renamed again', ('xterm', 'XTerm'))),
+                (Xatom.WM_CLASS, ('renamed again', ('urxvt', 'URxvt')))]:
+            self.display.windows[1] = window
+            self.assertFalse(self.property_notify(1, atom))
+            round_trips = self.display.round_trips
+
+            self.assertEqual(self.tracker._get_window(1),
+                             XWindowInfo(name=window[0], wm_class=window[1]))
+            self.assertEqual(self.display.round_trips, round_trips)
+
+    def test_destroy_notify_evicts_entry(self):
+        self.tracker._get_window(1)
+
+        self.tracker._handle_xevent(SimpleNamespace(
+                type=X.DestroyNotify, window=SimpleNamespace(id=1)))
+        self.display.windows[1] = ('reused', ())
+
+        self.assertEqual(self.tracker._get_window(1), XWindowInfo(name='reused'))
+
+    def test_gone_window_isnt_cached(self):
+        self.assertEqual(self.tracker._get_window(2), UNKNOWN_WINDOW)
+
+        self.display.windows[2] = ('second', ())
+        self.assertEqual(self.tracker._get_window(2), XWindowInfo(name='second'))
+
+    def test_property_notify_of_gone_window_evicts_entry(self):
+        self.tracker._get_window(1)
+        del self.display.windows[1]
+
+        self.property_notify(1, Xatom.WM_NAME)
+
+        self.display.windows[1] = ('reused', ())
+        self.assertEqual(self.tracker._get_window(1), XWindowInfo(name='reused'))
+
+
+if __name__ == '__main__':
+    unittest.main()